@@ -19,11 +19,17 @@ from utils.db_models import SessionLocal, Book, PendingBook, ScanLog, AppLog, Da
 import datetime
 import os
 from sqlalchemy import func, text
+from sqlalchemy.exc import IntegrityError
 import subprocess
 import random
 import glob
 from datetime import date, timedelta
 from urllib.parse import unquote
+from utils.worker_metrics import read_worker_metrics
+from utils import response_cache, scan_history, cascade_delete
+from utils.user_cache import user_ids
+from utils.isbn import isbn13_check_digit, isbn_pair, InvalidISBNError
+from utils.index_events import publish_event, BOOKS_ADDED, BOOKS_REMOVED
 
 admin_api = Blueprint("admin_api", __name__)
 
@@ -267,6 +273,18 @@ def logs():
     return jsonify(formatted_logs if formatted_logs else [])
 
 
+@admin_api.route("/admin/api/cache/stats")
+def cache_stats():
+    """
+    Get response cache statistics for this API process.
+
+    Returns:
+        200: JSON object keyed by cache name with hits, shared_hits, misses,
+             evictions, invalidations, size and hit_rate
+    """
+    return jsonify(response_cache.stats())
+
+
 @admin_api.route("/admin/api/workers/status")
 def workers_status():
     """
@@ -274,12 +292,17 @@ def workers_status():
     
     Returns:
         200: Dictionary mapping worker IDs to their status
+
+    Each entry also includes "metrics": the latest snapshot of every process
+    of that worker (queue depth, items/min, per-stage latency, outcome
+    counters and external API error rates), see utils.worker_metrics.
     """
+    metrics = read_worker_metrics()
     status = {}
     for wid, info in WORKER_PROCESSES.items():
         # Check if process is actually running (not just started)
         running = info["process"] is not None and info["process"].poll() is None
-        status[wid] = {"name": wid, "running": running}
+        status[wid] = {"name": wid, "running": running, "metrics": metrics.get(wid, [])}
     return jsonify(status)
 
 
@@ -372,7 +395,8 @@ def barcode_random():
     
     # Generate random ISBN13 not in database
     while True:
-        isbn = "978" + "".join(str(random.randint(0, 9)) for _ in range(10))
+        body = "978" + "".join(str(random.randint(0, 9)) for _ in range(9))
+        isbn = body + isbn13_check_digit(body)
         exists = session.query(Book).filter_by(isbn13=isbn).first()
         if not exists:
             break
@@ -444,7 +468,8 @@ def testing_random_isbn13_unknown():
     
     # Generate random ISBN13 not in database
     while True:
-        isbn = "978" + "".join(str(random.randint(0, 9)) for _ in range(10))
+        body = "978" + "".join(str(random.randint(0, 9)) for _ in range(9))
+        isbn = body + isbn13_check_digit(body)
         exists = session.query(Book).filter_by(isbn13=isbn).first()
         if not exists:
             break
@@ -1084,26 +1109,33 @@ def add_test_isbn():
         
     Returns:
         200: ISBN ensured in database
-        400: Missing ISBN
+        400: Missing or invalid ISBN
     """
     data = request.get_json()
     isbn = data.get("isbn")
     if not isbn:
         return jsonify({"error": "Missing ISBN"}), 400
+    try:
+        isbn10, isbn13 = isbn_pair(isbn)
+    except InvalidISBNError:
+        return jsonify({"error": "Invalid ISBN"}), 400
+    if not isbn10:
+        return jsonify({"error": "979- ISBNs have no ISBN-10"}), 400
     
     session = SessionLocal()
     # Only add if not already present
-    exists = session.query(Book).filter_by(isbn13=isbn).first()
+    exists = session.query(Book).filter_by(isbn=isbn10).first()
     if not exists:
         book = Book(
-            isbn=isbn[-10:], 
-            isbn13=isbn, 
+            isbn=isbn10, 
+            isbn13=isbn13, 
             title="Test Book", 
             authors="Test Author", 
             publisher="Test Publisher"
         )
         session.add(book)
         session.commit()
+        publish_event(BOOKS_ADDED, books=[{"isbn": isbn10, "isbn13": isbn13, "title": "Test Book"}])
     session.close()
     
     return jsonify({"message": f"ISBN {isbn} ensured in database."})
@@ -1119,12 +1151,22 @@ def delete_test_isbn(isbn):
         
     Returns:
         200: ISBN deleted from database
+        400: Invalid ISBN
     """
+    try:
+        isbn10, isbn13 = isbn_pair(isbn)
+    except InvalidISBNError:
+        return jsonify({"error": "Invalid ISBN"}), 400
+
     session = SessionLocal()
-    session.query(Book).filter_by(isbn13=isbn).delete()
-    session.query(Book).filter_by(isbn=isbn[-10:]).delete()
+    removed = [isbn for (isbn,) in session.query(Book.isbn).filter_by(isbn13=isbn13)]
+    session.query(Book).filter_by(isbn13=isbn13).delete()
+    if isbn10:
+        removed.append(isbn10)
+        session.query(Book).filter_by(isbn=isbn10).delete()
     session.commit()
     session.close()
+    publish_event(BOOKS_REMOVED, isbns=sorted(set(removed)))
     
     return jsonify({"message": f"ISBN {isbn} deleted from database."})
 
@@ -1156,6 +1198,7 @@ def admin_create_user():
         user = User(username=username.strip())
         session.add(user)
         session.commit()
+        user_ids.invalidate(user.username)  # Drop "no such user" entries
         return jsonify({"id": user.id, "username": user.username}), 201
     except Exception as e:
         session.rollback()
@@ -1192,26 +1235,23 @@ def admin_delete_user(username):
     Returns:
         200: User deleted successfully
         404: User not found
+        409: Rows kept being added concurrently; the request can be repeated
     """
     username = unquote(username)
     session = SessionLocal()
     try:
-        user = session.query(User).filter_by(username=username).first()
-        if not user:
+        user_id = user_ids.resolve(session, username)
+        if user_id is None:
             return jsonify({"error": "User not found"}), 404
 
-        # Cascade delete: collections, collection books, and user scans
-        from utils.db_models import Collection, CollectionBook
-        collections = session.query(Collection).filter_by(owner=user.id).all()
-        for collection in collections:
-            session.query(CollectionBook).filter_by(collection_id=collection.id).delete()
-            session.delete(collection)
-
-        session.query(UserScan).filter_by(user_id=user.id).delete()
-        session.delete(user)
-        session.commit()
+        # Cascade delete: collection books, collections, scans, added books, user
+        counts = cascade_delete.delete_user(session, user_id)
+        user_ids.invalidate(username)
         
-        return jsonify({"message": f"User '{username}' deleted."}), 200
+        return jsonify({"message": f"User '{username}' deleted.", "deleted": counts}), 200
+    except IntegrityError as e:
+        session.rollback()
+        return jsonify({"error": f"User is being modified, try again: {str(e)}"}), 409
     finally:
         session.close()
 
@@ -1243,29 +1283,22 @@ def admin_add_user_scan():
     try:
         session.execute(text("SET innodb_lock_wait_timeout=5"))
 
-        # Get or create user
-        user = session.query(User).filter_by(username=username).first()
-        if not user:
-            print(f"Admin API: User '{username}' not found, auto-creating user")
-            user = User(username=username)
-            session.add(user)
-            session.commit()
-            print(f"Admin API: Created user '{username}' with ID: {user.id}")
-
-        print(f"Admin API: User '{username}' found with ID: {user.id}")
+        # Get or create user (cached id, atomic creation)
+        user_id = user_ids.get_or_create(session, username)
+        print(f"Admin API: User '{username}' has ID: {user_id}")
 
         # Check for duplicate scan
-        existing_scan = session.query(UserScan).filter_by(user_id=user.id, isbn=isbn).first()
+        existing_scan = session.query(UserScan).filter_by(user_id=user_id, isbn=isbn).first()
         if existing_scan:
-            print(f"Admin API: Scan already exists for user {user.id}, isbn {isbn}")
+            print(f"Admin API: Scan already exists for user {user_id}, isbn {isbn}")
             return jsonify({"error": "Scan already exists"}), 409
 
         # Create new scan
-        scan = UserScan(user_id=user.id, isbn=isbn, timestamp=datetime.datetime.utcnow())
+        scan = UserScan(user_id=user_id, isbn=isbn, timestamp=datetime.datetime.utcnow())
         session.add(scan)
         session.commit()
         
-        print(f"Admin API: Successfully added scan for user {user.id}, isbn {isbn}")
+        print(f"Admin API: Successfully added scan for user {user_id}, isbn {isbn}")
         return jsonify({"success": True}), 201
     except Exception as e:
         session.rollback()
@@ -1290,12 +1323,11 @@ def admin_delete_user_scans(username):
     username = unquote(username)
     session = SessionLocal()
     try:
-        user = session.query(User).filter_by(username=username).first()
-        if not user:
+        user_id = user_ids.resolve(session, username)
+        if user_id is None:
             return jsonify({"error": "User not found"}), 404
 
-        session.query(UserScan).filter_by(user_id=user.id).delete()
-        session.commit()
+        cascade_delete.delete_in_chunks(session, "user_scans", "user_id = :user_id", {"user_id": user_id})
         return jsonify({"message": "All scan history deleted"}), 200
     finally:
         session.close()
@@ -1305,53 +1337,40 @@ def admin_delete_user_scans(username):
 def admin_get_recently_scanned(username):
     """
     Admin endpoint to get recently scanned books for a user.
-    
+
+    Paginated like /api/recently_scanned: follow X-Next-Cursor to list the
+    whole history.
+
     Args:
         username: URL-encoded username
-        
+
+    Query parameters:
+        limit: Page size (default and max 200)
+        cursor: X-Next-Cursor value of the previous page
+
     Returns:
-        200: List of recently scanned books with details
+        200: List of recently scanned books with details; X-Next-Cursor
+             header when more scans follow
+        400: Malformed cursor
         500: Server error
     """
     username = unquote(username)
+    limit = min(max(request.args.get("limit", scan_history.MAX_LIMIT, type=int), 1), scan_history.MAX_LIMIT)
+    after = None
+    if request.args.get("cursor"):
+        after = scan_history.decode_cursor(request.args["cursor"])
+        if after is None:
+            return jsonify({"error": "Invalid cursor"}), 400
+
     session = SessionLocal()
     try:
-        user = session.query(User).filter_by(username=username).first()
-        if not user:
-            return jsonify([]), 200
-
-        # Get user scans ordered by most recent
-        user_scans = session.query(UserScan).filter(
-            UserScan.user_id == user.id
-        ).order_by(UserScan.timestamp.desc()).all()
-
-        if not user_scans:
-            return jsonify([]), 200
-
-        result = []
-        for scan in user_scans:
-            book = session.query(Book).filter_by(isbn=scan.isbn).first()
-            
-            if book:
-                result.append({
-                    "isbn": book.isbn,
-                    "title": book.title,
-                    "authors": book.authors,
-                    "cover_url": book.cover_url,
-                    "timestamp": scan.timestamp.isoformat() if scan.timestamp else None
-                })
-            else:
-                # Show scan even if book is not found
-                result.append({
-                    "isbn": scan.isbn,
-                    "title": f"Book {scan.isbn}",
-                    "authors": "Unknown",
-                    "cover_url": None,
-                    "timestamp": scan.timestamp.isoformat() if scan.timestamp else None
-                })
-
-        return jsonify(result), 200
+        result, next_cursor = scan_history.recent_scans(session, username, limit, after)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     finally:
         session.close()
+
+    response = jsonify(result)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response, 200
@@ -7,32 +7,71 @@ Handles barcode scan requests from the frontend. When a barcode is scanned:
 3. Adds new books to the pending queue for worker processing
 4. Logs all scan attempts for analytics
 
-Also provides worker error reporting endpoint.
+Steps 1-2 are answered from the in-memory ISBN index (utils.isbn_index)
+when possible; logs are written in the background (utils.log_writer), so
+scans of known books never wait on MySQL.
+
+Also provides a batch endpoint for shelf scanning and the worker error
+reporting endpoint.
 """
 
 from flask import Blueprint, request, jsonify
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
-from utils.db_models import SessionLocal, Book, PendingBook, ScanLog, AppLog
+from utils.db_models import (
+    SessionLocal, Book, PendingBook, ScanLog, AppLog,
+    PRIORITY_INTERACTIVE, PRIORITY_BULK, PRIORITY_REPAIR,
+)
+from utils.isbn import isbn_pair, InvalidISBNError
+from utils.isbn_index import isbn_index
+from utils.log_writer import queue_app_log, queue_scan_log
+from utils.index_events import publish_event, PENDING_REMOVED
+from utils.insert_ignore import insert_ignore
 
 barcode_api = Blueprint("barcode_api", __name__)
 
+# Queue lane for each request source (see utils.pending_queue)
+SOURCE_PRIORITIES = {
+    "scan": PRIORITY_INTERACTIVE,
+    "bulk": PRIORITY_BULK,
+    "repair": PRIORITY_REPAIR,
+}
+
+MAX_BATCH_SIZE = 500  # ISBNs accepted per /barcode/batch request
+
 
 def log_app(level: str, message: str, context: dict = None) -> None:
-    """Log application events to database."""
-    session = SessionLocal()
-    app_log = AppLog(level=level, message=message, context=context)
-    session.add(app_log)
-    session.commit()
-    session.close()
+    """Log application events to database (batched in the background)."""
+    queue_app_log(level, message, context)
 
 
 def log_scan(isbn: str, status: str, message: str, extra: dict = None) -> None:
-    """Log scan events for analytics and debugging."""
-    session = SessionLocal()
-    scan_log = ScanLog(isbn=isbn, status=status, message=message, extra=extra)
-    session.add(scan_log)
-    session.commit()
-    session.close()
+    """Log scan events for analytics and debugging (batched in the background)."""
+    queue_scan_log(isbn, status, message, extra)
+
+
+def _already_in_dataset_response(raw_isbn: str, isbn10: str, title: str):
+    log_app("WARNING", "Book already exists in dataset", {"isbn": raw_isbn})
+    log_scan(raw_isbn, "error", "Book already in dataset")
+    return jsonify({
+        "message": "❌ Ce livre est déjà présent dans la base.",
+        "isbn": isbn10,
+        "already_in_dataset": True,
+        "already_in_queue": False,
+        "title": title,
+        "cover_url": f"/cover/{isbn10}.jpg"
+    }), 200
+
+
+def _already_in_queue_response(raw_isbn: str, isbn: str):
+    log_app("INFO", "Book already pending processing", {"isbn": isbn})
+    log_scan(raw_isbn, "pending", "Book already in queue")
+    return jsonify({
+        "message": "⏳ Ce livre est déjà en attente de validation.",
+        "isbn": isbn,
+        "already_in_dataset": False,
+        "already_in_queue": True
+    }), 200
 
 
 @barcode_api.route("/barcode", methods=["POST"])
@@ -41,10 +80,13 @@ def scan_barcode():
     Process a barcode scan request.
 
     Expected JSON payload: {"isbn": "1234567890123"}
+    Optional fields:
+        - username: User who scanned the book (used for fair scheduling)
+        - source: "scan" (default), "bulk" or "repair" - queue priority lane
 
     Returns:
         200: Book status (already exists, queued, or newly added to queue)
-        400: Invalid request (missing ISBN)
+        400: Invalid request (missing ISBN or bad checksum)
 
     Response includes:
         - message: Human-readable status
@@ -62,56 +104,59 @@ def scan_barcode():
         log_scan(None, "error", "No isbn provided", {"data": data})
         return jsonify({"error": "No isbn provided"}), 400
 
-    raw_isbn = data["isbn"].strip()
+    raw_isbn = str(data["isbn"]).strip()
+    username = data.get("username")
+    priority = SOURCE_PRIORITIES.get(data.get("source", "scan"), PRIORITY_INTERACTIVE)
     log_app("INFO", f"Processing ISBN: {raw_isbn}")
 
+    try:
+        isbn10, isbn13 = isbn_pair(raw_isbn)
+    except InvalidISBNError:
+        log_app("WARNING", "Invalid ISBN scanned", {"isbn": raw_isbn})
+        log_scan(raw_isbn, "error", "Invalid ISBN")
+        return jsonify({"error": "Invalid ISBN"}), 400
+
+    # Fast path: answer known books / queued books from memory
+    if isbn_index.loaded:
+        known = isbn_index.lookup_book(isbn10 or isbn13)
+        if known:
+            return _already_in_dataset_response(raw_isbn, *known)
+        if isbn_index.is_pending(isbn13, isbn10):
+            return _already_in_queue_response(raw_isbn, isbn13)
+
     session: Session = SessionLocal()
 
-    # Check if book already exists (try both ISBN13 and ISBN10)
-    book = session.query(Book).filter_by(isbn13=raw_isbn).first()
-    if not book:
-        book = session.query(Book).filter_by(isbn=raw_isbn).first()
+    # Index miss (or not loaded yet): confirm against the database using the
+    # primary key when an ISBN-10 exists, the isbn13 index otherwise (979-)
+    if isbn10:
+        book = session.query(Book).filter_by(isbn=isbn10).first()
+    else:
+        book = session.query(Book).filter_by(isbn13=isbn13).first()
 
     if book:
-        log_app("WARNING", "Book already exists in dataset", {"isbn": raw_isbn})
-        isbn10 = book.isbn  # Use ISBN10 as canonical reference
-        log_scan(raw_isbn, "error", "Book already in dataset")
+        isbn_index.add_book(book)
         session.close()
-        return jsonify({
-            "message": "❌ Ce livre est déjà présent dans la base.",
-            "isbn": isbn10,
-            "already_in_dataset": True,
-            "already_in_queue": False,
-            "title": book.title,
-            "cover_url": f"/cover/{isbn10}.jpg"
-        }), 200
-
-    # Use raw ISBN for processing (worker will handle ISBN10 extraction)
-    isbn_to_insert = raw_isbn
-
-    # If we have an existing book with this ISBN13, use its ISBN10
-    existing_book = session.query(Book).filter_by(isbn13=raw_isbn).first()
-    if existing_book:
-        isbn_to_insert = existing_book.isbn
+        return _already_in_dataset_response(raw_isbn, book.isbn, book.title)
+
+    # The queue is keyed by ISBN-13 (what the metadata APIs are queried with);
+    # rows queued before that change still carry the ISBN-10
+    isbn_to_insert = isbn13
 
     # Check if already in processing queue
-    already_pending = session.query(PendingBook).filter_by(isbn=isbn_to_insert).first()
+    already_pending = session.query(PendingBook.isbn).filter(
+        PendingBook.isbn.in_([isbn for isbn in (isbn13, isbn10) if isbn])
+    ).first()
     if already_pending:
-        log_app("INFO", "Book already pending processing", {"isbn": isbn_to_insert})
+        isbn_index.add_pending(already_pending.isbn)
         session.close()
-        log_scan(raw_isbn, "pending", "Book already in queue")
-        return jsonify({
-            "message": "⏳ Ce livre est déjà en attente de validation.",
-            "isbn": isbn_to_insert,
-            "already_in_dataset": False,
-            "already_in_queue": True
-        }), 200
+        return _already_in_queue_response(raw_isbn, isbn_to_insert)
 
     # Add to processing queue
     try:
-        pending = PendingBook(isbn=isbn_to_insert)
+        pending = PendingBook(isbn=isbn_to_insert, priority=priority, requested_by=username)
         session.add(pending)
         session.commit()
+        isbn_index.add_pending(isbn_to_insert)
         log_app("SUCCESS", "Book added to processing queue", {"isbn": isbn_to_insert})
         log_scan(isbn_to_insert, "success", "Book added to pending")
         response_message = {
@@ -135,6 +180,124 @@ def scan_barcode():
     return jsonify(response_message), 200
 
 
+@barcode_api.route("/barcode/batch", methods=["POST"])
+def scan_barcode_batch():
+    """
+    Process a whole shelf of scanned ISBNs in one request.
+
+    Existing books and queued items are resolved with two set-based
+    queries and every new ISBN is enqueued in a single transaction.
+
+    Expected JSON payload:
+        {"isbns": ["9782070368228", ...], "username": "john_doe", "source": "bulk"}
+
+    source defaults to "bulk" so a shelf doesn't delay interactive scans.
+
+    Returns:
+        200: Per-ISBN results (in request order) and a summary
+        400: Missing/empty ISBN list or more than MAX_BATCH_SIZE ISBNs
+        500: Database error while enqueuing
+
+    Each result has "input", "status" and, when valid, "isbn":
+        - in_dataset: Book already exists (with title and cover_url)
+        - in_queue: Already pending processing
+        - queued: Added to the pending queue by this request
+        - invalid: Not a valid ISBN
+    """
+    data = request.get_json(silent=True) or {}
+    raw_isbns = data.get("isbns")
+    if not isinstance(raw_isbns, list) or not raw_isbns:
+        return jsonify({"error": "isbns must be a non-empty list"}), 400
+    if len(raw_isbns) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} ISBNs per batch"}), 400
+
+    username = data.get("username")
+    priority = SOURCE_PRIORITIES.get(data.get("source", "bulk"), PRIORITY_BULK)
+
+    # Normalize everything up front; duplicates collapse onto one ISBN-13
+    parsed = []
+    for raw in raw_isbns:
+        try:
+            parsed.append((raw, *isbn_pair(str(raw).strip())))
+        except InvalidISBNError:
+            parsed.append((raw, None, None))
+
+    isbn13s = {isbn13 for _, _, isbn13 in parsed if isbn13}
+    isbn10s = {isbn10 for _, isbn10, _ in parsed if isbn10}
+
+    known = {}  # isbn10 / isbn13 -> (isbn10, title)
+    session: Session = SessionLocal()
+    try:
+        if isbn13s:
+            books = session.query(Book.isbn, Book.isbn13, Book.title).filter(
+                or_(Book.isbn.in_(isbn10s), Book.isbn13.in_(isbn13s))
+            )
+            for isbn, isbn13, title in books:
+                known[isbn] = (isbn, title)
+                if isbn13:
+                    known[isbn13] = (isbn, title)
+
+        candidates = {
+            isbn13 for _, isbn10, isbn13 in parsed
+            if isbn13 and (isbn10 or isbn13) not in known and isbn13 not in known
+        }
+        queued, queued_keys = set(), set()
+        if candidates:
+            # Older queue rows are keyed by ISBN-10: look both forms up
+            forms = {isbn13: isbn13 for isbn13 in candidates}
+            forms.update({isbn10: isbn13 for _, isbn10, isbn13 in parsed if isbn10 and isbn13 in candidates})
+            queued_keys = {isbn for (isbn,) in session.query(PendingBook.isbn).filter(PendingBook.isbn.in_(forms))}
+            queued = {forms[isbn] for isbn in queued_keys}
+
+        fresh = sorted(candidates - queued)
+        # INSERT IGNORE: a concurrent scan of the same ISBN must not fail the
+        # batch; those rows are then reported in_queue, not queued
+        inserted = insert_ignore(
+            session, PendingBook.__table__,
+            [{"isbn": isbn, "priority": priority, "requested_by": username} for isbn in fresh], key="isbn"
+        )
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        log_app("ERROR", f"Batch barcode scan failed: {e}", {"count": len(raw_isbns)})
+        return jsonify({"error": "Failed to process batch"}), 500
+    finally:
+        session.close()
+
+    for isbn in queued_keys.union(fresh):
+        isbn_index.add_pending(isbn)
+
+    results = []
+    added = set()
+    for raw, isbn10, isbn13 in parsed:
+        if not isbn13:
+            results.append({"input": raw, "status": "invalid"})
+            log_scan(str(raw), "error", "Invalid ISBN")
+            continue
+
+        book = known.get(isbn10 or isbn13) or known.get(isbn13)
+        if book:
+            results.append({
+                "input": raw, "status": "in_dataset", "isbn": book[0],
+                "title": book[1], "cover_url": f"/cover/{book[0]}.jpg"
+            })
+            log_scan(str(raw), "error", "Book already in dataset")
+        elif isbn13 in inserted and isbn13 not in added:
+            added.add(isbn13)
+            results.append({"input": raw, "status": "queued", "isbn": isbn13})
+            log_scan(isbn13, "success", "Book added to pending")
+        else:
+            results.append({"input": raw, "status": "in_queue", "isbn": isbn13})
+            log_scan(str(raw), "pending", "Book already in queue")
+
+    summary = {status: 0 for status in ("in_dataset", "in_queue", "queued", "invalid")}
+    for result in results:
+        summary[result["status"]] += 1
+    log_app("SUCCESS", f"Batch scan: {len(results)} ISBNs", {"summary": summary, "username": username})
+
+    return jsonify({"results": results, "summary": summary}), 200
+
+
 @barcode_api.route("/worker-errors", methods=["GET"])
 def get_worker_errors():
     """
@@ -165,6 +328,10 @@ def get_worker_errors():
 
     if errors:
         session.commit()
+        removed = [error["isbn"] for error in errors]
+        for isbn in removed:
+            isbn_index.remove_pending(isbn)
+        publish_event(PENDING_REMOVED, isbns=removed)
         log_app("INFO", f"Reported {len(errors)} worker errors to frontend")
 
     session.close()
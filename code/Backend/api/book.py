@@ -1,20 +1,81 @@
 """
 Book Details API
 
-Provides detailed information for individual books by ISBN.
-Supports lookup by both ISBN-10 and ISBN-13 formats.
+Provides detailed information for individual books by ISBN, and for many
+books at once (/api/books) with field projection for list screens.
+Supports lookup by both ISBN-10 and ISBN-13 formats (normalized through
+utils.isbn, so a single indexed column is queried).
 
 Used by:
 - Frontend book detail pages
 - Book information display
 - Collection management
+
+Serialized payloads are cached per book (utils.response_cache) and dropped
+when the worker or an admin tool changes the row. Responses carry ETag,
+Last-Modified and Cache-Control so repeat views end in a 304 or never
+leave the client.
 """
 
-from flask import Blueprint, request, jsonify
+import os
+import json
+import hashlib
+from datetime import datetime, timezone
+from flask import Blueprint, Response, request, jsonify
+from sqlalchemy import or_
 from utils.db_models import SessionLocal, Book
+from utils.isbn import isbn_pair, InvalidISBNError
+from utils.catalog import catalog, CATALOG_FIELDS
+from utils.response_cache import ResponseCache
+from utils.index_events import subscribe, BOOKS_ADDED, BOOKS_REMOVED, RESYNC
 
 bp = Blueprint("book", __name__)
 
+BOOK_FIELDS = (
+    "isbn", "isbn13", "title", "authors", "pages", "publication_date", "publisher",
+    "language_code", "cover_url", "external_links", "description", "genres",
+    "average_rating", "ratings_count",
+)
+MAX_BATCH_ISBNS = int(os.getenv("BOOK_BATCH_MAX_ISBNS", "200"))
+
+BOOK_CACHE_MAX_AGE = int(os.getenv("BOOK_CACHE_MAX_AGE", "300"))  # seconds clients may reuse a payload
+book_cache = ResponseCache(
+    "book",
+    max_entries=int(os.getenv("BOOK_CACHE_MAX_ENTRIES", "10000")),
+    ttl=int(os.getenv("BOOK_CACHE_TTL", "86400")),
+)
+
+
+def _on_index_event(event: dict) -> None:
+    """Drop cached payloads of books that were saved again or deleted."""
+    if event["type"] == BOOKS_ADDED:
+        for book in event.get("books", []):
+            keys = [key for key in (book.get("isbn"), book.get("isbn13")) if key]
+            book_cache.delete(*keys, generation=event["seq"])
+    elif event["type"] == BOOKS_REMOVED:
+        book_cache.delete(*event.get("isbns", []), generation=event["seq"])
+    elif event["type"] == RESYNC:
+        book_cache.clear(generation=event["seq"])
+
+
+subscribe(_on_index_event)
+
+
+def _build_payload(book) -> list:
+    """Serialize a book once: [body, etag, last modified timestamp or None]."""
+    # Prepare complete book data dictionary
+    book_dict = {field: getattr(book, field) for field in BOOK_FIELDS}
+
+    # Filter out null values to clean up the response
+    # This reduces payload size and prevents frontend null handling issues
+    book_dict = {k: v for k, v in book_dict.items() if v is not None}
+
+    body = json.dumps(book_dict)
+    etag = hashlib.sha1(body.encode()).hexdigest()[:20]
+    # Columns hold naive UTC: make that explicit, or .timestamp() reads local time
+    modified = book.updated_at or book.date_added
+    return [body, etag, modified.replace(tzinfo=timezone.utc).timestamp() if modified else None]
+
 
 @bp.route("/api/book/<isbn>", methods=["GET"])
 def get_book_details(isbn):
@@ -26,6 +87,8 @@ def get_book_details(isbn):
 
     Returns:
         200: Book details with all available metadata
+        304: Not modified (If-None-Match / If-Modified-Since)
+        400: Not a valid ISBN (unless a legacy row is stored under it as given)
         404: Book not found
 
     Response includes all non-null book fields:
@@ -48,38 +111,125 @@ def get_book_details(isbn):
         Only fields with non-null values are included in the response
         to reduce payload size and avoid frontend null checks.
     """
-    session = SessionLocal()
+    try:
+        isbn10, isbn13 = isbn_pair(isbn)
+    except InvalidISBNError:
+        isbn10 = isbn13 = None  # Still matched as given below: legacy rows may fail the checksum
 
-    # Search by both ISBN formats to handle either input type
-    book = session.query(Book).filter(
-        (Book.isbn == isbn) | (Book.isbn13 == isbn)
-    ).first()
+    key = isbn10 or isbn13 or isbn
+    payload = book_cache.get(key)
+    if payload is None:
+        session = SessionLocal()
+        try:
+            # Primary key lookup when an ISBN-10 exists, isbn13 index for 979- ISBNs
+            if isbn10:
+                book = session.query(Book).filter_by(isbn=isbn10).first()
+            elif isbn13:
+                book = session.query(Book).filter_by(isbn13=isbn13).first()
+            else:
+                book = session.query(Book).filter_by(isbn=isbn).first()
+                if not book:
+                    return jsonify({"error": "Invalid ISBN"}), 400
+            if not book:
+                return jsonify({"error": "Book not found"}), 404
+            payload = _build_payload(book)
+        finally:
+            session.close()
+        book_cache.set(key, payload)
 
-    if not book:
-        session.close()
-        return jsonify({"error": "Book not found"}), 404
+    body, etag, modified = payload
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    if modified:
+        response.last_modified = datetime.fromtimestamp(modified, timezone.utc)
+    response.cache_control.public = True
+    response.cache_control.max_age = BOOK_CACHE_MAX_AGE
+    # Turns the response into a 304 when If-None-Match / If-Modified-Since match
+    return response.make_conditional(request)
 
-    # Prepare complete book data dictionary
-    book_dict = {
-        "isbn": book.isbn,
-        "isbn13": book.isbn13,
-        "title": book.title,
-        "authors": book.authors,
-        "pages": book.pages,
-        "publication_date": book.publication_date,
-        "publisher": book.publisher,
-        "language_code": book.language_code,
-        "cover_url": book.cover_url,
-        "external_links": book.external_links,
-        "description": book.description,
-        "genres": book.genres,
-        "average_rating": book.average_rating,
-        "ratings_count": book.ratings_count,
-    }
 
-    # Filter out null values to clean up the response
-    # This reduces payload size and prevents frontend null handling issues
-    book_dict = {k: v for k, v in book_dict.items() if v is not None}
+@bp.route("/api/books", methods=["GET"])
+def get_books():
+    """
+    Get several books in one query, optionally restricted to some fields.
+
+    Query parameters:
+        isbns: Comma-separated ISBNs (ISBN-10 or ISBN-13, at most MAX_BATCH_ISBNS)
+        fields: Comma-separated subset of BOOK_FIELDS (default: all);
+                isbn is always included
+
+    Returns:
+        200: {"books": [...], "missing": [...], "invalid": [...]}
+             books follow the order of the request, duplicates removed;
+             null fields are omitted as in /api/book/<isbn>.
+             Requests limited to catalog fields (utils.catalog) are served
+             from memory, querying only the books it doesn't know.
+        400: No ISBNs, too many ISBNs or unknown field
+    """
+    raw_isbns = [i.strip() for i in request.args.get("isbns", "").split(",") if i.strip()]
+    if not raw_isbns:
+        return jsonify({"error": "isbns is required"}), 400
+    if len(raw_isbns) > MAX_BATCH_ISBNS:
+        return jsonify({"error": f"At most {MAX_BATCH_ISBNS} ISBNs"}), 400
+
+    fields = BOOK_FIELDS
+    if request.args.get("fields"):
+        fields = tuple(f.strip() for f in request.args["fields"].split(",") if f.strip())
+        unknown = [f for f in fields if f not in BOOK_FIELDS]
+        if unknown:
+            return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+    # isbn/isbn13 are needed to map rows back to the requested ISBNs
+    columns = ["isbn", "isbn13"] + [f for f in fields if f not in ("isbn", "isbn13")]
+
+    requested = []  # (raw, isbn10, isbn13) in request order
+    invalid = []
+    for raw in raw_isbns:
+        try:
+            requested.append((raw, *isbn_pair(raw)))
+        except InvalidISBNError:
+            invalid.append(raw)
+
+    by_isbn10 = {}
+    by_isbn13 = {}
+
+    def keep(values: dict) -> None:
+        book = {f: values[f] for f in ("isbn",) + fields if values[f] is not None}
+        by_isbn10[values["isbn"]] = book
+        if values["isbn13"]:
+            by_isbn13[values["isbn13"]] = book
+
+    # List screens ask for catalog fields only: answer from memory when possible
+    to_query = requested
+    if catalog.loaded and set(fields) <= set(CATALOG_FIELDS):
+        to_query = []
+        for entry in requested:
+            record = catalog.get(entry[1] or entry[2])
+            if record:
+                keep(record.to_dict(columns))
+            else:
+                to_query.append(entry)
+
+    isbn10s = {isbn10 for _, isbn10, _ in to_query if isbn10}
+    isbn13s = {isbn13 for _, isbn10, isbn13 in to_query if not isbn10}
+    if to_query:
+        session = SessionLocal()
+        try:
+            # Primary key IN list, plus the isbn13 index for 979- ISBNs
+            rows = session.query(*[getattr(Book, c) for c in columns]).filter(
+                or_(Book.isbn.in_(isbn10s), Book.isbn13.in_(isbn13s))
+            ).all()
+        finally:
+            session.close()
+        for row in rows:
+            keep(dict(zip(columns, row)))
+
+    books, missing, seen = [], [], set()
+    for raw, isbn10, isbn13 in requested:
+        book = by_isbn10.get(isbn10) if isbn10 else by_isbn13.get(isbn13)
+        if book is None:
+            missing.append(raw)
+        elif book["isbn"] not in seen:
+            seen.add(book["isbn"])
+            books.append(book)
 
-    session.close()
-    return jsonify(book_dict)
+    return jsonify({"books": books, "missing": missing, "invalid": invalid}), 200
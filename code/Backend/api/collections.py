@@ -2,11 +2,18 @@
 Collections API
 
 Manages user book collections with robust error handling for database lock timeouts.
-Auto-creates users when needed and provides CRUD operations for collections.
+Auto-creates users when needed and provides CRUD operations for collections,
+including bulk add/remove of books (one statement per request) and merges
+queued for merge_collection_worker.py.
 """
 
 from flask import Blueprint, request, jsonify
-from utils.db_models import SessionLocal, User, Collection, CollectionBook, UserScan, Book, AppLog
+from utils.db_models import SessionLocal, Collection, CollectionBook, CollectionMergeJob, UserScan, Book, AppLog
+from utils.isbn import book_key
+from utils.catalog import catalog
+from utils.user_cache import user_ids
+from utils import cascade_delete
+from utils.insert_ignore import insert_ignore
 from sqlalchemy.exc import IntegrityError, OperationalError, TimeoutError
 import random
 import time
@@ -15,6 +22,8 @@ from urllib.parse import unquote
 
 collections_api = Blueprint("collections", __name__)
 
+MAX_BULK_ISBNS = 500  # ISBNs accepted per bulk add/remove request
+
 
 def retry_db_operation(operation, max_retries: int = 3, base_delay: float = 0.1):
     """
@@ -77,14 +86,14 @@ def get_collections(username):
     username = unquote(username)
     session = SessionLocal()
     
-    # Find user by username
-    user = session.query(User).filter_by(username=username).first()
-    if not user:
+    # Find user by username (cached, including unknown users)
+    user_id = user_ids.resolve(session, username)
+    if user_id is None:
         session.close()
         return jsonify([]), 200  # Return empty array instead of 404 for better UX
     
     # Get all collections owned by this user
-    collections = session.query(Collection).filter_by(owner=user.id).all()
+    collections = session.query(Collection).filter_by(owner=user_id).all()
     result = [
         {"id": c.id, "name": c.name, "icon": c.icon}
         for c in collections
@@ -123,15 +132,11 @@ def create_collection(username):
         """Database operation with proper session management."""
         session = SessionLocal()
         try:
-            # Get or create user
-            user = session.query(User).filter_by(username=username).first()
-            if not user:
-                user = User(username=username)
-                session.add(user)
-                session.commit()
+            # Get or create user (cached id, atomic creation)
+            user_id = user_ids.get_or_create(session, username)
             
             # Create collection
-            collection = Collection(name=name, owner=user.id, icon=icon)
+            collection = Collection(name=name, owner=user_id, icon=icon)
             session.add(collection)
             session.commit()
             
@@ -140,7 +145,7 @@ def create_collection(username):
                 "collection_id": collection.id,
                 "collection_name": name,
                 "username": username,
-                "user_id": user.id,
+                "user_id": user_id,
                 "action": "collection_created"
             })
             
@@ -179,7 +184,8 @@ def add_book_to_collection(username, collection_id):
     Returns:
         201: Book added successfully
         200: Book already in collection
-        400: Missing ISBN or book doesn't exist in database
+        400: Missing/invalid ISBN or book doesn't exist in database (legacy
+            books whose ISBN fails the checksum are matched as given)
         404: User or collection not found
         503: Database timeout after retries
         500: Unexpected error
@@ -190,16 +196,19 @@ def add_book_to_collection(username, collection_id):
     
     if not isbn:
         return jsonify({"error": "Missing ISBN"}), 400
+    isbn, valid = book_key(isbn)
+    if not valid and not catalog.lookup([isbn]):
+        return jsonify({"error": "Invalid ISBN"}), 400
     
     def db_operation():
         """Database operation with proper error handling and session management."""
         session = SessionLocal()
         try:
             # Verify user and collection ownership
-            user = session.query(User).filter_by(username=username).first()
-            collection = session.query(Collection).filter_by(id=collection_id, owner=user.id).first() if user else None
+            user_id = user_ids.resolve(session, username)
+            collection = session.query(Collection).filter_by(id=collection_id, owner=user_id).first() if user_id else None
             
-            if not user or not collection:
+            if not collection:
                 return {"error": "User or collection not found", "status": 404}
             
             # Check if book is already in collection
@@ -235,6 +244,225 @@ def add_book_to_collection(username, collection_id):
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
 
 
+def _parse_bulk_isbns():
+    """Read {"isbns": [...]}; returns (isbns, error response or None)."""
+    data = request.get_json(silent=True) or {}
+    isbns = data.get("isbns")
+    if not isinstance(isbns, list) or not isbns:
+        return None, (jsonify({"error": "isbns must be a non-empty list"}), 400)
+    if len(isbns) > MAX_BULK_ISBNS:
+        return None, (jsonify({"error": f"At most {MAX_BULK_ISBNS} ISBNs per request"}), 400)
+    return [str(isbn).strip() for isbn in isbns], None
+
+
+def _bulk_response(isbns: list, keys: list, response: dict, statuses: tuple, repeats: dict):
+    """
+    Per-ISBN results (in request order) and a summary from a db_operation result.
+
+    Args:
+        isbns: ISBNs as given by the client
+        keys: Matching keys (canonical ISBNs, or values as given; see book_key)
+        response: db_operation result with "outcomes" (key -> status) or "error";
+            keys without an outcome, or with "invalid", are reported invalid
+        statuses: Every status, for the summary
+        repeats: Status of the first occurrence -> status of later ones, for
+            ISBNs repeated in the request (e.g. added -> already_present)
+    """
+    if "outcomes" not in response:
+        return jsonify({"error": response["error"]}), response["status"]
+    results = []
+    seen = set()
+    for raw, key in zip(isbns, keys):
+        status = response["outcomes"].get(key, "invalid")
+        if status == "invalid":
+            results.append({"input": raw, "status": "invalid"})
+            continue
+        if key in seen:
+            status = repeats.get(status, status)
+        seen.add(key)
+        results.append({"input": raw, "status": status, "isbn": key})
+    summary = {status: 0 for status in statuses}
+    for result in results:
+        summary[result["status"]] += 1
+    return jsonify({"results": results, "summary": summary}), response["status"]
+
+
+@collections_api.route("/api/collections/<username>/<int:collection_id>/books", methods=["POST"])
+def add_books_to_collection(username, collection_id):
+    """
+    Add many books to a collection in one statement.
+
+    Existing books and current members are checked with one query each and
+    the new ISBNs are inserted with a single INSERT IGNORE, so concurrent
+    additions of the same book don't fail the request. Rows IGNORE skipped
+    are reported as they turned out (see utils.insert_ignore).
+
+    Args:
+        username: URL-encoded username
+        collection_id: Collection ID
+
+    Expected JSON payload:
+        {"isbns": ["9782070368228", ...]}
+
+    Returns:
+        200: Per-ISBN results (in request order) and a summary
+        400: Missing/empty ISBN list or more than MAX_BULK_ISBNS ISBNs
+        404: User or collection not found
+        503: Database timeout after retries
+        500: Unexpected error
+
+    Each result has "input", "status" and, when valid, "isbn":
+        - added: Added by this request
+        - already_present: Already in the collection
+        - unknown_book: Not in the books table
+        - invalid: Not a valid ISBN (values failing the checksum are
+          accepted when a legacy book has them as ISBN)
+    """
+    username = unquote(username)
+    isbns, error = _parse_bulk_isbns()
+    if error:
+        return error
+
+    keys = []
+    legacy = set()
+    for isbn in isbns:
+        key, valid = book_key(isbn)
+        keys.append(key)
+        if not valid:
+            legacy.add(key)
+    wanted = {key for key in keys if key}
+
+    def db_operation():
+        """Database operation with proper session management."""
+        session = SessionLocal()
+        try:
+            user_id = user_ids.resolve(session, username)
+            collection = session.query(Collection.id).filter_by(id=collection_id, owner=user_id).first() if user_id else None
+            if not collection:
+                return {"error": "User or collection not found", "status": 404}
+
+            known = set(catalog.lookup(wanted, session)) if wanted else set()
+            present = {
+                isbn for (isbn,) in session.query(CollectionBook.isbn).filter(
+                    CollectionBook.collection_id == collection_id, CollectionBook.isbn.in_(wanted)
+                )
+            } if wanted else set()
+
+            fresh = sorted(known - present)
+            added = insert_ignore(
+                session, CollectionBook.__table__,
+                [{"collection_id": collection_id, "isbn": isbn} for isbn in fresh], key="isbn"
+            )
+            skipped = set(fresh) - added
+            if skipped:
+                # Added concurrently (duplicate) or deleted meanwhile (foreign key)
+                present |= {
+                    isbn for (isbn,) in session.query(CollectionBook.isbn).filter(
+                        CollectionBook.collection_id == collection_id, CollectionBook.isbn.in_(skipped)
+                    )
+                }
+                known -= skipped - present
+            session.commit()
+
+            outcomes = {key: "unknown_book" for key in wanted - known}
+            outcomes.update({key: "invalid" for key in legacy - known})
+            outcomes.update({key: "already_present" for key in present})
+            outcomes.update({key: "added" for key in added})
+            return {"outcomes": outcomes, "status": 200}
+
+        except (OperationalError, TimeoutError) as e:
+            session.rollback()
+            if "Lock wait timeout" in str(e) or "timeout" in str(e).lower():
+                raise e  # Let retry mechanism handle it
+            return {"error": f"Database error: {str(e)}", "status": 500}
+        finally:
+            session.close()
+
+    try:
+        response = retry_db_operation(db_operation, max_retries=3)
+    except (OperationalError, TimeoutError) as e:
+        return jsonify({"error": f"Database timeout after retries: {str(e)}"}), 503
+    except Exception as e:
+        return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
+
+    return _bulk_response(
+        isbns, keys, response,
+        statuses=("added", "already_present", "unknown_book", "invalid"), repeats={"added": "already_present"},
+    )
+
+
+@collections_api.route("/api/collections/<username>/<int:collection_id>/books", methods=["DELETE"])
+def remove_books_from_collection(username, collection_id):
+    """
+    Remove many books from a collection in one statement.
+
+    Args:
+        username: URL-encoded username
+        collection_id: Collection ID
+
+    Expected JSON payload:
+        {"isbns": ["9782070368228", ...]}
+
+    Returns:
+        200: Per-ISBN results (in request order) and a summary
+        400: Missing/empty ISBN list or more than MAX_BULK_ISBNS ISBNs
+        404: User or collection not found
+        503: Database timeout after retries
+        500: Unexpected error
+
+    Each result has "input", "status" and "isbn":
+        - removed: Removed by this request
+        - not_in_collection: Wasn't in the collection
+    Non-canonical values are matched as given, like the single-book route,
+    so legacy rows can still be removed.
+    """
+    username = unquote(username)
+    isbns, error = _parse_bulk_isbns()
+    if error:
+        return error
+
+    keys = [book_key(isbn)[0] for isbn in isbns]  # Legacy, non-canonical rows can still be removed
+    wanted = set(keys)
+
+    def db_operation():
+        """Database operation with proper session management."""
+        session = SessionLocal()
+        try:
+            user_id = user_ids.resolve(session, username)
+            collection = session.query(Collection.id).filter_by(id=collection_id, owner=user_id).first() if user_id else None
+            if not collection:
+                return {"error": "User or collection not found", "status": 404}
+
+            members = CollectionBook.collection_id == collection_id, CollectionBook.isbn.in_(wanted)
+            present = {isbn for (isbn,) in session.query(CollectionBook.isbn).filter(*members)}
+            if present:
+                session.query(CollectionBook).filter(*members).delete(synchronize_session=False)
+            session.commit()
+
+            outcomes = {key: "removed" if key in present else "not_in_collection" for key in wanted}
+            return {"outcomes": outcomes, "status": 200}
+
+        except (OperationalError, TimeoutError) as e:
+            session.rollback()
+            if "Lock wait timeout" in str(e) or "timeout" in str(e).lower():
+                raise e  # Let retry mechanism handle it
+            return {"error": f"Database error: {str(e)}", "status": 500}
+        finally:
+            session.close()
+
+    try:
+        response = retry_db_operation(db_operation, max_retries=3)
+    except (OperationalError, TimeoutError) as e:
+        return jsonify({"error": f"Database timeout after retries: {str(e)}"}), 503
+    except Exception as e:
+        return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
+
+    return _bulk_response(
+        isbns, keys, response,
+        statuses=("removed", "not_in_collection"), repeats={"removed": "not_in_collection"},
+    )
+
+
 @collections_api.route("/api/collections/<int:collection_id>/books", methods=["GET"])
 def get_books_in_collection(collection_id):
     """
@@ -247,15 +475,16 @@ def get_books_in_collection(collection_id):
         200: List of books with isbn, title, cover_url, and authors
     """
     session = SessionLocal()
-    
-    # Join collections_books with books table to get full book details
-    books = (
-        session.query(Book)
-        .join(CollectionBook, CollectionBook.isbn == Book.isbn)
-        .filter(CollectionBook.collection_id == collection_id)
-        .all()
-    )
-    
+    try:
+        isbns = [
+            isbn for (isbn,) in session.query(CollectionBook.isbn)
+            .filter(CollectionBook.collection_id == collection_id)
+        ]
+        # Book details from the in-memory catalog, one query for misses
+        books = catalog.lookup(isbns, session)
+    finally:
+        session.close()
+
     result = [
         {
             "isbn": b.isbn,
@@ -263,10 +492,9 @@ def get_books_in_collection(collection_id):
             "cover_url": b.cover_url,
             "authors": b.authors,
         }
-        for b in books
+        for b in (books.get(isbn) for isbn in isbns)
+        if b
     ]
-    
-    session.close()
     return jsonify(result)
 
 
@@ -285,11 +513,13 @@ def remove_book_from_collection(collection_id, isbn):
         503: Database timeout after retries
         500: Unexpected error
     """
+    key, _ = book_key(isbn)  # Legacy, non-canonical rows can still be removed
+
     def db_operation():
         """Database operation with proper session management."""
         session = SessionLocal()
         try:
-            cb = session.query(CollectionBook).filter_by(collection_id=collection_id, isbn=isbn).first()
+            cb = session.query(CollectionBook).filter_by(collection_id=collection_id, isbn=key).first()
             if not cb:
                 return {"error": "Book not in collection", "status": 404}
             
@@ -346,11 +576,11 @@ def update_collection(username, collection_id):
         session = SessionLocal()
         try:
             # Verify user and collection ownership
-            user = session.query(User).filter_by(username=username).first()
-            if not user:
+            user_id = user_ids.resolve(session, username)
+            if user_id is None:
                 return {"error": "User not found", "status": 404}
             
-            collection = session.query(Collection).filter_by(id=collection_id, owner=user.id).first()
+            collection = session.query(Collection).filter_by(id=collection_id, owner=user_id).first()
             if not collection:
                 return {"error": "Collection not found", "status": 404}
             
@@ -391,6 +621,7 @@ def delete_collection(username, collection_id):
     Returns:
         200: Collection deleted successfully
         404: User or collection not found
+        409: Books kept being added concurrently; the request can be repeated
         503: Database timeout after retries
         500: Unexpected error
     """
@@ -401,34 +632,34 @@ def delete_collection(username, collection_id):
         session = SessionLocal()
         try:
             # Verify user and collection ownership
-            user = session.query(User).filter_by(username=username).first()
-            if not user:
+            user_id = user_ids.resolve(session, username)
+            if user_id is None:
                 return {"error": "User not found", "status": 404}
             
-            collection = session.query(Collection).filter_by(id=collection_id, owner=user.id).first()
+            collection = session.query(Collection).filter_by(id=collection_id, owner=user_id).first()
             if not collection:
                 return {"error": "Collection not found", "status": 404}
             
             collection_name = collection.name
             
-            # Delete all books in collection first (cascade delete)
-            session.query(CollectionBook).filter_by(collection_id=collection_id).delete()
-            
-            # Delete the collection itself
-            session.delete(collection)
-            session.commit()
+            # Books first, then the collection, in bounded chunks
+            cascade_delete.delete_collection(session, collection_id)
             
             # Log collection deletion for analytics
             log_app("INFO", f"Collection deleted: '{collection_name}' by user {username}", {
                 "collection_id": collection_id,
                 "collection_name": collection_name,
                 "username": username,
-                "user_id": user.id,
+                "user_id": user_id,
                 "action": "collection_deleted"
             })
             
             return {"message": "Collection deleted", "status": 200}
             
+        except IntegrityError as e:
+            # Books kept being added while deleting (see utils.cascade_delete)
+            session.rollback()
+            return {"error": f"Collection is being modified, try again: {str(e)}", "status": 409}
         except (OperationalError, TimeoutError) as e:
             session.rollback()
             if "Lock wait timeout" in str(e) or "timeout" in str(e).lower():
@@ -439,13 +670,144 @@ def delete_collection(username, collection_id):
     
     try:
         response = retry_db_operation(db_operation, max_retries=3)
-        return jsonify({"message": response["message"]}), response["status"]
+        return jsonify({"message": response["message"]} if "message" in response else {"error": response["error"]}), response["status"]
+    except (OperationalError, TimeoutError) as e:
+        return jsonify({"error": f"Database timeout after retries: {str(e)}"}), 503
+    except Exception as e:
+        return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
+
+
+@collections_api.route("/api/collections/<username>/<int:collection_id>/merge", methods=["POST"])
+def merge_collections(username, collection_id):
+    """
+    Queue merges of other collections into this one.
+
+    The books are copied by merge_collection_worker.py in chunks, so large
+    collections never tie up a request; poll the returned jobs with
+    GET /api/collections/<username>/merge_jobs/<job_id>.
+
+    Args:
+        username: URL-encoded username
+        collection_id: Target collection ID
+
+    Expected JSON payload:
+        {
+            "source_ids": [12, 15],
+            "delete_source": true  // Optional: delete the sources once merged (default true)
+        }
+
+    Returns:
+        202: Queued jobs ({"jobs": [{"job_id", "source_id"}, ...]})
+        400: Missing/invalid source_ids, or the target among them
+        404: User, target or a source collection not found
+        503: Database timeout after retries
+        500: Unexpected error
+    """
+    username = unquote(username)
+    data = request.get_json(silent=True) or {}
+    source_ids = data.get("source_ids")
+    if not isinstance(source_ids, list) or not source_ids or not all(
+        isinstance(source_id, int) and not isinstance(source_id, bool) for source_id in source_ids
+    ):
+        return jsonify({"error": "source_ids must be a non-empty list of collection IDs"}), 400
+    source_ids = list(dict.fromkeys(source_ids))
+    if collection_id in source_ids:
+        return jsonify({"error": "A collection cannot be merged into itself"}), 400
+    delete_source = bool(data.get("delete_source", True))
+
+    def db_operation():
+        """Database operation with proper session management."""
+        session = SessionLocal()
+        try:
+            # Target and every source must belong to the user
+            user_id = user_ids.resolve(session, username)
+            if user_id is None:
+                return {"error": "User not found", "status": 404}
+            owned = {
+                cid for (cid,) in session.query(Collection.id).filter(
+                    Collection.owner == user_id, Collection.id.in_([collection_id] + source_ids)
+                )
+            }
+            if collection_id not in owned:
+                return {"error": "Collection not found", "status": 404}
+            unknown = [source_id for source_id in source_ids if source_id not in owned]
+            if unknown:
+                return {"error": f"Source collections not found: {unknown}", "status": 404}
+
+            jobs = [
+                CollectionMergeJob(
+                    source_id=source_id, target_id=collection_id,
+                    delete_source=delete_source, requested_by=username,
+                )
+                for source_id in source_ids
+            ]
+            session.add_all(jobs)
+            session.commit()
+
+            log_app("INFO", f"Merge queued into collection {collection_id} by user {username}", {
+                "collection_id": collection_id,
+                "source_ids": source_ids,
+                "job_ids": [job.id for job in jobs],
+                "username": username,
+                "action": "collection_merge_queued"
+            })
+
+            return {"jobs": [{"job_id": job.id, "source_id": job.source_id} for job in jobs], "status": 202}
+
+        except (OperationalError, TimeoutError) as e:
+            session.rollback()
+            if "Lock wait timeout" in str(e) or "timeout" in str(e).lower():
+                raise e  # Let retry mechanism handle it
+            return {"error": f"Database error: {str(e)}", "status": 500}
+        finally:
+            session.close()
+
+    try:
+        response = retry_db_operation(db_operation, max_retries=3)
+        return jsonify({"jobs": response["jobs"]} if "jobs" in response else {"error": response["error"]}), response["status"]
     except (OperationalError, TimeoutError) as e:
         return jsonify({"error": f"Database timeout after retries: {str(e)}"}), 503
     except Exception as e:
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
 
 
+@collections_api.route("/api/collections/<username>/merge_jobs/<int:job_id>", methods=["GET"])
+def get_merge_job(username, job_id):
+    """
+    Progress of a collection merge job.
+
+    Args:
+        username: URL-encoded username (must be the one who queued the job)
+        job_id: ID returned by the merge endpoint
+
+    Returns:
+        200: {"job_id", "source_id", "target_id", "status" (queued/running/
+             done/failed), "total", "copied", "added", "error", timestamps}
+        404: Job not found
+    """
+    username = unquote(username)
+    session = SessionLocal()
+    try:
+        job = session.query(CollectionMergeJob).filter_by(id=job_id, requested_by=username).first()
+        if not job:
+            return jsonify({"error": "Merge job not found"}), 404
+        return jsonify({
+            "job_id": job.id,
+            "source_id": job.source_id,
+            "target_id": job.target_id,
+            "status": job.status,
+            "total": job.total,
+            "copied": job.copied,
+            "added": job.added,
+            "error": job.error,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        }), 200
+    finally:
+        session.close()
+
+
 @collections_api.route("/api/collections/<username>/<int:collection_id>/add_invalid", methods=["POST"])
 def add_book_to_collection_invalid(username, collection_id):
     """
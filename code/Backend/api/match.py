@@ -10,8 +10,10 @@ When users upload an image:
 
 Key features:
 - Real-time image processing with CLIP
-- FAISS-based similarity search
-- Multiple match alternatives
+- FAISS-based similarity search on an in-memory index, swapped when the
+  worker publishes an index update (see utils.index_events)
+- Multiple match alternatives, hydrated from the in-memory book catalog
+  (utils.catalog) with one batched query for catalog misses
 - Robust error handling with database retries
 - Static cover image serving
 """
@@ -26,9 +28,12 @@ import faiss
 import json
 import time
 import random
-from sqlalchemy.orm import Session
+import threading
 from sqlalchemy.exc import OperationalError, TimeoutError
-from utils.db_models import SessionLocal, Book, ScanLog, AppLog
+from utils.db_models import SessionLocal, ScanLog, AppLog
+from utils.catalog import catalog
+from utils.index_events import subscribe, INDEX_UPDATED, RESYNC
+from utils.index_version import read_consistent, IndexBusyError
 
 # Directory paths for covers and index files
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -119,6 +124,57 @@ def log_scan(isbn: str, status: str, message: str, extra: dict = None) -> None:
         pass
 
 
+class IndexHolder:
+    """
+    Keeps the FAISS index and image names in memory for the match endpoint.
+
+    The pair is replaced as a whole on reload so a request always searches an
+    index consistent with its names list. Reloads are triggered by index
+    update notifications instead of re-reading the files on every request,
+    and only accept files read between two writes (utils.index_version).
+    """
+
+    def __init__(self, index_path: str, names_path: str):
+        self.index_path = str(index_path)
+        self.names_path = str(names_path)
+        self._snapshot = None  # (faiss index, image names)
+        self._lock = threading.Lock()
+
+    def _load(self):
+        index = faiss.read_index(self.index_path)
+        with open(self.names_path, "r") as f:
+            image_names = json.load(f)
+        return index, image_names
+
+    def reload(self) -> None:
+        """Read index and names from disk and swap them in."""
+        with self._lock:
+            try:
+                index, image_names = read_consistent(self._load)
+            except IndexBusyError as e:
+                if self._snapshot is not None:
+                    log_app("WARNING", f"FAISS index reload skipped: {e}")
+                    return
+                # Nothing to serve yet (e.g. a writer died mid-swap): take the
+                # files as they are if the index and names at least line up
+                index, image_names = self._load()
+                if index.ntotal != len(image_names):
+                    raise RuntimeError(f"FAISS index has {index.ntotal} vectors but {len(image_names)} names") from e
+            self._snapshot = (index, image_names)
+        log_app("INFO", f"FAISS index loaded: {index.ntotal} vectors")
+
+    def get(self):
+        """Return (index, image_names), loading them on first use."""
+        if self._snapshot is None:
+            self.reload()
+        return self._snapshot
+
+    def on_index_event(self, event: dict) -> None:
+        """Index event subscriber: reload when the worker commits new vectors."""
+        if event["type"] in (INDEX_UPDATED, RESYNC):
+            self.reload()
+
+
 def create_match_api(model, processor, device, index_path=INDEX_PATH, names_path=NAMES_PATH, metadata=None):
     """
     Factory function to create the match API blueprint with injected dependencies.
@@ -136,6 +192,9 @@ def create_match_api(model, processor, device, index_path=INDEX_PATH, names_path
     """
     match_api = Blueprint("match_api", __name__)
 
+    index_holder = IndexHolder(index_path, names_path)
+    subscribe(index_holder.on_index_event)
+
     @match_api.route("/match", methods=["POST"])
     def match_cover():
         """
@@ -194,11 +253,8 @@ def create_match_api(model, processor, device, index_path=INDEX_PATH, names_path
                 outputs = model(**inputs)
                 embedding = outputs.image_embeds[0].cpu().numpy()
 
-            # Reload index and names for each search (ensures fresh data)
-            log_app("INFO", "Reloading FAISS index and image names")
-            index = faiss.read_index(str(index_path))
-            with open(str(names_path), "r") as f:
-                image_names = json.load(f)
+            # In-memory index, kept fresh by index update notifications
+            index, image_names = index_holder.get()
 
             # Search for similar images (k=6 to get top match + 5 alternatives)
             D, I = index.search(np.array([embedding]), k=6)
@@ -212,27 +268,26 @@ def create_match_api(model, processor, device, index_path=INDEX_PATH, names_path
                 Returns:
                     List of book suggestions with metadata
                 """
-                session: Session = SessionLocal()
-                try:
-                    suggestions = []
-                    for idx, score in zip(indices, distances):
-                        filename = image_names[idx]
-                        # Extract ISBN from filename (remove .jpg extension)
-                        isbn = os.path.splitext(filename)[0]
-                        
-                        # Get book details from database
-                        book = session.query(Book).filter_by(isbn=isbn).first()
-                        if book:
-                            suggestions.append({
-                                "filename": filename,
-                                "score": float(score),
-                                "title": book.title,
-                                "authors": book.authors,
-                                "cover_url": f"/cover/{filename}"
-                            })
-                    return suggestions
-                finally:
-                    session.close()
+                # Extract ISBNs from filenames (remove .jpg extension)
+                matches = [
+                    (image_names[idx], os.path.splitext(image_names[idx])[0], score)
+                    for idx, score in zip(indices, distances)
+                ]
+                # Catalog records; one query for misses (not loaded yet, just indexed)
+                books = catalog.lookup(isbn for _, isbn, _ in matches)
+
+                suggestions = []
+                for filename, isbn, score in matches:
+                    book = books.get(isbn)
+                    if book:
+                        suggestions.append({
+                            "filename": filename,
+                            "score": float(score),
+                            "title": book.title,
+                            "authors": book.authors,
+                            "cover_url": f"/cover/{filename}"
+                        })
+                return suggestions
 
             # Get book suggestions with retry mechanism
             try:
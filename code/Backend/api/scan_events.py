@@ -0,0 +1,172 @@
+"""
+Scan Events API
+
+Pushes "book processed" notifications to clients instead of making them poll
+after a scan. Backed by utils.scan_notifications, which is fed by the
+worker's completion events.
+
+Two transports, same filters (ISBNs and/or username):
+- GET /barcode/events: server-sent events stream
+- GET /barcode/wait: long poll returning as soon as something happened
+
+Both first report books that were already resolved before the request
+arrived (saved, or stuck in the queue), so a client can't miss a completion
+that raced with its subscription.
+"""
+
+import json
+import time
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from sqlalchemy import or_
+from utils.db_models import SessionLocal, Book, PendingBook
+from utils.isbn import isbn_pair, InvalidISBNError
+from utils.scan_notifications import completion_broker, isbn_keys, BOOK_READY, BOOK_FAILED
+
+scan_events_api = Blueprint("scan_events_api", __name__)
+
+HEARTBEAT_INTERVAL = 15  # seconds between SSE keep-alive comments
+STREAM_MAX_LIFETIME = 3600  # seconds before an SSE stream is closed (client reconnects)
+LONG_POLL_MAX_TIMEOUT = 60  # seconds
+MAX_WATCHED_ISBNS = 500
+
+
+def _parse_filters():
+    """Read ?isbns=a,b&username=u; returns (isbns, username, error response or None)."""
+    isbns = [i.strip() for i in request.args.get("isbns", "").split(",") if i.strip()]
+    username = request.args.get("username") or None
+    if not isbns and not username:
+        return None, None, (jsonify({"error": "isbns or username is required"}), 400)
+    if len(isbns) > MAX_WATCHED_ISBNS:
+        return None, None, (jsonify({"error": f"At most {MAX_WATCHED_ISBNS} ISBNs"}), 400)
+    return isbns, username, None
+
+
+def _already_resolved(isbns: list) -> list:
+    """
+    Notifications for watched ISBNs that are already saved or stuck.
+
+    Args:
+        isbns: ISBNs as given by the client (any notation)
+
+    Returns:
+        List of notification dictionaries (same format as live ones)
+    """
+    pairs = []
+    for isbn in isbns:
+        try:
+            pairs.append(isbn_pair(isbn))
+        except InvalidISBNError:
+            continue
+    if not pairs:
+        return []
+
+    isbn10s = {isbn10 for isbn10, _ in pairs if isbn10}
+    isbn13s = {isbn13 for _, isbn13 in pairs}
+    session = SessionLocal()
+    try:
+        books = session.query(Book.isbn, Book.isbn13, Book.title).filter(
+            or_(Book.isbn.in_(isbn10s), Book.isbn13.in_(isbn13s))
+        ).all()
+        stuck = session.query(PendingBook.isbn, PendingBook.requested_by).filter(
+            PendingBook.isbn.in_(isbn13s | isbn10s), PendingBook.stucked == True
+        ).all()
+    finally:
+        session.close()
+
+    notifications = [
+        {"type": BOOK_READY, "isbn": isbn, "isbn13": isbn13, "title": title,
+         "cover_url": f"/cover/{isbn}.jpg", "requested_by": None}
+        for isbn, isbn13, title in books
+    ]
+    notifications += [
+        {"type": BOOK_FAILED, "isbn": isbn, "reason": None, "requested_by": requested_by}
+        for isbn, requested_by in stuck
+    ]
+    return notifications
+
+
+@scan_events_api.route("/barcode/events", methods=["GET"])
+def scan_events_stream():
+    """
+    Server-sent events stream of processed books.
+
+    Query parameters:
+        isbns: Comma-separated ISBNs to watch (optional if username given)
+        username: Watch every book queued by this user (optional)
+
+    Returns:
+        200: text/event-stream; each event is "event: <type>" with the
+             notification as JSON data. When only ISBNs are watched the
+             stream ends once all of them are resolved.
+        400: No filter given or too many ISBNs
+    """
+    isbns, username, error = _parse_filters()
+    if error:
+        return error
+
+    subscription = completion_broker.subscribe(isbns, username)
+
+    def generate():
+        # One key set per watched ISBN, whatever notation resolves it
+        unresolved = [isbn_keys(isbn) for isbn in isbns]
+        deadline = time.monotonic() + STREAM_MAX_LIFETIME
+        try:
+            backlog = _already_resolved(isbns)
+            yield "retry: 3000\n\n"
+            while time.monotonic() < deadline:
+                notification = backlog.pop(0) if backlog else subscription.get(HEARTBEAT_INTERVAL)
+                if notification is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {notification['type']}\ndata: {json.dumps(notification)}\n\n"
+
+                keys = isbn_keys(notification["isbn"]) | isbn_keys(notification.get("isbn13") or "")
+                unresolved = [k for k in unresolved if not k & keys]
+                if isbns and not username and not unresolved:
+                    break
+        finally:
+            completion_broker.unsubscribe(subscription)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@scan_events_api.route("/barcode/wait", methods=["GET"])
+def scan_events_wait():
+    """
+    Long poll for processed books.
+
+    Query parameters:
+        isbns: Comma-separated ISBNs to watch (optional if username given)
+        username: Watch every book queued by this user (optional)
+        timeout: Seconds to wait when nothing is resolved yet (default 25, max 60)
+
+    Returns:
+        200: {"events": [...]} - empty list when the timeout expired
+        400: No filter given or too many ISBNs
+    """
+    isbns, username, error = _parse_filters()
+    if error:
+        return error
+    timeout = min(max(request.args.get("timeout", 25, type=float), 0), LONG_POLL_MAX_TIMEOUT)
+
+    subscription = completion_broker.subscribe(isbns, username)
+    try:
+        events = _already_resolved(isbns)
+        if not events:
+            notification = subscription.get(timeout)
+            if notification:
+                events.append(notification)
+        # Drain whatever arrived together (e.g. one indexing batch)
+        while True:
+            notification = subscription.get(0)
+            if notification is None:
+                break
+            events.append(notification)
+    finally:
+        completion_broker.unsubscribe(subscription)
+
+    return jsonify({"events": events}), 200
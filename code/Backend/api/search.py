@@ -4,26 +4,200 @@ Book Search API
 Provides text-based search functionality across the book database.
 Searches multiple fields including title, authors, ISBN, and genres
 with case-insensitive partial matching.
+
+Queries are answered from the in-memory inverted index
+(utils.search_index); the SQL ILIKE scan is only used while the index is
+still loading at startup. Autocomplete suggestions come from a separate
+prefix trie (utils.suggest_index).
+
+Serialized search responses are cached (utils.response_cache) and dropped
+selectively when the worker saves books matching a cached query.
 """
 
-from flask import Blueprint, request, jsonify
+import re
+import json
+import base64
+from flask import Blueprint, Response, request, jsonify
 from utils.db_models import SessionLocal, Book
+from utils.search_index import search_index, book_result, tokenize, FACETS
+from utils.response_cache import ResponseCache
+from utils.isbn import isbn_pair, InvalidISBNError
+from utils.index_events import subscribe, BOOKS_ADDED, BOOKS_REMOVED, RESYNC
+from utils.suggest_index import suggest_index
 from sqlalchemy import or_
 
 search_api = Blueprint("search_api", __name__)
 
+search_cache = ResponseCache("search")
+
+DEFAULT_PAGE_SIZE = 30
+MAX_PAGE_SIZE = 100
+RESULT_FIELDS = ("isbn", "isbn13", "title", "authors", "cover_url", "genres")
+
+# Queries treated as an ISBN or ISBN prefix (after removing separators)
+ISBN_QUERY = re.compile(r"\d{6,12}[\dX]?")
+ISBN_SEPARATORS = re.compile(r"[\s\-]")
+
+
+def _on_index_event(event: dict) -> None:
+    """
+    Drop cached searches the changed books could appear in.
+
+    Subscribed after the search index, so the new books are already
+    searchable when their queries are dropped.
+    """
+    if event["type"] == BOOKS_ADDED:
+        isbns = [book["isbn"] for book in event.get("books", [])]
+        if search_index.loaded:
+            search_cache.invalidate_matching(search_index.book_tokens(isbns), generation=event["seq"])
+        else:
+            search_cache.clear(generation=event["seq"])
+    elif event["type"] in (BOOKS_REMOVED, RESYNC):
+        search_cache.clear(generation=event["seq"])
+
+
+subscribe(_on_index_event)
+
+
+def _encode_cursor(position: list) -> str:
+    """
+    Opaque, URL-safe cursor for a result position.
+
+    Text searches use [score, doc id]; ISBN lookups use ["isbn", last ISBN].
+    """
+    return base64.urlsafe_b64encode(json.dumps(list(position)).encode()).decode()
+
+
+def _decode_cursor(cursor: str):
+    """Position from a cursor, or None if it is malformed."""
+    try:
+        first, second = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if first == "isbn":
+            return "isbn", str(second)
+        return float(first), int(second)
+    except (ValueError, TypeError):
+        return None
+
+
+def _isbn_search(compact: str, limit: int, after, fields: tuple):
+    """
+    Resolve an ISBN-shaped query through the ISBN keys instead of text search.
+
+    A full, valid ISBN is matched for equality on both of its forms (a single
+    page); anything else is a prefix lookup paged by ISBN.
+
+    Args:
+        compact: Query without separators, uppercase (e.g. "978207036", "207036822X")
+        limit: Page size
+        after: Decoded cursor (("isbn", key) for ISBN pages) or None
+        fields: Result fields to return
+
+    Returns:
+        Flask response, or None when nothing matched and text search should run
+    """
+    try:
+        isbn10, isbn13 = isbn_pair(compact)
+    except InvalidISBNError:
+        isbn10 = isbn13 = None
+
+    after_key = after[1] if after and after[0] == "isbn" else None
+    if isbn13:
+        keys = [key for key in (isbn10, isbn13) if key]
+        if search_index.loaded:
+            results = search_index.find_isbns(keys)
+        else:
+            session = SessionLocal()
+            try:
+                books = session.query(Book).filter(or_(Book.isbn.in_(keys), Book.isbn13.in_(keys))).all()
+            finally:
+                session.close()
+            results = [book_result(book) for book in books]
+        next_key = None
+        if after_key is not None:
+            return jsonify({"error": "Invalid cursor"}), 400  # Exact lookups have a single page
+    elif search_index.loaded:
+        results, next_key = search_index.lookup_isbn(compact, limit=limit, after=after_key)
+    elif after_key is not None:
+        return jsonify({"error": "Search index is loading, retry shortly"}), 503
+    else:
+        session = SessionLocal()
+        try:
+            books = session.query(Book).filter(
+                or_(Book.isbn.like(f"{compact}%"), Book.isbn13.like(f"{compact}%"))
+            ).order_by(Book.isbn13).limit(limit).all()
+        finally:
+            session.close()
+        results, next_key = [book_result(book) for book in books], None
+
+    if not results and after_key is None:
+        return None
+    if after is not None and after_key is None:
+        # A text search cursor, but the query now resolves to ISBN results
+        return jsonify({"error": "Invalid cursor"}), 400
+    headers = {"X-Search-Mode": "isbn"}
+    if next_key is not None:
+        headers["X-Next-Cursor"] = _encode_cursor(["isbn", next_key])
+    if request.args.get("count") == "1" and next_key is None:
+        headers["X-Total-Count"] = str(len(results))
+    return Response(
+        json.dumps([_project(result, fields) for result in results]),
+        mimetype="application/json", headers=headers,
+    )
+
+
+def _parse_fields(value: str):
+    """Requested result fields (all by default), or None if one is unknown."""
+    if not value:
+        return RESULT_FIELDS
+    fields = tuple(f.strip() for f in value.split(",") if f.strip())
+    if not fields or any(f not in RESULT_FIELDS for f in fields):
+        return None
+    return fields
+
+
+def _project(result: dict, fields: tuple) -> dict:
+    return {field: result[field] for field in fields}
+
+
+def _parse_filters() -> dict:
+    """Facet filters from repeated query parameters (?genre=Fantasy&genre=Horror&language=fr)."""
+    filters = {}
+    for facet in FACETS:
+        values = [v.strip() for v in request.args.getlist(facet) if v.strip()]
+        if values:
+            filters[facet] = values
+    return filters
+
+
+def _cache_key(words: list) -> str:
+    """Normalized query words plus every other query parameter (paging, ...)."""
+    params = sorted((k, v) for k, v in request.args.items(multi=True) if k != "q")
+    return " ".join(words) + "?" + "&".join(f"{k}={v}" for k, v in params)
+
 
 @search_api.route("/api/search", methods=["GET"])
 def search_books():
     """
     Search for books across multiple fields.
 
-    Query parameter:
+    Query parameters:
         q: Search query string
+        limit: Page size (default 30, max 100)
+        cursor: Opaque cursor from a previous page's X-Next-Cursor header
+        fields: Comma-separated subset of result fields to return
+                (isbn, isbn13, title, authors, cover_url, genres)
+        count: "1" to get the total number of matches in X-Total-Count
+        language, publisher, genre, author, pages, year: Facet filters
+                (repeat a parameter to accept several values, e.g.
+                 ?genre=Fantasy&genre=Horror; pages takes ranges such as
+                 "200-299" or "600+", see /api/search/facets)
 
     Returns:
-        200: List of matching books (limited to 30 results)
-        200: Empty array if no query provided
+        200: List of matching books, best match first
+             Headers: X-Next-Cursor (absent on the last page), X-Total-Count
+        200: Empty array if neither query nor filter is provided
+        400: Invalid cursor, limit or field name
+        503: Cursor or filters given while the search index is still loading
 
     Search fields:
         - title: Book title (partial match)
@@ -32,14 +206,66 @@ def search_books():
         - authors: Author names (partial match)
         - genres: Genre categories (partial match)
 
-    All searches are case-insensitive and support partial matching.
+    All searches are case-insensitive, accent-insensitive and support
+    partial matching. Every word of the query must match.
+
+    Paging is keyset-based: the cursor encodes the ranking key of the last
+    result, so page N costs the same as page 1.
+
+    ISBN-shaped queries (6+ digits, hyphens allowed) are resolved on the
+    ISBN keys with X-Search-Mode: isbn: a full ISBN by equality on its
+    ISBN-10 and ISBN-13, a partial one by prefix, ordered by ISBN. Text
+    search runs only when no ISBN matches; a cursor from the other mode is
+    rejected with 400.
     """
     q = request.args.get("q", "").strip()
+    filters = _parse_filters()
 
     # Return empty results if no search query provided
-    if not q:
+    if not q and not filters:
         return jsonify([])
 
+    limit = request.args.get("limit", DEFAULT_PAGE_SIZE, type=int)
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+    fields = _parse_fields(request.args.get("fields"))
+    if fields is None:
+        return jsonify({"error": f"fields must be a subset of {', '.join(RESULT_FIELDS)}"}), 400
+    cursor = request.args.get("cursor")
+    after = None
+    if cursor:
+        after = _decode_cursor(cursor)
+        if after is None:
+            return jsonify({"error": "Invalid cursor"}), 400
+
+    # Typed or pasted ISBN (or ISBN prefix): indexed lookup, text search only if nothing matches
+    compact = ISBN_SEPARATORS.sub("", q).upper()
+    if ISBN_QUERY.fullmatch(compact) and not filters:
+        response = _isbn_search(compact, limit, after, fields)
+        if response is not None:
+            return response
+    if after is not None and after[0] == "isbn":
+        return jsonify({"error": "Invalid cursor"}), 400
+
+    if search_index.loaded:
+        words = list(dict.fromkeys(tokenize(q)))
+        key = _cache_key(words)
+        cached = search_cache.get(key)
+        cache_status = "HIT"
+        if cached is None:
+            cache_status = "MISS"
+            results, next_key, total = search_index.search_page(q, limit=limit, after=after, filters=filters)
+            headers = {"X-Total-Count": str(total)} if request.args.get("count") == "1" else {}
+            if next_key is not None:
+                headers["X-Next-Cursor"] = _encode_cursor(next_key)
+            cached = (json.dumps([_project(r, fields) for r in results]), headers)
+            search_cache.set(key, cached, words=words)
+        body, headers = cached
+        return Response(body, mimetype="application/json", headers={**headers, "X-Cache": cache_status})
+
+    if cursor or filters:
+        return jsonify({"error": "Search index is loading, retry shortly"}), 503
+
     session = SessionLocal()
 
     # Perform case-insensitive partial match across multiple fields
@@ -51,21 +277,82 @@ def search_books():
             Book.authors.ilike(f"%{q}%"),
             Book.genres.ilike(f"%{q}%"),
         )
-    ).limit(30).all()  # Limit results to prevent overwhelming the frontend
+    ).limit(limit).all()  # Limit results to prevent overwhelming the frontend
 
     # Format results for frontend consumption
-    results = []
-    for book in books:
-        results.append(
-            {
-                "isbn": book.isbn,
-                "isbn13": book.isbn13,
-                "title": book.title,
-                "authors": book.authors,
-                "cover_url": book.cover_url,
-                "genres": book.genres,
-            }
-        )
+    results = [_project(book_result(book), fields) for book in books]
 
     session.close()
     return jsonify(results)
+
+
+@search_api.route("/api/search/facets", methods=["GET"])
+def search_facets():
+    """
+    Facet value counts for a search, to build filter menus.
+
+    Query parameters:
+        q: Search query string (optional: counts over the whole catalog)
+        language, publisher, genre, author, pages, year: Facet filters, as
+            for /api/search
+        top: Values returned per facet (default 20, max 100)
+
+    Returns:
+        200: {"language": [{"value": "fr", "count": 12}, ...], "publisher": [...],
+              "genre": [...], "author": [...], "pages": [...], "year": [...]}
+        503: Search index still loading
+
+    Counts come from the facet posting lists of the search index; for the
+    whole catalog they are the posting list sizes and no book is visited.
+    """
+    if not search_index.loaded:
+        return jsonify({"error": "Search index is loading, retry shortly"}), 503
+
+    q = request.args.get("q", "").strip()
+    filters = _parse_filters()
+    top = min(max(request.args.get("top", 20, type=int), 1), 100)
+
+    words = list(dict.fromkeys(tokenize(q)))
+    key = "facets:" + _cache_key(words)
+    body = search_cache.get(key)
+    cache_status = "HIT"
+    if body is None:
+        cache_status = "MISS"
+        body = json.dumps(search_index.facet_counts(q, filters, top=top))
+        search_cache.set(key, body, words=words)
+    return Response(body, mimetype="application/json", headers={"X-Cache": cache_status})
+
+
+@search_api.route("/api/search/suggest", methods=["GET"])
+def suggest_books():
+    """
+    Autocomplete titles and author names while the user types.
+
+    Query parameters:
+        q: Partial query
+        limit: Number of suggestions (default 8, max 20)
+
+    Returns:
+        200: List of suggestions, best first:
+             {"text": "The Hobbit", "type": "title", "isbn": "0261102214", "distance": 0}
+             {"text": "J.R.R. Tolkien", "type": "author", "isbn": null, "distance": 1}
+        200: Empty array if no query provided
+
+    Tolerates small typos (per word: edit distance 1 from 4 characters, 2
+    from 8; at most 2 per query) and ranks by number of user scans. While the
+    suggestion index is loading, falls back to a title prefix query.
+    """
+    q = request.args.get("q", "").strip()
+    limit = min(max(request.args.get("limit", 8, type=int), 1), 20)
+    if not q:
+        return jsonify([])
+
+    if suggest_index.loaded:
+        return jsonify(suggest_index.suggest(q, limit=limit))
+
+    session = SessionLocal()
+    try:
+        rows = session.query(Book.isbn, Book.title).filter(Book.title.ilike(f"{q}%")).limit(limit).all()
+    finally:
+        session.close()
+    return jsonify([{"text": title, "type": "title", "isbn": isbn, "distance": 0} for isbn, title in rows])
@@ -15,15 +15,20 @@ Key features:
 
 from flask import Blueprint, request, jsonify
 from sqlalchemy.exc import IntegrityError, OperationalError, TimeoutError
-from sqlalchemy import desc
-from utils.db_models import SessionLocal, User, UserScan, Book, Collection, CollectionBook
-from datetime import datetime
+from utils.db_models import SessionLocal, User, UserScan
+from utils.isbn import book_key
+from utils import scan_history, cascade_delete
+from utils.catalog import catalog
+from utils.user_cache import user_ids
+from datetime import datetime, timezone
 import time
 import random
 from urllib.parse import unquote
 
 users_api = Blueprint("users_api", __name__)
 
+MAX_SCAN_BATCH_SIZE = 1000  # scans accepted per /api/user_scans/batch request
+
 
 def retry_db_operation(operation, max_retries: int = 3, base_delay: float = 0.1):
     """
@@ -83,6 +88,7 @@ def create_user():
     
     try:
         session.commit()
+        user_ids.invalidate(user.username)  # Drop "no such user" entries
         return jsonify({"id": user.id, "username": user.username}), 201
     except IntegrityError:
         session.rollback()
@@ -119,6 +125,8 @@ def add_user_scan():
         
     Returns:
         201: Scan recorded successfully
+        400: Missing username/ISBN or invalid ISBN (legacy books whose
+            ISBN fails the checksum are accepted as given)
         409: Scan already exists for this user/book combination
         503: Database timeout after retries
         500: Unexpected error
@@ -129,20 +137,19 @@ def add_user_scan():
     
     if not username or not isbn:
         return jsonify({"error": "username and isbn are required"}), 400
+    isbn, valid = book_key(isbn)
+    if not valid and not catalog.lookup([isbn]):
+        return jsonify({"error": "Invalid ISBN"}), 400
 
     def db_operation():
         """Database operation with proper error handling and session management."""
         session = SessionLocal()
         try:
-            # Get or create user
-            user = session.query(User).filter_by(username=username).first()
-            if not user:
-                user = User(username=username)
-                session.add(user)
-                session.commit()
+            # Get or create user (cached id, atomic creation)
+            user_id = user_ids.get_or_create(session, username)
 
             # Create scan record
-            scan = UserScan(user_id=user.id, isbn=isbn, timestamp=datetime.utcnow())
+            scan = UserScan(user_id=user_id, isbn=isbn, timestamp=datetime.utcnow())
             session.add(scan)
             session.commit()
             return {"success": True, "status": 201}
@@ -171,6 +178,143 @@ def add_user_scan():
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
 
 
+def _parse_scan_time(value):
+    """Naive UTC datetime from an ISO 8601 string (None -> now), or None if malformed."""
+    if value is None:
+        return datetime.utcnow().replace(microsecond=0)
+    try:
+        timestamp = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp.replace(microsecond=0)  # DATETIME precision, so duplicates compare equal
+
+
+@users_api.route("/api/user_scans/batch", methods=["POST"])
+def add_user_scans_batch():
+    """
+    Record many scans of one user at once (offline clients syncing).
+
+    The user is resolved (or created) once, known books and existing scans
+    are checked with one query each, and every new scan is inserted with a
+    single INSERT IGNORE in one transaction.
+
+    Expected JSON payload:
+        {"username": "john_doe",
+         "scans": [{"isbn": "2070368228", "timestamp": "2024-05-01T10:12:00Z"}, ...]}
+
+    timestamp is optional (defaults to now); naive timestamps are UTC.
+
+    Returns:
+        200: Per-scan results (in request order) and a summary
+        400: Missing username, empty scan list or more than MAX_SCAN_BATCH_SIZE scans
+        503: Database timeout after retries
+        500: Unexpected error
+
+    Each result has "index", "status" and, when valid, "isbn":
+        - recorded: Scan saved
+        - duplicate: Same user/book/timestamp already recorded (or repeated in the batch)
+        - unknown_book: ISBN is not in the books table
+        - invalid: Not a valid ISBN or timestamp (values failing the
+          checksum are accepted when a legacy book has them as ISBN)
+    """
+    data = request.get_json(silent=True) or {}
+    username = (data.get("username") or "").strip()
+    scans = data.get("scans")
+    if not username:
+        return jsonify({"error": "username is required"}), 400
+    if not isinstance(scans, list) or not scans:
+        return jsonify({"error": "scans must be a non-empty list"}), 400
+    if len(scans) > MAX_SCAN_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_SCAN_BATCH_SIZE} scans per batch"}), 400
+
+    # Normalize up front: (isbn, timestamp) or None when invalid. Values
+    # failing the checksum are kept as given in case a legacy book has them.
+    parsed = []
+    legacy = set()
+    for scan in scans:
+        try:
+            isbn, valid = book_key(scan.get("isbn", ""))
+        except AttributeError:
+            parsed.append(None)
+            continue
+        timestamp = _parse_scan_time(scan.get("timestamp"))
+        if not isbn or not timestamp:
+            parsed.append(None)
+            continue
+        if not valid:
+            legacy.add(isbn)
+        parsed.append((isbn, timestamp))
+
+    isbns = {entry[0] for entry in parsed if entry}
+
+    def db_operation():
+        """Resolve the user, filter known books/existing scans and insert the rest."""
+        session = SessionLocal()
+        try:
+            user_id = user_ids.get_or_create(session, username)
+
+            known = set(catalog.lookup(isbns, session)) if isbns else set()
+            existing = set()
+            if known:
+                existing = {
+                    (isbn, timestamp) for isbn, timestamp in session.query(UserScan.isbn, UserScan.timestamp).filter(
+                        UserScan.user_id == user_id, UserScan.isbn.in_(known)
+                    )
+                }
+
+            statuses = []
+            fresh = []
+            seen = set()
+            for entry in parsed:
+                if entry is None or (entry[0] in legacy and entry[0] not in known):
+                    statuses.append("invalid")
+                elif entry[0] not in known:
+                    statuses.append("unknown_book")
+                elif entry in existing or entry in seen:
+                    statuses.append("duplicate")
+                else:
+                    seen.add(entry)
+                    fresh.append({"user_id": user_id, "isbn": entry[0], "timestamp": entry[1]})
+                    statuses.append("recorded")
+
+            if fresh:
+                # INSERT IGNORE: a concurrent single-scan request must not fail the batch
+                session.execute(UserScan.__table__.insert().prefix_with("IGNORE"), fresh)
+            session.commit()
+            return {"statuses": statuses, "status": 200}
+
+        except (OperationalError, TimeoutError) as e:
+            session.rollback()
+            if "Lock wait timeout" in str(e) or "timeout" in str(e).lower():
+                raise e  # Let retry mechanism handle it
+            return {"error": f"Database error: {str(e)}", "status": 500}
+        finally:
+            session.close()
+
+    try:
+        result = retry_db_operation(db_operation, max_retries=3)
+    except (OperationalError, TimeoutError) as e:
+        return jsonify({"error": f"Database timeout after retries: {str(e)}"}), 503
+    except Exception as e:
+        return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
+    if result["status"] != 200:
+        return jsonify({"error": result["error"]}), result["status"]
+
+    results = []
+    for index, (entry, status) in enumerate(zip(parsed, result["statuses"])):
+        item = {"index": index, "status": status}
+        if entry and status != "invalid":
+            item["isbn"] = entry[0]
+        results.append(item)
+
+    summary = {status: 0 for status in ("recorded", "duplicate", "unknown_book", "invalid")}
+    for status in result["statuses"]:
+        summary[status] += 1
+    return jsonify({"results": results, "summary": summary}), 200
+
+
 @users_api.route("/api/user_scans/<username>", methods=["DELETE"])
 def delete_user_scans(username):
     """
@@ -186,14 +330,13 @@ def delete_user_scans(username):
     username = unquote(username)
     session = SessionLocal()
     
-    user = session.query(User).filter_by(username=username).first()
-    if not user:
+    user_id = user_ids.resolve(session, username)
+    if user_id is None:
         session.close()
         return jsonify({"error": "User not found"}), 404
 
-    # Delete all scans for this user
-    session.query(UserScan).filter_by(user_id=user.id).delete()
-    session.commit()
+    # Delete all scans for this user, in bounded chunks
+    cascade_delete.delete_in_chunks(session, "user_scans", "user_id = :user_id", {"user_id": user_id})
     session.close()
     return jsonify({"message": "All scan history deleted"}), 200
 
@@ -205,82 +348,46 @@ def get_recently_scanned(username):
     
     Returns all scanned books even if the book details are no longer
     in the database, showing "Unknown" for missing information.
+    Paginated with a keyset cursor (see utils.scan_history), so the
+    response time doesn't grow with the size of the history.
     
     Args:
         username: URL-encoded username
+
+    Query parameters:
+        limit: Page size (default 50, max 200)
+        cursor: X-Next-Cursor value of the previous page
+        distinct: 1 to keep only the latest scan of each book
         
     Returns:
-        200: List of recently scanned books with details and timestamps
+        200: List of recently scanned books with details and timestamps;
+             X-Next-Cursor header when more scans follow
         200: Empty array if user not found or has no scans
+        400: Malformed cursor
         500: Database error
     """
     username = unquote(username)
-    print(f"[DEBUG] get_recently_scanned called with username: '{username}'")
-    
-    try:
-        session = SessionLocal()
-    except Exception as e:
-        print(f"[DEBUG] Failed to create session: {e}")
-        return jsonify({"error": "Database connection failed"}), 500
-    
-    try:
-        user = session.query(User).filter_by(username=username).first()
-        if not user:
-            print(f"[DEBUG] User '{username}' not found in database - returning empty array")
-            session.close()
-            return jsonify([]), 200
-
-        print(f"[DEBUG] User '{username}' found with ID: {user.id}")
-
-        # Get all user scans ordered by most recent first
-        user_scans = session.query(UserScan).filter(
-            UserScan.user_id == user.id
-        ).order_by(desc(UserScan.timestamp)).all()
-
-        print(f"[DEBUG] Found {len(user_scans)} scans for user '{username}'")
-
-        if not user_scans:
-            print(f"[DEBUG] Returning empty array for user '{username}'")
-            session.close()
-            return jsonify([]), 200
-
-        result = []
-        for scan in user_scans:
-            print(f"[DEBUG] Processing scan: ISBN={scan.isbn}, timestamp={scan.timestamp}")
-            
-            # Try to find the book details
-            book = session.query(Book).filter_by(isbn=scan.isbn).first()
-            
-            if book:
-                result.append({
-                    "isbn": book.isbn,
-                    "title": book.title,
-                    "authors": book.authors,
-                    "cover_url": book.cover_url,
-                    "timestamp": scan.timestamp.isoformat() if scan.timestamp else None
-                })
-                print(f"[DEBUG] Added book: {book.title}")
-            else:
-                # Book not found in database, but still show the scan
-                result.append({
-                    "isbn": scan.isbn,
-                    "title": f"Book {scan.isbn}",
-                    "authors": "Unknown",
-                    "cover_url": None,
-                    "timestamp": scan.timestamp.isoformat() if scan.timestamp else None
-                })
-                print(f"[DEBUG] Book with ISBN {scan.isbn} not found in Book table")
+    limit = min(max(request.args.get("limit", scan_history.DEFAULT_LIMIT, type=int), 1), scan_history.MAX_LIMIT)
+    after = None
+    if request.args.get("cursor"):
+        after = scan_history.decode_cursor(request.args["cursor"])
+        if after is None:
+            return jsonify({"error": "Invalid cursor"}), 400
+    distinct = request.args.get("distinct") == "1"
 
-        print(f"[DEBUG] Returning {len(result)} results")
-        session.close()
-        return jsonify(result), 200
-        
+    session = SessionLocal()
+    try:
+        items, next_cursor = scan_history.recent_scans(session, username, limit, after, distinct)
     except Exception as e:
-        print(f"[DEBUG] Error in get_recently_scanned: {e}")
-        print(f"[DEBUG] Exception type: {type(e)}")
-        print(f"[DEBUG] Exception args: {e.args}")
-        session.close()
+        print(f"❌ get_recently_scanned failed for '{username}': {e}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
+
+    response = jsonify(items)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response, 200
 
 
 @users_api.route("/api/debug/user/<username>", methods=["GET"])
@@ -353,38 +460,51 @@ def delete_user(username):
     
     Cascades to delete:
     - All user's collections and their books
-    - All user's scan history
+    - All user's scan history and added books
     - The user account itself
+
+    Uses set-based deletes in bounded chunks (utils.cascade_delete), so
+    locks are only held for one chunk at a time.
     
     Args:
         username: URL-encoded username
         
     Returns:
-        200: User deleted successfully
+        200: User deleted successfully, with rows deleted per table
         404: User not found
+        409: Rows kept being added concurrently; the request can be repeated
+        503: Database timeout after retries
     """
     username = unquote(username)
-    session = SessionLocal()
-    
-    user = session.query(User).filter_by(username=username).first()
-    if not user:
-        session.close()
-        return jsonify({"error": "User not found"}), 404
 
-    # Delete all collections and their books for this user
-    collections = session.query(Collection).filter_by(owner=user.id).all()
-    for collection in collections:
-        # Delete all books in this collection
-        session.query(CollectionBook).filter_by(collection_id=collection.id).delete()
-        # Delete the collection itself
-        session.delete(collection)
+    def db_operation():
+        """Chunked set-based deletes; safe to re-run after a lock timeout."""
+        session = SessionLocal()
+        try:
+            user_id = user_ids.resolve(session, username)
+            if user_id is None:
+                return {"error": "User not found", "status": 404}
+            counts = cascade_delete.delete_user(session, user_id)
+            return {"deleted": counts, "status": 200}
+        except IntegrityError as e:
+            # The cascade kept colliding with new rows; what it deleted stays
+            # deleted and a new request finishes the job
+            session.rollback()
+            return {"error": f"User is being modified, try again: {str(e)}", "status": 409}
+        except (OperationalError, TimeoutError) as e:
+            session.rollback()
+            if "Lock wait timeout" in str(e) or "timeout" in str(e).lower():
+                raise e  # Let retry mechanism handle it
+            return {"error": f"Database error: {str(e)}", "status": 500}
+        finally:
+            session.close()
+
+    try:
+        result = retry_db_operation(db_operation, max_retries=3)
+    except (OperationalError, TimeoutError) as e:
+        return jsonify({"error": f"Database timeout after retries: {str(e)}"}), 503
+    if result["status"] != 200:
+        return jsonify({"error": result["error"]}), result["status"]
 
-    # Delete user scans
-    session.query(UserScan).filter_by(user_id=user.id).delete()
-    
-    # Delete user account
-    session.delete(user)
-    session.commit()
-    session.close()
-    
-    return jsonify({"message": f"User '{username}' deleted."}), 200
+    user_ids.invalidate(username)
+    return jsonify({"message": f"User '{username}' deleted.", "deleted": result["deleted"]}), 200
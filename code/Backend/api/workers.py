@@ -10,6 +10,7 @@ can be started/stopped via the admin interface.
 
 import subprocess
 import threading
+from utils.worker_metrics import read_worker_metrics
 
 # Global registry for all worker processes
 # Each worker has: start_cmd, script_path, process handle, and running status
@@ -78,8 +79,9 @@ def get_worker_status() -> dict:
     Get current status of all registered workers.
 
     Returns:
-        Dictionary mapping worker_id to status info (name, running)
+        Dictionary mapping worker_id to status info (name, running, metrics)
     """
+    metrics = read_worker_metrics()
     status = {}
     for worker_id, worker in WORKERS.items():
         # Check if process is actually still running
@@ -89,6 +91,7 @@ def get_worker_status() -> dict:
         status[worker_id] = {
             "name": worker_id,
             "running": running,
+            "metrics": metrics.get(worker_id, []),
         }
     return status
 
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Collection Merge Worker
+
+Processes collection_merge_jobs created by the merge endpoint
+(POST /api/collections/<username>/<id>/merge), so merging collections with
+thousands of books never runs inside a request.
+
+For each job:
+1. Copies the source collection's books into the target in chunks of
+   MERGE_CHUNK_SIZE, each one INSERT ... SELECT over a keyset range of the
+   collection_books primary key, committed together with the job's cursor.
+   Books already in the target are skipped (deduplication), and a
+   restarted job resumes after its last committed chunk. If the target is
+   deleted meanwhile, the insert fails on its foreign key and so does the
+   job.
+2. Deletes the source collection when requested, with the chunked deletes
+   of utils.cascade_delete, once every source book is in the target.
+
+Every transaction covers a single chunk, so locks are held briefly.
+Progress is stored on the job row (copied / total) and published through
+worker metrics (/admin/api/workers/status).
+
+Several workers can run side by side: each chunk commit refreshes the job's
+heartbeat_at, and only "running" jobs without a heartbeat for
+STALE_JOB_AFTER seconds (their worker died) are requeued.
+"""
+
+import os
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import text, func
+from sqlalchemy.exc import IntegrityError
+from utils.db_models import SessionLocal, AppLog, Collection, CollectionBook, CollectionMergeJob
+from utils.worker_metrics import WorkerMetrics
+from utils import cascade_delete
+
+CHECK_INTERVAL = 2  # seconds between job polls
+MERGE_CHUNK_SIZE = int(os.getenv("MERGE_CHUNK_SIZE", "1000"))  # books copied per transaction
+CHUNK_ATTEMPTS = 3  # tries per chunk when a concurrent add collides with it
+STALE_JOB_AFTER = int(os.getenv("MERGE_STALE_JOB_AFTER", "600"))  # seconds without heartbeat before requeue
+
+# Throughput/latency metrics, exposed through /admin/api/workers/status
+metrics = WorkerMetrics("merge_collection_worker")
+
+
+def log_app(level: str, message: str, context: dict = None) -> None:
+    """
+    Log application events to database and console.
+
+    Every entry is tagged with {"source": "merge_collection_worker"}.
+
+    Args:
+        level: Log level (INFO, WARNING, ERROR, SUCCESS)
+        message: Human-readable log message
+        context: Optional additional context data
+    """
+    context = dict(context or {}, source="merge_collection_worker")
+    session = SessionLocal()
+    session.add(AppLog(level=level, message=message, context=context))
+    session.commit()
+    session.close()
+    print(f"[{level}] {message}")
+
+
+def claim_next_job(session):
+    """
+    Atomically move the oldest queued job to "running".
+
+    Returns:
+        The claimed CollectionMergeJob, or None if the queue is empty
+    """
+    while True:
+        job = session.query(CollectionMergeJob).filter_by(status="queued").order_by(CollectionMergeJob.id).first()
+        if job is None:
+            return None
+        now = datetime.utcnow()
+        claimed = session.query(CollectionMergeJob).filter_by(id=job.id, status="queued").update(
+            {"status": "running", "started_at": job.started_at or now, "heartbeat_at": now},
+            synchronize_session=False
+        )
+        session.commit()
+        if claimed:
+            session.refresh(job)
+            return job
+        # Another worker claimed it first: try the next one
+
+
+def requeue_stale_jobs(session) -> int:
+    """
+    Requeue "running" jobs whose worker stopped heartbeating (crashed or killed).
+
+    Returns:
+        Number of jobs requeued; they resume from their cursor
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=STALE_JOB_AFTER)
+    requeued = session.query(CollectionMergeJob).filter(
+        CollectionMergeJob.status == "running",
+        func.coalesce(CollectionMergeJob.heartbeat_at, CollectionMergeJob.started_at) < cutoff,
+    ).update({"status": "queued"}, synchronize_session=False)
+    session.commit()
+    return requeued
+
+
+def copy_chunk(session, job) -> bool:
+    """
+    Copy the next chunk of source books into the target.
+
+    Returns:
+        True if books were copied, False once the source is exhausted
+    """
+    after = job.cursor or ""
+    # Bounds of the chunk: the next MERGE_CHUNK_SIZE ISBNs of the source
+    upper, copied = session.execute(
+        text(
+            "SELECT MAX(isbn), COUNT(*) FROM (SELECT isbn FROM collection_books"
+            " WHERE collection_id = :source AND isbn > :after ORDER BY isbn LIMIT :chunk) AS chunk"
+        ),
+        {"source": job.source_id, "after": after, "chunk": MERGE_CHUNK_SIZE},
+    ).one()
+    if not copied:
+        return False
+
+    # Plain INSERT so a deleted target fails on its foreign key instead of
+    # being skipped like a duplicate; NOT EXISTS does the deduplication
+    statement = text(
+        "INSERT INTO collection_books (collection_id, isbn)"
+        " SELECT :target, s.isbn FROM collection_books s"
+        " WHERE s.collection_id = :source AND s.isbn > :after AND s.isbn <= :upper"
+        " AND NOT EXISTS (SELECT 1 FROM collection_books t"
+        " WHERE t.collection_id = :target AND t.isbn = s.isbn)"
+    )
+    params = {"source": job.source_id, "target": job.target_id, "after": after, "upper": upper}
+    for attempt in range(CHUNK_ATTEMPTS):
+        try:
+            added = session.execute(statement, params).rowcount
+            break
+        except IntegrityError:
+            session.rollback()
+            if session.query(Collection.id).filter_by(id=job.target_id).first() is None:
+                raise ValueError("Target collection was deleted during the merge")
+            if attempt == CHUNK_ATTEMPTS - 1:
+                raise
+            # A book of the chunk was just added to the target by a user: redo it
+
+    # Cursor and counters commit with the chunk: a restart never copies it twice
+    job.cursor = upper
+    job.copied += copied
+    job.added += added
+    job.heartbeat_at = datetime.utcnow()
+    session.commit()
+    metrics.incr("books_copied", copied)
+    metrics.incr("books_added", added)
+    return True
+
+
+def count_missing(session, job) -> int:
+    """Number of source books not (or no longer) in the target."""
+    return session.execute(
+        text(
+            "SELECT COUNT(*) FROM collection_books s WHERE s.collection_id = :source"
+            " AND NOT EXISTS (SELECT 1 FROM collection_books t"
+            " WHERE t.collection_id = :target AND t.isbn = s.isbn)"
+        ),
+        {"source": job.source_id, "target": job.target_id},
+    ).scalar()
+
+
+def run_job(session, job) -> None:
+    """Copy every chunk, delete the source if requested, mark the job done."""
+    source = session.query(Collection).filter_by(id=job.source_id).first()
+    target = session.query(Collection).filter_by(id=job.target_id).first()
+    if target is None or (source is None and job.cursor is None):
+        raise ValueError("Source or target collection no longer exists")
+
+    if job.total is None:
+        job.total = session.query(CollectionBook).filter_by(collection_id=job.source_id).count()
+        session.commit()
+
+    while True:
+        with metrics.stage("chunk"):
+            if not copy_chunk(session, job):
+                break
+        metrics.flush()
+
+    if job.delete_source and source is not None:
+        # Only delete once every source book is in the target (books added to
+        # the source behind the cursor would otherwise be lost)
+        missing = count_missing(session, job)
+        if missing:
+            raise ValueError(f"{missing} books of the source are not in the target; source kept")
+        job.heartbeat_at = datetime.utcnow()
+        session.commit()
+        with metrics.stage("delete_source"):
+            cascade_delete.delete_collection(session, job.source_id)
+
+    job.status = "done"
+    job.finished_at = datetime.utcnow()
+    session.commit()
+
+
+def process_merge_jobs() -> None:
+    """
+    Main worker loop: run queued merge jobs one at a time.
+
+    Jobs left "running" by a dead worker process are requeued once their
+    heartbeat is stale and resume from their cursor; jobs of live workers
+    are left alone.
+    """
+    while True:
+        with SessionLocal() as session:
+            requeued = requeue_stale_jobs(session)
+            if requeued:
+                log_app("WARNING", f"Requeued {requeued} merge jobs of a stopped worker")
+            metrics.set_queue_depth(
+                queued=session.query(CollectionMergeJob).filter_by(status="queued").count(),
+                running=session.query(CollectionMergeJob).filter_by(status="running").count(),
+            )
+            metrics.flush()
+
+            job = claim_next_job(session)
+            if job is None:
+                time.sleep(CHECK_INTERVAL)
+                continue
+
+            context = {"job_id": job.id, "source_id": job.source_id, "target_id": job.target_id}
+            log_app("INFO", f"Merging collection {job.source_id} into {job.target_id}", context)
+            try:
+                with metrics.stage("job"):
+                    run_job(session, job)
+                metrics.item_done("jobs_done")
+                log_app("SUCCESS", f"Merge job {job.id} done: {job.added} books added", context)
+            except Exception as e:
+                session.rollback()
+                job.status = "failed"
+                job.error = str(e)
+                job.finished_at = datetime.utcnow()
+                session.commit()
+                metrics.item_done("jobs_failed")
+                log_app("ERROR", f"Merge job {job.id} failed: {e}", context)
+            metrics.flush(force=True)
+
+
+if __name__ == "__main__":
+    log_app("INFO", "Merge worker started - waiting for merge jobs...")
+    process_merge_jobs()
@@ -1,12 +1,14 @@
 import os
 import json
 import gc
+import time
 import torch
 import faiss
 import numpy as np
 from PIL import Image, UnidentifiedImageError
 from tqdm import tqdm
 from transformers import CLIPProcessor, CLIPModel
+from utils.index_version import begin_write, end_write
 
 # === CONFIGURATION ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -18,30 +20,66 @@ SKIPPED_FILE = os.path.join(BASE_DIR, "data", "skipped_images.txt")
 
 # === SETUP ===
 device = "cpu"
-model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32").to(device)
-processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
+MODEL_NAME = "openai/clip-vit-base-patch32"
 
-def encode_image(path: str) -> np.ndarray:
-    try:
-        image = Image.open(path).convert("RGB")
-        image = image.resize((224, 224))  # Sécurité contre les tailles erratiques
+# CLIP is loaded on first use so that importing this module (e.g. from the
+# worker) does not pull a second copy of the model into memory.
+_model = None
+_processor = None
+
+
+def get_encoder():
+    """
+    Return the (model, processor) pair, loading CLIP on first call.
+    """
+    global _model, _processor
+    if _model is None:
+        _model = CLIPModel.from_pretrained(MODEL_NAME).to(device)
+        _processor = CLIPProcessor.from_pretrained(MODEL_NAME)
+    return _model, _processor
 
-        # Dummy input_ids to avoid CLIP error
-        inputs = processor(images=image, return_tensors="pt")
-        inputs["input_ids"] = torch.tensor([[0]])  # Hack to satisfy CLIPModel
-        inputs = {k: v.to(device) for k, v in inputs.items()}
 
-        with torch.no_grad():
-            outputs = model(**inputs)
-            embedding = outputs.image_embeds[0].cpu().numpy()
+def _load_image(path: str) -> Image.Image:
+    image = Image.open(path).convert("RGB")
+    return image.resize((224, 224))  # Sécurité contre les tailles erratiques
 
-        del image, inputs, outputs
-        gc.collect()
-        return embedding
 
+def encode_image(path: str) -> np.ndarray:
+    try:
+        return encode_images([path])[0]
     except (UnidentifiedImageError, Exception) as e:
         raise RuntimeError(f"{path}: {e}")
 
+
+def encode_images(paths: list) -> np.ndarray:
+    """
+    Encode several covers in a single CLIP forward pass.
+
+    Args:
+        paths: Cover image paths (must all be readable)
+
+    Returns:
+        Array of shape (len(paths), dim) with one embedding per path
+    """
+    return _encode_loaded([_load_image(path) for path in paths])
+
+
+def _encode_loaded(images: list) -> np.ndarray:
+    model, processor = get_encoder()
+
+    # Dummy input_ids to avoid CLIP error
+    inputs = processor(images=images, return_tensors="pt")
+    inputs["input_ids"] = torch.tensor([[0]])  # Hack to satisfy CLIPModel
+    inputs = {k: v.to(device) for k, v in inputs.items()}
+
+    with torch.no_grad():
+        outputs = model(**inputs)
+        embeddings = outputs.image_embeds.cpu().numpy()
+
+    del images, inputs, outputs
+    gc.collect()
+    return embeddings.astype("float32")
+
 def get_all_images() -> list:
     return sorted([
         f for f in os.listdir(COVERS_DIR)
@@ -73,15 +111,37 @@ def encode_all_images():
 
     return np.stack(all_features), all_names
 
+def _write_index_files(index, features: np.ndarray, names: list) -> None:
+    """
+    Write index, features and names through temp files + rename so that
+    readers never see a half-written index.
+
+    The three renames are bracketed by the version stamp (utils.index_version)
+    so a reader loading between two of them retries instead of pairing the
+    new index with the old names.
+    """
+    tmp_index = OUTPUT_INDEX + ".tmp"
+    tmp_features = OUTPUT_FEATURES + ".tmp.npy"
+    tmp_names = OUTPUT_NAMES + ".tmp"
+
+    faiss.write_index(index, tmp_index)
+    np.save(tmp_features, features)
+    with open(tmp_names, "w") as f:
+        json.dump(names, f)
+
+    version = begin_write()
+    os.replace(tmp_features, OUTPUT_FEATURES)
+    os.replace(tmp_names, OUTPUT_NAMES)
+    os.replace(tmp_index, OUTPUT_INDEX)
+    end_write(version)
+
+
 def save_index(features: np.ndarray, names: list):
     print("💾 Saving index and metadata...")
     index = faiss.IndexFlatL2(features.shape[1])
     index.add(features)
 
-    faiss.write_index(index, OUTPUT_INDEX)
-    np.save(OUTPUT_FEATURES, features)
-    with open(OUTPUT_NAMES, "w") as f:
-        json.dump(names, f)
+    _write_index_files(index, features, names)
 
     print(f"✅ Index built with {len(names)} images.")
 
@@ -89,46 +149,69 @@ def add_to_index(isbn):
     """
     Ajoute une nouvelle couverture (isbn) à l'index FAISS existant, aux features et aux noms.
     """
-    cover_path = os.path.join(COVERS_DIR, f"{isbn}.jpg")
-    print(f"add_to_index: cover_path={cover_path}, exists={os.path.exists(cover_path)}")
-    if not os.path.exists(cover_path):
-        print(f"❌ Couverture introuvable pour ISBN {isbn} ({cover_path})")
-        return False
+    return isbn in add_many_to_index([isbn])
+
+
+def add_many_to_index(isbns: list, timings: dict = None) -> list:
+    """
+    Add a batch of covers to the existing FAISS index with a single encode
+    pass and a single rewrite of the index files.
 
-    # Charger l'index existant
+    Covers that are missing, unreadable or already indexed are skipped.
+
+    Args:
+        isbns: ISBN-10 values whose covers live in COVERS_DIR
+        timings: Optional dict filled with "encode" and "index" durations (seconds)
+
+    Returns:
+        List of ISBNs that were actually added to the index
+    """
     if not (os.path.exists(OUTPUT_INDEX) and os.path.exists(OUTPUT_FEATURES) and os.path.exists(OUTPUT_NAMES)):
         print("❌ Index, features ou noms manquants. Lance d'abord build_index.")
-        return False
+        return []
 
-    # Charger l'index FAISS
     index = faiss.read_index(OUTPUT_INDEX)
     features = np.load(OUTPUT_FEATURES)
     with open(OUTPUT_NAMES, "r") as f:
         names = json.load(f)
+    known = set(names)
+
+    # Keep only readable covers that are not indexed yet
+    batch = []
+    for isbn in dict.fromkeys(isbns):
+        cover_path = os.path.join(COVERS_DIR, f"{isbn}.jpg")
+        if f"{isbn}.jpg" in known:
+            continue
+        if not os.path.exists(cover_path):
+            print(f"❌ Couverture introuvable pour ISBN {isbn} ({cover_path})")
+            continue
+        try:
+            image = _load_image(cover_path)
+        except Exception as e:
+            print(f"❌ Erreur d'encodage pour {isbn}: {e}")
+            continue
+        batch.append((isbn, image))
 
-    # Encoder la nouvelle image
-    try:
-        embedding = encode_image(cover_path)
-        print(f"❗ Image encodée avec succès pour {isbn}: shape={embedding.shape}")
-    except Exception as e:
-        print(f"❌ Erreur d'encodage pour {isbn}: {e}")
-        return False
-
-    # Ajouter à l'index et aux listes
-    embedding = embedding.reshape(1, -1)
-    index.add(embedding)
-    features = np.vstack([features, embedding])
-    names.append(f"{isbn}.jpg")
-
-    # Sauvegarder
-    faiss.write_index(index, OUTPUT_INDEX)
-    np.save(OUTPUT_FEATURES, features)
-    with open(OUTPUT_NAMES, "w") as f:
-        json.dump(names, f)
+    if not batch:
+        return []
+
+    encode_start = time.monotonic()
+    embeddings = _encode_loaded([image for _, image in batch])
+    index_start = time.monotonic()
+
+    index.add(embeddings)
+    features = np.vstack([features, embeddings])
+    names.extend(f"{isbn}.jpg" for isbn, _ in batch)
+
+    _write_index_files(index, features, names)
 
-    print(f"✅ ISBN {isbn} ajouté à l'index FAISS.")
-    return True
+    if timings is not None:
+        timings["encode"] = index_start - encode_start
+        timings["index"] = time.monotonic() - index_start
 
+    added = [isbn for isbn, _ in batch]
+    print(f"✅ {len(added)} ISBN ajoutés à l'index FAISS.")
+    return added
 
 
 if __name__ == "__main__":
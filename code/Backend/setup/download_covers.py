@@ -10,13 +10,14 @@ CSV_FILE = os.path.join(BASE_DIR, "..", "data", "books.csv")
 OUTPUT_DIR = os.path.abspath(os.path.join(BASE_DIR, "..", "data", "covers"))
 
 NUM_WORKERS = 10  # nombre de téléchargements en parallèle
+OPENLIBRARY_COVERS_BASE_URL = os.getenv("OPENLIBRARY_COVERS_BASE_URL", "https://covers.openlibrary.org")
 
 # === PRÉPARATION ===
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 # === TÉLÉCHARGEMENT PARALLÈLE ===
 def download_image(isbn):
-    url = f"https://covers.openlibrary.org/b/isbn/{isbn}-L.jpg"
+    url = f"{OPENLIBRARY_COVERS_BASE_URL}/b/isbn/{isbn}-L.jpg"
     try:
         response = requests.get(url, timeout=10)
         if response.status_code == 200:
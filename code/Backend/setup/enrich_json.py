@@ -9,9 +9,12 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "..", "data")
 METADATA_PATH = os.path.join(DATA_DIR, "metadata.json")
 
-OPENLIBRARY_API = "https://openlibrary.org/isbn/{}.json"
-OPENLIBRARY_WORKS = "https://openlibrary.org{}"
-GOOGLE_BOOKS_API = "https://www.googleapis.com/books/v1/volumes?q=isbn:{}"
+OPENLIBRARY_BASE_URL = os.getenv("OPENLIBRARY_BASE_URL", "https://openlibrary.org")
+GOOGLE_BOOKS_API_BASE_URL = os.getenv("GOOGLE_BOOKS_API_BASE_URL", "https://www.googleapis.com")
+
+OPENLIBRARY_API = OPENLIBRARY_BASE_URL + "/isbn/{}.json"
+OPENLIBRARY_WORKS = OPENLIBRARY_BASE_URL + "{}"
+GOOGLE_BOOKS_API = GOOGLE_BOOKS_API_BASE_URL + "/books/v1/volumes?q=isbn:{}"
 
 MAX_WORKERS = 10
 SAVE_EVERY = 100
@@ -28,7 +31,7 @@ def enrich_single_book(isbn13, entry):
     entry["title"] = None
 
     # 1. OpenLibrary
-    ol_url = f"https://openlibrary.org/isbn/{isbn13}.json"
+    ol_url = OPENLIBRARY_API.format(isbn13)
     try:
         resp = requests.get(ol_url, timeout=10)
         if resp.status_code == 200:
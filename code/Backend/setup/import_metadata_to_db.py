@@ -2,6 +2,7 @@ import json
 import os
 from sqlalchemy.orm import Session
 from backend.utils.db_models import Book, SessionLocal
+from backend.utils.index_events import publish_books_added
 from tqdm import tqdm
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -16,6 +17,7 @@ def import_metadata():
     session: Session = SessionLocal()
     count = 0
     skipped = []
+    imported = []
 
     print(f"📦 Importation de {len(metadata)} livres depuis metadata.json...")
 
@@ -44,11 +46,16 @@ def import_metadata():
         )
 
         session.add(new_book)
+        imported.append({"isbn": isbn, "isbn13": new_book.isbn13, "title": new_book.title})
         count += 1
 
     session.commit()
     session.close()
 
+    # Let running API processes see the new books without a restart
+    if imported:
+        publish_books_added(imported, reason="import_metadata")
+
     if skipped:
         with open(SKIPPED_PATH, "w", encoding="utf-8") as f:
             f.write("\n".join(skipped))
@@ -0,0 +1,73 @@
+import os
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tqdm import tqdm
+from utils.cover_processing import save_cover, needs_normalization, InvalidCoverError
+
+# === CONFIG ===
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+COVERS_DIR = os.path.abspath(os.path.join(BASE_DIR, "..", "data", "covers"))
+
+NUM_WORKERS = 4  # images normalized in parallel
+
+
+def normalize_file(path: str, keep_original: bool, force: bool):
+    """
+    Normalize one existing cover in place.
+
+    Returns:
+        (status, bytes_before, bytes_after) with status in
+        "normalized", "skipped" or "invalid"
+    """
+    before = os.path.getsize(path)
+    if not force and not needs_normalization(path):
+        return "skipped", before, before
+    with open(path, "rb") as f:
+        data = f.read()
+    try:
+        after = save_cover(data, path, keep_original=keep_original)
+    except InvalidCoverError:
+        return "invalid", before, before
+    return "normalized", before, after
+
+
+def normalize_all_covers(keep_original: bool = False, force: bool = False):
+    """
+    Backfill: normalize every cover already present in COVERS_DIR.
+
+    Invalid covers are reported but left untouched so they can be inspected
+    (and cleaned up with utils/w_sync_repair.py).
+    """
+    files = sorted(
+        os.path.join(COVERS_DIR, f) for f in os.listdir(COVERS_DIR)
+        if f.lower().endswith((".jpg", ".jpeg"))
+    )
+    print(f"🖼️  Normalizing {len(files)} covers in '{COVERS_DIR}'...")
+
+    counts = {"normalized": 0, "skipped": 0, "invalid": 0}
+    total_before = total_after = 0
+    invalid = []
+
+    with ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
+        futures = {executor.submit(normalize_file, path, keep_original, force): path for path in files}
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            status, before, after = future.result()
+            counts[status] += 1
+            total_before += before
+            total_after += after
+            if status == "invalid":
+                invalid.append(os.path.basename(futures[future]))
+
+    print(f"✅ {counts['normalized']} normalized, {counts['skipped']} already normalized, {counts['invalid']} invalid")
+    print(f"💾 Disk usage: {total_before / 1e6:.1f} MB -> {total_after / 1e6:.1f} MB")
+    if invalid:
+        print(f"⚠️ Invalid covers: {invalid}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Normalize and recompress existing covers")
+    parser.add_argument("--keep-originals", action="store_true", help="copy raw files to data/covers_original")
+    parser.add_argument("--force", action="store_true", help="re-encode covers that already look normalized")
+    args = parser.parse_args()
+
+    normalize_all_covers(keep_original=args.keep_originals, force=args.force)
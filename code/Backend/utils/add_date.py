@@ -2,6 +2,7 @@ import os
 import glob
 from datetime import datetime
 from utils.db_models import SessionLocal, Book
+from utils.index_events import publish_books_added
 from sqlalchemy import text
 from tqdm import tqdm
 
@@ -57,6 +58,7 @@ def update_books_with_dates():
     session = SessionLocal()
     updated_count = 0
     not_found_count = 0
+    updated = []
     
     try:
         # Add progress bar with tqdm
@@ -75,6 +77,7 @@ def update_books_with_dates():
                     
                     # Update book with date_added
                     book.date_added = file_date
+                    updated.append({"isbn": book.isbn, "isbn13": book.isbn13, "title": book.title})
                     updated_count += 1
                     
                     # Update progress bar description with current book
@@ -90,6 +93,10 @@ def update_books_with_dates():
         print("\n💾 Committing changes to database...")
         session.commit()
         print(f"\n✅ Successfully updated {updated_count} books with date_added")
+
+        # date_added feeds Last-Modified: drop cached book details in the API
+        if updated:
+            publish_books_added(updated, reason="add_date")
         
         if not_found_count > 0:
             print(f"⚠️  {not_found_count} cover files had no matching book in database")
@@ -0,0 +1,105 @@
+"""
+Set-Based Cascading Deletes
+
+Deletes a user's (or a collection's) dependent rows with single statements
+keyed by owner instead of per-collection loops, executed in bounded chunks
+(DELETE ... LIMIT CHUNK_SIZE, one short transaction each). Locks are held
+for one chunk at a time, so deleting a very large account doesn't block
+concurrent scans and collection edits for the whole operation.
+
+Each step is idempotent, so a failed delete resumes where it stopped when
+run again: a concurrent insert tripping a foreign key re-runs the cascade
+here (up to CASCADE_ATTEMPTS times), and callers retry lock wait timeouts.
+
+Order follows the foreign keys:
+    collection_books -> collections -> user_scans / user_added_books -> users
+"""
+
+import os
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+CHUNK_SIZE = int(os.getenv("DELETE_CHUNK_SIZE", "5000"))  # rows per DELETE statement
+CASCADE_ATTEMPTS = 3  # runs of a cascade when concurrent inserts trip foreign keys
+
+
+def delete_in_chunks(session, table: str, where: str, params: dict, chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Delete matching rows chunk by chunk, committing after each chunk.
+
+    Args:
+        session: Open database session (committed by this function)
+        table: Table to delete from
+        where: SQL condition with :named parameters
+        params: Values for the condition's parameters
+        chunk_size: Maximum rows deleted per statement
+
+    Returns:
+        Total number of rows deleted
+    """
+    statement = text(f"DELETE FROM {table} WHERE {where} LIMIT {int(chunk_size)}")
+    total = 0
+    while True:
+        deleted = session.execute(statement, params).rowcount
+        session.commit()
+        total += deleted
+        if deleted < chunk_size:
+            return total
+
+
+def _cascade(session, steps: list, params: dict) -> dict:
+    """
+    Run (table, condition) deletes in order, re-running the cascade when a
+    row inserted concurrently trips a foreign key (e.g. a book added to a
+    collection between its collection_books and collections steps).
+
+    Returns:
+        Number of rows deleted per table, over all attempts
+
+    Raises:
+        IntegrityError: If the cascade still fails after CASCADE_ATTEMPTS runs
+    """
+    counts = dict.fromkeys([table for table, _ in steps], 0)
+    for attempt in range(CASCADE_ATTEMPTS):
+        try:
+            for table, where in steps:
+                counts[table] += delete_in_chunks(session, table, where, params)
+            return counts
+        except IntegrityError:
+            session.rollback()
+            if attempt == CASCADE_ATTEMPTS - 1:
+                raise
+
+
+def delete_collection(session, collection_id: int) -> dict:
+    """
+    Delete a collection and its books.
+
+    Returns:
+        Number of rows deleted per table
+    """
+    return _cascade(session, [
+        ("collection_books", "collection_id = :collection_id"),
+        ("collections", "id = :collection_id"),
+    ], {"collection_id": collection_id})
+
+
+def delete_user(session, user_id: int) -> dict:
+    """
+    Delete everything a user owns, then the user.
+
+    Args:
+        session: Open database session (committed by this function)
+        user_id: ID of the user
+
+    Returns:
+        Number of rows deleted per table
+    """
+    return _cascade(session, [
+        # Single-table DELETE (LIMIT isn't allowed on multi-table deletes)
+        ("collection_books", "collection_id IN (SELECT id FROM collections WHERE owner = :user_id)"),
+        ("collections", "owner = :user_id"),
+        ("user_scans", "user_id = :user_id"),
+        ("user_added_books", "user_id = :user_id"),
+        ("users", "id = :user_id"),
+    ], {"user_id": user_id})
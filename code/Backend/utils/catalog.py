@@ -0,0 +1,225 @@
+"""
+In-Memory Book Catalog
+
+Compact, process-resident copy of the book fields that list screens and
+lookups need, so hot read paths don't query MySQL per book:
+
+- barcode fast path (through utils.isbn_index)
+- match hydration (cover match suggestions)
+- /api/books when only catalog fields are requested
+- recently-scanned and collection listings
+
+Each book is one __slots__ record (isbn, isbn13, title, authors, cover_url,
+language_code) reachable by ISBN-10 and ISBN-13; repeated strings such as
+language codes are interned. A few hundred thousand books stay in the tens
+of MB.
+
+Loaded in a background thread at startup and kept fresh by index events:
+BOOKS_ADDED (insert or re-save) re-reads the changed rows, BOOKS_REMOVED
+drops them, RESYNC reloads everything. Events arriving while a (re)load
+runs are replayed once it has swapped in. Until loaded (or on a miss)
+callers fall back to the database.
+"""
+
+import sys
+import threading
+from utils.db_models import SessionLocal, Book
+from utils.index_events import subscribe, BOOKS_ADDED, BOOKS_REMOVED, RESYNC
+
+CATALOG_FIELDS = ("isbn", "isbn13", "title", "authors", "cover_url", "language_code")
+LOAD_BATCH_SIZE = 5000
+
+
+def _fetch_rows(session, isbns) -> list:
+    """Catalog columns of the given ISBN-10s, in one primary key IN query."""
+    return session.query(*[getattr(Book, field) for field in CATALOG_FIELDS]).filter(
+        Book.isbn.in_(isbns)
+    ).all()
+
+
+class BookRecord:
+    """Catalog entry for one book."""
+
+    __slots__ = CATALOG_FIELDS
+
+    def __init__(self, isbn, isbn13, title, authors, cover_url, language_code):
+        self.isbn = isbn
+        self.isbn13 = isbn13
+        self.title = title
+        if isinstance(authors, list):
+            authors = tuple(authors)  # Tuples are smaller and can't be mutated by callers
+        self.authors = authors
+        self.cover_url = cover_url
+        self.language_code = sys.intern(language_code) if language_code else None
+
+    @classmethod
+    def from_row(cls, row) -> "BookRecord":
+        """Build a record from a Book instance or a query row with CATALOG_FIELDS."""
+        return cls(*(getattr(row, field) for field in CATALOG_FIELDS))
+
+    def to_dict(self, fields=CATALOG_FIELDS) -> dict:
+        """JSON-ready dictionary of the requested fields (authors as a list)."""
+        result = {}
+        for field in fields:
+            value = getattr(self, field)
+            result[field] = list(value) if isinstance(value, tuple) else value
+        return result
+
+
+class BookCatalog:
+    """Thread-safe ISBN-10 / ISBN-13 -> BookRecord maps."""
+
+    def __init__(self):
+        self.by_isbn = {}  # isbn10 -> record
+        self.by_isbn13 = {}  # isbn13 -> record
+        self.loaded = False
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()  # one (re)load at a time
+        self._missed = None  # events received while a load runs, to replay
+
+    def load(self) -> None:
+        """(Re)load every book from the database, in primary key order batches."""
+        with self._load_lock:
+            with self._lock:
+                self._missed = []
+            by_isbn, by_isbn13 = {}, {}
+            session = SessionLocal()
+            try:
+                last = None
+                while True:
+                    query = session.query(*[getattr(Book, field) for field in CATALOG_FIELDS])
+                    if last is not None:
+                        query = query.filter(Book.isbn > last)
+                    rows = query.order_by(Book.isbn).limit(LOAD_BATCH_SIZE).all()
+                    if not rows:
+                        break
+                    for row in rows:
+                        record = BookRecord.from_row(row)
+                        by_isbn[record.isbn] = record
+                        if record.isbn13:
+                            by_isbn13[record.isbn13] = record
+                    last = rows[-1].isbn
+            finally:
+                session.close()
+
+            with self._lock:
+                self.by_isbn = by_isbn
+                self.by_isbn13 = by_isbn13
+                self.loaded = True
+                missed, self._missed = self._missed, None
+            for event in missed:
+                self._apply_event(event)
+        print(f"📚 Book catalog loaded: {len(by_isbn)} books")
+
+    def load_async(self) -> threading.Thread:
+        """Load in a daemon thread so startup isn't blocked."""
+        thread = threading.Thread(target=self.load, name="book-catalog-loader", daemon=True)
+        thread.start()
+        return thread
+
+    def get(self, isbn: str):
+        """Return the record for an ISBN-10 or ISBN-13, or None."""
+        return self.by_isbn.get(isbn) or self.by_isbn13.get(isbn)
+
+    def get_many(self, isbns) -> tuple:
+        """
+        Look up several ISBNs at once.
+
+        Args:
+            isbns: ISBN-10s or ISBN-13s
+
+        Returns:
+            (found, missing): dict of isbn -> record, list of ISBNs not in
+            the catalog (to be fetched from the database)
+        """
+        found, missing = {}, []
+        for isbn in isbns:
+            record = self.get(isbn)
+            if record is None:
+                missing.append(isbn)
+            else:
+                found[isbn] = record
+        return found, missing
+
+    def lookup(self, isbns, session=None) -> dict:
+        """
+        Records for ISBN-10s, from memory with one database query for misses.
+
+        Args:
+            isbns: ISBN-10s (primary keys)
+            session: Open session to reuse for the fallback query (optional)
+
+        Returns:
+            Dictionary of isbn -> BookRecord for the books that exist
+        """
+        isbns = list(dict.fromkeys(isbns))
+        found, missing = self.get_many(isbns) if self.loaded else ({}, isbns)
+        if not missing:
+            return found
+
+        own_session = session is None
+        session = session or SessionLocal()
+        try:
+            rows = _fetch_rows(session, missing)
+        finally:
+            if own_session:
+                session.close()
+        for row in rows:
+            found[row.isbn] = BookRecord.from_row(row)
+        if rows and self.loaded:
+            self.add_rows(rows)  # Saved after the last sync; keep them
+        return found
+
+    def add_rows(self, rows) -> None:
+        """Insert or replace books (Book instances or rows with CATALOG_FIELDS)."""
+        records = [BookRecord.from_row(row) for row in rows]
+        with self._lock:
+            for record in records:
+                previous = self.by_isbn.get(record.isbn)
+                if previous and previous.isbn13 and previous.isbn13 != record.isbn13:
+                    self.by_isbn13.pop(previous.isbn13, None)
+                self.by_isbn[record.isbn] = record
+                if record.isbn13:
+                    self.by_isbn13[record.isbn13] = record
+
+    def remove(self, isbn: str) -> None:
+        """Forget a deleted book under both of its ISBNs."""
+        with self._lock:
+            record = self.by_isbn.pop(isbn, None)
+            if record and record.isbn13:
+                self.by_isbn13.pop(record.isbn13, None)
+
+    def refresh(self, isbns) -> None:
+        """Re-read changed books from the database."""
+        isbns = list(isbns)
+        if not isbns:
+            return
+        session = SessionLocal()
+        try:
+            rows = _fetch_rows(session, isbns)
+        finally:
+            session.close()
+        self.add_rows(rows)  # Replaces stale records of re-saved books
+
+    def on_index_event(self, event: dict) -> None:
+        """Index event subscriber keeping the catalog in sync with other processes."""
+        if event["type"] == RESYNC:
+            self.load()
+            return
+        with self._lock:
+            if self._missed is not None:
+                self._missed.append(event)  # The running load may have read the old rows
+            if not self.loaded:
+                return
+        self._apply_event(event)
+
+    def _apply_event(self, event: dict) -> None:
+        if event["type"] == BOOKS_ADDED:
+            self.refresh(book["isbn"] for book in event.get("books", []))
+        elif event["type"] == BOOKS_REMOVED:
+            for isbn in event.get("isbns", []):
+                self.remove(isbn)
+
+
+catalog = BookCatalog()
+subscribe(catalog.on_index_event)
@@ -0,0 +1,121 @@
+"""
+Cover Normalization
+
+Validates and recompresses downloaded book covers so every file in
+data/covers is a reasonably sized, upright, baseline RGB JPEG:
+1. Rejects bytes that are not an image, or placeholder images (the Amazon
+   CDN answers unknown ISBNs with a 1x1 GIF)
+2. Applies the EXIF orientation so the pixels are upright
+3. Downsizes to COVER_MAX_DIM on the longest side (never upsizes)
+4. Re-encodes as an optimized progressive JPEG
+
+The untouched download can optionally be kept in data/covers_original.
+"""
+
+import os
+from io import BytesIO
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.abspath(os.path.join(BASE_DIR, "..", "data"))
+ORIGINALS_DIR = os.path.join(DATA_DIR, "covers_original")
+
+COVER_MAX_DIM = int(os.getenv("COVER_MAX_DIM", "800"))  # longest side in pixels
+COVER_MIN_DIM = 50  # smaller images are placeholders, not covers
+COVER_JPEG_QUALITY = int(os.getenv("COVER_JPEG_QUALITY", "85"))
+KEEP_ORIGINAL_COVERS = os.getenv("KEEP_ORIGINAL_COVERS", "0") == "1"
+
+EXIF_ORIENTATION = 0x0112
+
+
+class InvalidCoverError(ValueError):
+    """Raised when downloaded bytes are not a usable cover image."""
+
+
+def normalize_cover(data: bytes) -> bytes:
+    """
+    Validate, orient, downsize and re-encode a cover image.
+
+    Args:
+        data: Raw image bytes as downloaded
+
+    Returns:
+        Normalized JPEG bytes
+
+    Raises:
+        InvalidCoverError: If the bytes are not a readable image or too small
+    """
+    try:
+        with Image.open(BytesIO(data)) as probe:
+            probe.verify()  # Detects truncated/corrupt files cheaply
+        image = Image.open(BytesIO(data))
+        image.load()
+    except (UnidentifiedImageError, OSError, SyntaxError) as e:
+        raise InvalidCoverError(f"Unreadable image: {e}")
+
+    if min(image.size) < COVER_MIN_DIM:
+        raise InvalidCoverError(f"Image too small ({image.size[0]}x{image.size[1]}), likely a placeholder")
+
+    image = ImageOps.exif_transpose(image)
+
+    # Flatten transparency on white instead of letting it turn black
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        image = background
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+
+    image.thumbnail((COVER_MAX_DIM, COVER_MAX_DIM), Image.LANCZOS)
+
+    out = BytesIO()
+    image.save(out, format="JPEG", quality=COVER_JPEG_QUALITY, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def needs_normalization(path: str) -> bool:
+    """
+    Tell whether an existing cover file still has to be normalized.
+
+    Files that are already JPEGs within the size limit and without an EXIF
+    rotation are left alone so repeated backfills don't recompress them.
+    """
+    try:
+        with Image.open(path) as image:
+            if image.format != "JPEG" or image.mode != "RGB":
+                return True
+            if max(image.size) > COVER_MAX_DIM:
+                return True
+            return image.getexif().get(EXIF_ORIENTATION, 1) != 1
+    except (UnidentifiedImageError, OSError):
+        return True
+
+
+def save_cover(data: bytes, dest: str, keep_original: bool = KEEP_ORIGINAL_COVERS) -> int:
+    """
+    Normalize image bytes and write them to `dest` atomically.
+
+    Args:
+        data: Raw image bytes
+        dest: Target cover path (e.g. data/covers/<isbn10>.jpg)
+        keep_original: Also store the raw bytes in ORIGINALS_DIR
+
+    Returns:
+        Size in bytes of the written cover
+
+    Raises:
+        InvalidCoverError: If the bytes are not a usable cover
+    """
+    normalized = normalize_cover(data)
+
+    if keep_original:
+        os.makedirs(ORIGINALS_DIR, exist_ok=True)
+        with open(os.path.join(ORIGINALS_DIR, os.path.basename(dest)), "wb") as f:
+            f.write(data)
+
+    tmp_path = dest + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(normalized)
+    os.replace(tmp_path, dest)
+    return len(normalized)
@@ -13,7 +13,7 @@ This module defines all SQLAlchemy models for the book scanning application:
 Also provides utilities for logging and statistics calculation.
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, Text, Float, JSON, Boolean, DateTime, ForeignKey, Date
+from sqlalchemy import create_engine, Column, Integer, String, Text, Float, JSON, Boolean, DateTime, ForeignKey, Date, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime, date, timedelta
@@ -48,7 +48,7 @@ class Book(Base):
     isbn = Column(String(20), primary_key=True, index=True)  # ISBN-10, used for covers
     title = Column(String(512), nullable=False)
     authors = Column(JSON)  # List of author names
-    isbn13 = Column(String(20))  # 13-digit ISBN for API lookups
+    isbn13 = Column(String(20), index=True)  # 13-digit ISBN for API lookups
     pages = Column(Integer)
     publication_date = Column(String(20))  # Flexible format from APIs
     publisher = Column(String(128))
@@ -60,6 +60,13 @@ class Book(Base):
     average_rating = Column(Float)  # Average user rating
     ratings_count = Column(Integer)  # Number of ratings
     date_added = Column(DateTime, default=datetime.utcnow, nullable=True)  # When added to our DB
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=True)  # Last row change
+
+
+# Pending queue priority lanes (lower value is processed first)
+PRIORITY_INTERACTIVE = 0  # Single barcode scanned by a user in the app
+PRIORITY_BULK = 1  # Bulk/batch imports (shelf scans, admin imports)
+PRIORITY_REPAIR = 2  # Repair/backfill jobs
 
 
 class PendingBook(Base):
@@ -68,12 +75,22 @@ class PendingBook(Base):
     
     When a barcode is scanned, the ISBN is added here for background processing.
     Books marked as 'stucked' failed processing and need manual review.
+    The worker schedules entries by priority lane, round-robin across
+    requesting users, with aging so low-priority lanes never starve
+    (see utils.pending_queue).
     """
     __tablename__ = "pending_books"
+    __table_args__ = (
+        Index("ix_pending_books_schedule", "stucked", "priority", "created_at"),
+        Index("ix_pending_books_user_schedule", "stucked", "priority", "requested_by", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     isbn = Column(String(20), unique=True, nullable=False)  # ISBN to process
     stucked = Column(Boolean, default=False)  # True if processing failed
+    priority = Column(Integer, default=PRIORITY_INTERACTIVE, nullable=False)  # Priority lane
+    requested_by = Column(String(255), nullable=True)  # Username that queued the book
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=True)  # When queued
 
 
 class ScanLog(Base):
@@ -150,6 +167,34 @@ class CollectionBook(Base):
     isbn = Column(String(20), ForeignKey("books.isbn"), primary_key=True)
 
 
+class CollectionMergeJob(Base):
+    """
+    Background merge of one collection into another.
+
+    Created by the merge endpoint and processed by merge_collection_worker.py
+    in chunks; `cursor` is the last ISBN copied, so an interrupted job
+    resumes where it stopped. `heartbeat_at` is refreshed with every chunk,
+    so only jobs whose worker died are requeued.
+    """
+    __tablename__ = "collection_merge_jobs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    source_id = Column(Integer, nullable=False)  # Collection merged from
+    target_id = Column(Integer, nullable=False)  # Collection merged into
+    delete_source = Column(Boolean, default=True, nullable=False)  # Delete the source once copied
+    requested_by = Column(String(255))  # Username that asked for the merge
+    status = Column(String(20), default="queued", nullable=False, index=True)  # queued/running/done/failed
+    cursor = Column(String(20))  # Last ISBN copied
+    total = Column(Integer)  # Books in the source when the job started
+    copied = Column(Integer, default=0, nullable=False)  # Books read from the source so far
+    added = Column(Integer, default=0, nullable=False)  # Books new to the target
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)  # Last sign of life of the worker running it
+    finished_at = Column(DateTime)
+
+
 class UserScan(Base):
     """
     Tracking table for user scan history.
@@ -158,6 +203,9 @@ class UserScan(Base):
     Uses composite primary key to allow multiple scans of same book by same user.
     """
     __tablename__ = "user_scans"
+    __table_args__ = (
+        Index("ix_user_scans_user_time", "user_id", "timestamp"),  # Recently-scanned pages
+    )
 
     user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
     isbn = Column(String(20), ForeignKey("books.isbn"), primary_key=True)
@@ -255,7 +303,7 @@ def calculate_daily_stats(target_date: date = None) -> DailyStats:
     daily_stat = None
     
     try:
-        from sqlalchemy import func, and_
+        from sqlalchemy import func, and_, or_
         
         # Calculate cumulative totals
         total_books = session.query(Book).count()
@@ -319,13 +367,17 @@ def calculate_daily_stats(target_date: date = None) -> DailyStats:
             )
         ).count()
         
-        # Count worker errors
+        # Count worker errors (worker logs are tagged with {"source": "worker"};
+        # the message match keeps older untagged rows counted)
         worker_errors_today = session.query(AppLog).filter(
             and_(
                 AppLog.timestamp >= start_datetime,
                 AppLog.timestamp < end_datetime,
                 AppLog.level == "ERROR",
-                AppLog.message.like("%worker%")
+                or_(
+                    func.json_unquote(func.json_extract(AppLog.context, "$.source")) == "worker",
+                    AppLog.message.like("%worker%")
+                )
             )
         ).count()
 
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Local Stand-in for External Book APIs
+
+Serves the subset of Google Books, OpenLibrary and the Amazon cover CDN used
+by worker.py and the setup scripts, so the pending-book pipeline can be run
+and benchmarked offline.
+
+Every ISBN gets deterministic canned metadata and a generated JPEG cover.
+Latency, error rate, unknown-book rate and a global rate limit can be
+injected to reproduce real-world conditions.
+
+Usage (from code/Backend):
+    python -m utils.fake_book_apis --port 5055 --latency 0.2 --error-rate 0.05
+
+Then point the worker at it:
+    export GOOGLE_BOOKS_API_BASE_URL=http://127.0.0.1:5055
+    export GOOGLE_BOOKS_BASE_URL=http://127.0.0.1:5055
+    export OPENLIBRARY_BASE_URL=http://127.0.0.1:5055
+    export OPENLIBRARY_COVERS_BASE_URL=http://127.0.0.1:5055
+    export AMAZON_COVERS_BASE_URL=http://127.0.0.1:5055
+    python worker.py
+
+Endpoints:
+    GET  /books/v1/volumes?q=isbn:<isbn13>    Google Books volume search
+    GET  /books/content?id=<google_id>        Google Books cover image
+    GET  /api/books?bibkeys=ISBN:<isbn13>     OpenLibrary books API
+    GET  /isbn/<isbn13>.json                  OpenLibrary edition record
+    GET  /b/isbn/<isbn>-<size>.jpg            OpenLibrary cover image
+    GET  /images/P/<isbn10>.<suffix>.jpg      Amazon CDN cover image
+    GET  /_stats                              Request counters of this fake
+"""
+
+import io
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from flask import Flask, Response, jsonify, request
+from PIL import Image, ImageDraw
+from utils.isbn import isbn13_to_isbn10, isbn_pair, InvalidISBNError
+
+
+def _digest(value: str) -> int:
+    return int(hashlib.sha1(value.encode()).hexdigest(), 16)
+
+
+class FakeConfig:
+    """Runtime knobs of the fake server (mutable at runtime via /_config)."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, not_found_rate=0.0,
+                 rate_limit=0.0, cover_size=(400, 600), fixtures=None, seed=0):
+        self.latency = latency  # base delay in seconds added to every request
+        self.jitter = jitter  # extra uniform random delay in seconds
+        self.error_rate = error_rate  # fraction of requests answered with 503
+        self.not_found_rate = not_found_rate  # fraction of ISBNs unknown to every API
+        self.rate_limit = rate_limit  # max requests/second (0 = unlimited), 429 beyond
+        self.cover_size = cover_size  # generated cover size (width, height)
+        self.fixtures = fixtures or {}  # isbn13 -> Google Books volumeInfo overrides
+        self.random = random.Random(seed)
+
+
+def create_fake_app(config: FakeConfig) -> Flask:
+    """
+    Build the Flask app serving the fake APIs.
+
+    Args:
+        config: FakeConfig with injected latency, errors and limits
+
+    Returns:
+        Flask application
+    """
+    app = Flask(__name__)
+    lock = threading.Lock()
+    bucket = {"tokens": config.rate_limit, "updated": time.monotonic()}
+    stats = {"requests": 0, "errors": 0, "rate_limited": 0, "not_found": 0, "covers": 0}
+
+    def known(isbn: str) -> bool:
+        """Whether the fake has the book; keyed by ISBN-13 so every route agrees."""
+        try:
+            isbn13 = isbn_pair(isbn)[1]
+        except InvalidISBNError:
+            return False
+        return (_digest("nf" + isbn13) % 10000) / 10000 >= config.not_found_rate
+
+    def book_for(isbn13: str) -> dict:
+        h = _digest(isbn13)
+        info = {
+            "title": f"Benchmark Book {isbn13}",
+            "authors": [f"Author {h % 997}"],
+            "publisher": f"Publisher {h % 53}",
+            "publishedDate": str(1950 + h % 74),
+            "pageCount": 80 + h % 900,
+            "language": ["en", "fr", "de", "es"][h % 4],
+            "categories": [["Fiction", "History", "Science", "Poetry"][h % 4]],
+            "description": f"Generated description for {isbn13}.",
+            "averageRating": round(1 + (h % 400) / 100, 2),
+            "ratingsCount": h % 5000,
+        }
+        info.update(config.fixtures.get(isbn13, {}))
+        return info
+
+    def cover_response() -> Response:
+        stats["covers"] += 1
+        if request.method == "HEAD":
+            return Response(status=200, content_type="image/jpeg")
+        seed = _digest(request.path)
+        color = (seed % 256, (seed >> 8) % 256, (seed >> 16) % 256)
+        image = Image.new("RGB", config.cover_size, color)
+        draw = ImageDraw.Draw(image)
+        draw.rectangle([20, 20, config.cover_size[0] - 20, 120], fill=(255, 255, 255))
+        draw.text((30, 60), request.path.rsplit("/", 1)[-1][:40], fill=(0, 0, 0))
+        buf = io.BytesIO()
+        image.save(buf, format="JPEG", quality=85)
+        return Response(buf.getvalue(), content_type="image/jpeg")
+
+    @app.before_request
+    def inject_faults():
+        if request.path.startswith("/_"):
+            return None
+        with lock:
+            stats["requests"] += 1
+            if config.rate_limit > 0:
+                now = time.monotonic()
+                bucket["tokens"] = min(
+                    config.rate_limit,
+                    bucket["tokens"] + (now - bucket["updated"]) * config.rate_limit
+                )
+                bucket["updated"] = now
+                if bucket["tokens"] < 1:
+                    stats["rate_limited"] += 1
+                    return jsonify({"error": "Rate limit exceeded"}), 429
+                bucket["tokens"] -= 1
+            delay = config.latency + config.random.uniform(0, config.jitter)
+            fail = config.random.random() < config.error_rate
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            stats["errors"] += 1
+            return jsonify({"error": "Injected failure"}), 503
+        return None
+
+    @app.route("/books/v1/volumes")
+    def google_volumes():
+        isbn13 = request.args.get("q", "").replace("isbn:", "").strip()
+        if not known(isbn13):
+            stats["not_found"] += 1
+            return jsonify({"kind": "books#volumes", "totalItems": 0})
+        info = book_for(isbn13)
+        identifiers = [{"type": "ISBN_13", "identifier": isbn13}]
+        isbn10 = isbn13_to_isbn10(isbn13)
+        if isbn10:
+            identifiers.append({"type": "ISBN_10", "identifier": isbn10})
+        info["industryIdentifiers"] = identifiers
+        info["imageLinks"] = {"thumbnail": f"{request.host_url}books/content?id=fake{isbn13}"}
+        info["infoLink"] = f"{request.host_url}books?id=fake{isbn13}"
+        return jsonify({
+            "kind": "books#volumes",
+            "totalItems": 1,
+            "items": [{"id": f"fake{isbn13}", "volumeInfo": info}],
+        })
+
+    @app.route("/api/books")
+    def openlibrary_books():
+        key = request.args.get("bibkeys", "")
+        isbn13 = key.replace("ISBN:", "").strip()
+        if not known(isbn13):
+            stats["not_found"] += 1
+            return jsonify({})
+        info = book_for(isbn13)
+        isbn10 = isbn13_to_isbn10(isbn13)
+        cover = f"{request.host_url}b/isbn/{isbn13}-L.jpg"
+        return jsonify({key: {
+            "title": info["title"],
+            "authors": [{"name": a} for a in info["authors"]],
+            "identifiers": {"isbn_13": [isbn13], "isbn_10": [isbn10] if isbn10 else []},
+            "number_of_pages": info["pageCount"],
+            "publish_date": info["publishedDate"],
+            "publishers": [{"name": info["publisher"]}],
+            "languages": [{"key": f"/languages/{info['language']}"}],
+            "cover": {"large": cover, "medium": cover, "small": cover},
+            "subjects": [{"name": c} for c in info["categories"]],
+            "links": [],
+        }})
+
+    @app.route("/isbn/<isbn13>.json")
+    def openlibrary_edition(isbn13):
+        if not known(isbn13):
+            stats["not_found"] += 1
+            return jsonify({"error": "notfound"}), 404
+        info = book_for(isbn13)
+        isbn10 = isbn13_to_isbn10(isbn13)
+        return jsonify({
+            "title": info["title"],
+            "isbn_13": [isbn13],
+            "isbn_10": [isbn10] if isbn10 else [],
+            "publishers": [info["publisher"]],
+            "publish_date": info["publishedDate"],
+            "languages": [{"key": f"/languages/{info['language']}"}],
+            "authors": [{"key": f"/authors/OL{_digest(a) % 100000}A"} for a in info["authors"]],
+        })
+
+    @app.route("/books/content", methods=["GET", "HEAD"])
+    def google_cover():
+        return cover_response()
+
+    @app.route("/b/isbn/<name>", methods=["GET", "HEAD"])
+    def openlibrary_cover(name):
+        isbn = name.split("-", 1)[0]
+        if not known(isbn):
+            stats["not_found"] += 1
+            return Response(status=404)
+        return cover_response()
+
+    @app.route("/images/P/<name>", methods=["GET", "HEAD"])
+    def amazon_cover(name):
+        isbn10 = name.split(".", 1)[0]
+        if not known(isbn10):
+            stats["not_found"] += 1
+            return Response(status=404)
+        return cover_response()
+
+    @app.route("/_stats")
+    def fake_stats():
+        return jsonify(stats)
+
+    @app.route("/_config", methods=["POST"])
+    def fake_config():
+        """Change latency/error/rate knobs without restarting the fake."""
+        data = request.get_json() or {}
+        for key in ("latency", "jitter", "error_rate", "not_found_rate", "rate_limit"):
+            if key in data:
+                setattr(config, key, float(data[key]))
+        return jsonify({k: getattr(config, k) for k in
+                        ("latency", "jitter", "error_rate", "not_found_rate", "rate_limit")})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for Google Books, OpenLibrary and Amazon covers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--latency", type=float, default=0.0, help="base delay per request (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay per request (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 503")
+    parser.add_argument("--not-found-rate", type=float, default=0.0, help="fraction of ISBNs unknown everywhere")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="requests/second before 429 (0 = off)")
+    parser.add_argument("--cover-size", default="400x600", help="generated cover size WIDTHxHEIGHT")
+    parser.add_argument("--fixtures", help="JSON file mapping isbn13 to Google Books volumeInfo overrides")
+    parser.add_argument("--seed", type=int, default=0, help="seed for injected latency/errors")
+    args = parser.parse_args()
+
+    fixtures = {}
+    if args.fixtures:
+        with open(args.fixtures, "r", encoding="utf-8") as f:
+            fixtures = json.load(f)
+
+    width, height = (int(v) for v in args.cover_size.lower().split("x"))
+    config = FakeConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        not_found_rate=args.not_found_rate,
+        rate_limit=args.rate_limit,
+        cover_size=(width, height),
+        fixtures=fixtures,
+        seed=args.seed,
+    )
+
+    print(f"🧪 Fake book APIs on http://{args.host}:{args.port}")
+    create_fake_app(config).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
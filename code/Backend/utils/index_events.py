@@ -0,0 +1,206 @@
+"""
+Index Update Notifications
+
+Lightweight local channel used by background processes (book worker, repair
+and merge tools) to tell running API processes that the FAISS index, the
+book table or the users changed.
+
+Publishers append events to a small JSON file (data/index_events.json) under
+an exclusive file lock and atomically replace it. Each event gets an
+increasing sequence number. API processes run a watcher thread that stats the
+file a couple of times per second and, when it changes, dispatches the new
+events to subscribed callbacks (index swap, cache invalidation, ...).
+
+Event format:
+    {"seq": 42, "type": "books_added", "timestamp": 1700000000.0, ...payload}
+
+If a subscriber falls too far behind (events trimmed from the file), it
+receives a single {"type": "resync"} event and should reload everything.
+"""
+
+import os
+import json
+import time
+import fcntl
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.abspath(os.path.join(BASE_DIR, "..", "data"))
+EVENTS_PATH = os.path.join(DATA_DIR, "index_events.json")
+LOCK_PATH = EVENTS_PATH + ".lock"
+
+MAX_EVENTS = 500  # events kept in the file for slow subscribers
+MAX_BOOKS_PER_EVENT = 1000  # larger book changes are announced as a RESYNC
+POLL_INTERVAL = float(os.getenv("INDEX_EVENTS_POLL_INTERVAL", "0.5"))  # seconds between stats
+
+# Event types
+INDEX_UPDATED = "index_updated"  # payload: isbns added to the FAISS index
+BOOKS_ADDED = "books_added"      # payload: books [{"isbn", "isbn13", "title", "requested_by"}] committed to the DB
+BOOKS_REMOVED = "books_removed"  # payload: isbns (ISBN-10) deleted from the books table
+BOOK_STUCK = "book_stuck"        # payload: isbn (queue key), requested_by, reason - worker gave up
+PENDING_REMOVED = "pending_removed"  # payload: isbns dropped from pending_books without a book
+USERS_CHANGED = "users_changed"  # payload: usernames created or deleted (user id caches)
+RESYNC = "resync"                # subscriber missed events, reload everything
+
+_subscribers = []
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def read_events() -> dict:
+    """
+    Read the current event file.
+
+    Returns:
+        Dictionary with "version" (last sequence number) and "events" list
+    """
+    try:
+        with open(EVENTS_PATH, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"version": 0, "events": []}
+
+
+def publish_event(event_type: str, **payload) -> int:
+    """
+    Append an event to the channel.
+
+    Safe to call from several processes at once: writers serialize on a lock
+    file and readers only ever see a complete file thanks to os.replace.
+
+    Args:
+        event_type: One of the event type constants
+        **payload: JSON-serializable event data
+
+    Returns:
+        Sequence number assigned to the event
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    with open(LOCK_PATH, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            state = read_events()
+            seq = state.get("version", 0) + 1
+            event = {"seq": seq, "type": event_type, "timestamp": time.time()}
+            event.update(payload)
+
+            events = (state.get("events") or []) + [event]
+            state = {"version": seq, "events": events[-MAX_EVENTS:]}
+
+            tmp_path = f"{EVENTS_PATH}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, EVENTS_PATH)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return seq
+
+
+def publish_books_added(books: list, reason: str) -> int:
+    """
+    Announce books inserted or re-saved by a tool.
+
+    Bulk changes (more than MAX_BOOKS_PER_EVENT books) publish a RESYNC
+    instead, so the event file stays small and subscribers reload once.
+
+    Args:
+        books: [{"isbn", "isbn13", "title"}] of the committed books
+        reason: Name of the publishing tool (RESYNC payload)
+
+    Returns:
+        Sequence number assigned to the event
+    """
+    if len(books) > MAX_BOOKS_PER_EVENT:
+        return publish_event(RESYNC, reason=reason)
+    return publish_event(BOOKS_ADDED, books=books)
+
+
+def subscribe(callback) -> None:
+    """
+    Register a callback invoked with each new event dictionary.
+
+    Callbacks run on the watcher thread and must not block for long.
+    """
+    _subscribers.append(callback)
+
+
+def _dispatch(event: dict) -> None:
+    for callback in list(_subscribers):
+        try:
+            callback(event)
+        except Exception as e:
+            print(f"[INDEX EVENTS] subscriber {getattr(callback, '__name__', callback)} failed: {e}")
+
+
+class IndexEventWatcher(threading.Thread):
+    """
+    Background thread polling the event file and dispatching new events.
+
+    Only a stat() happens per poll; the file is read only when its
+    modification time or size changes. A failing poll (unreadable file,
+    malformed event) is logged and retried on the next tick, so the thread
+    never dies and leaves the process serving stale indexes.
+    """
+
+    def __init__(self, poll_interval: float = POLL_INTERVAL):
+        super().__init__(name="index-event-watcher", daemon=True)
+        self.poll_interval = poll_interval
+        self.last_seq = read_events().get("version", 0)  # don't replay history
+        self._last_stat = None
+        self._last_error = None
+
+    def poll(self) -> None:
+        """Check the event file once and dispatch anything new."""
+        try:
+            st = os.stat(EVENTS_PATH)
+        except FileNotFoundError:
+            return
+        stat_key = (st.st_mtime_ns, st.st_size)
+        if stat_key == self._last_stat:
+            return
+        self._last_stat = stat_key
+
+        state = read_events()
+        events = [
+            event for event in state.get("events") or []
+            if isinstance(event, dict) and isinstance(event.get("seq"), int) and "type" in event
+        ]
+        version = state.get("version", 0)
+        if not events or version <= self.last_seq:
+            return
+
+        if events[0]["seq"] > self.last_seq + 1:
+            # Missed events that were already trimmed from the file
+            _dispatch({"seq": version, "type": RESYNC, "timestamp": time.time()})
+        else:
+            for event in events:
+                if event["seq"] > self.last_seq:
+                    _dispatch(event)
+        self.last_seq = version
+
+    def run(self) -> None:
+        while True:
+            try:
+                self.poll()
+                self._last_error = None
+            except Exception as e:
+                self._last_stat = None  # Re-read the file on the next tick
+                if str(e) != self._last_error:  # Log once per distinct failure
+                    print(f"[INDEX EVENTS] poll failed: {e!r}")
+                    self._last_error = str(e)
+            time.sleep(self.poll_interval)
+
+
+def start_watcher() -> IndexEventWatcher:
+    """
+    Start the process-wide watcher thread (idempotent).
+
+    Returns:
+        The running IndexEventWatcher
+    """
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = IndexEventWatcher()
+            _watcher.start()
+    return _watcher
@@ -0,0 +1,86 @@
+"""
+Cover Index Version Stamp
+
+The cover index is three files (index.faiss, image_features.npy and
+image_names.json) that writers swap in one rename at a time. A reader
+reloading between two renames could pair a new FAISS index with the old
+names list.
+
+data/index_version.json works as a sequence lock around the renames:
+writers make the version odd before the first rename and even after the
+last one. A reader that sees the same even version before and after
+loading knows it read a consistent set (read_consistent).
+"""
+
+import os
+import json
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+VERSION_PATH = os.path.abspath(os.path.join(BASE_DIR, "..", "data", "index_version.json"))
+
+READ_ATTEMPTS = 20
+RETRY_DELAY = 0.1  # seconds between attempts while a write is in progress
+
+
+class IndexBusyError(Exception):
+    """No consistent read was possible (a write is running or was interrupted)."""
+
+
+def read_version() -> int:
+    """Current version; 0 when no writer has stamped the files yet."""
+    try:
+        with open(VERSION_PATH, "r") as f:
+            return int(json.load(f)["version"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return 0
+
+
+def _write_version(version: int) -> None:
+    tmp_path = VERSION_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": version, "updated_at": time.time()}, f)
+    os.replace(tmp_path, VERSION_PATH)
+
+
+def begin_write() -> int:
+    """
+    Mark the index files as being replaced.
+
+    Returns:
+        The (odd) version to pass to end_write()
+    """
+    version = read_version()
+    version += 1 if version % 2 == 0 else 2  # An interrupted write left it odd
+    _write_version(version)
+    return version
+
+
+def end_write(version: int) -> None:
+    """Mark the index files as consistent again."""
+    _write_version(version + 1)
+
+
+def read_consistent(load, attempts: int = READ_ATTEMPTS, delay: float = RETRY_DELAY):
+    """
+    Call load() until it runs entirely outside a write.
+
+    Args:
+        load: Function reading the index files
+        attempts: Maximum number of tries
+        delay: Seconds to wait between tries
+
+    Returns:
+        What load() returned
+
+    Raises:
+        IndexBusyError: If every attempt overlapped a write
+    """
+    for _ in range(attempts):
+        before = read_version()
+        if before % 2 == 0:
+            result = load()
+            if read_version() == before:
+                return result
+        time.sleep(delay)
+    raise IndexBusyError(f"Index files kept changing during {attempts} reads")
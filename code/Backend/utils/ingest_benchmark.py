@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Ingest Throughput Benchmark
+
+Enqueues a reproducible set of ISBNs into pending_books and measures how long
+the running worker(s) take to drain them. Meant to be used with the local
+stand-in APIs (utils/fake_book_apis.py) so runs need no network access.
+
+Usage (from code/Backend, with the fake APIs and worker.py running):
+    python -m utils.ingest_benchmark --count 200 --seed 42
+"""
+
+import time
+import random
+import argparse
+from utils.db_models import SessionLocal, PendingBook, Book, PRIORITY_BULK
+from utils.isbn import isbn13_check_digit
+
+
+def generate_isbn13s(count: int, seed: int) -> list:
+    """Generate `count` valid, distinct 978-prefixed ISBN-13 values."""
+    rng = random.Random(seed)
+    isbns = set()
+    while len(isbns) < count:
+        body = "978" + "".join(str(rng.randint(0, 9)) for _ in range(9))
+        isbns.add(body + isbn13_check_digit(body))
+    return sorted(isbns)
+
+
+def run_benchmark(count: int, seed: int, timeout: float, poll: float) -> dict:
+    """
+    Enqueue ISBNs and wait until the worker has processed all of them.
+
+    Returns:
+        Summary with processed/stuck counts, elapsed time and items/min
+    """
+    isbns = generate_isbn13s(count, seed)
+
+    session = SessionLocal()
+    try:
+        existing = {isbn for (isbn,) in session.query(Book.isbn13).filter(Book.isbn13.in_(isbns))}
+        queued = {isbn for (isbn,) in session.query(PendingBook.isbn).filter(PendingBook.isbn.in_(isbns))}
+        fresh = [isbn for isbn in isbns if isbn not in existing and isbn not in queued]
+        session.add_all(
+            PendingBook(isbn=isbn, priority=PRIORITY_BULK, requested_by="ingest_benchmark")
+            for isbn in fresh
+        )
+        session.commit()
+    finally:
+        session.close()
+
+    print(f"📬 Enqueued {len(fresh)} ISBNs ({count - len(fresh)} already known)")
+    start = time.monotonic()
+
+    remaining = stuck = len(fresh)
+    while time.monotonic() - start < timeout:
+        session = SessionLocal()
+        try:
+            remaining = session.query(PendingBook).filter(
+                PendingBook.isbn.in_(fresh), PendingBook.stucked == False
+            ).count()
+            stuck = session.query(PendingBook).filter(
+                PendingBook.isbn.in_(fresh), PendingBook.stucked == True
+            ).count()
+        finally:
+            session.close()
+        if remaining == 0:
+            break
+        time.sleep(poll)
+
+    elapsed = time.monotonic() - start
+    processed = len(fresh) - remaining
+    return {
+        "enqueued": len(fresh),
+        "processed": processed,
+        "added": processed - stuck,
+        "stuck": stuck,
+        "timed_out": remaining > 0,
+        "elapsed_s": round(elapsed, 2),
+        "items_per_min": round(processed * 60 / elapsed, 1) if elapsed else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure pending-book ingest throughput")
+    parser.add_argument("--count", type=int, default=100, help="number of ISBNs to enqueue")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the generated ISBNs")
+    parser.add_argument("--timeout", type=float, default=600, help="give up after N seconds")
+    parser.add_argument("--poll", type=float, default=1.0, help="seconds between queue checks")
+    args = parser.parse_args()
+
+    summary = run_benchmark(args.count, args.seed, args.timeout, args.poll)
+    print("📊 Ingest benchmark:")
+    for key, value in summary.items():
+        print(f"   {key}: {value}")
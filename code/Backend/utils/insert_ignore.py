@@ -0,0 +1,41 @@
+"""
+INSERT IGNORE With Per-Row Outcomes
+
+Batch endpoints insert their new rows with one INSERT IGNORE so a
+concurrent request touching the same keys can't fail the whole batch. The
+catch: IGNORE also skips rows silently, both duplicates written
+concurrently and rows failing a foreign key (turned into warnings). Reporting every
+row as written would then be wrong.
+
+insert_ignore() runs the single statement inside a SAVEPOINT and compares
+the affected row count with the number of rows. Only when they differ
+(a race, so rarely) is the savepoint rolled back and the rows replayed
+one by one to find out which ones were actually written.
+"""
+
+
+def insert_ignore(session, table, rows: list, key: str) -> set:
+    """
+    INSERT IGNORE rows and tell which ones were written.
+
+    Args:
+        session: Open session (the caller commits)
+        table: Table to insert into
+        rows: Column dictionaries
+        key: Column identifying a row in the result
+
+    Returns:
+        Set of `key` values of the rows actually inserted
+    """
+    if not rows:
+        return set()
+    statement = table.insert().prefix_with("IGNORE")
+
+    savepoint = session.begin_nested()
+    if session.execute(statement, rows).rowcount == len(rows):
+        savepoint.commit()
+        return {row[key] for row in rows}
+    savepoint.rollback()
+
+    # Some rows were skipped: replay them one at a time to know which
+    return {row[key] for row in rows if session.execute(statement, row).rowcount}
@@ -0,0 +1,143 @@
+"""
+ISBN Canonicalization
+
+Validation and conversion helpers shared by every entry point that receives
+an ISBN (barcode scans, book details, user scans, collections, worker).
+
+Canonical forms:
+- books.isbn (primary key) holds the ISBN-10. Every 978-prefixed ISBN-13 has
+  exactly one ISBN-10, so lookups go straight to the primary key.
+- pending_books.isbn holds the ISBN-13, which is what the metadata APIs are
+  queried with.
+- 979-prefixed ISBN-13s have no ISBN-10 and can only be matched on the
+  (indexed) books.isbn13 column.
+
+Input may contain hyphens, spaces and a lowercase "x" check digit.
+
+Some legacy books rows have a primary key that fails the checksum; book_key
+lets the paths referencing books match those as given.
+"""
+
+import re
+
+_SEPARATORS = re.compile(r"[\s\-]")
+
+
+class InvalidISBNError(ValueError):
+    """Raised when a value is not a valid ISBN-10 or ISBN-13."""
+
+
+def isbn10_check_digit(body: str) -> str:
+    """Check digit ("0"-"9" or "X") for the first 9 digits of an ISBN-10."""
+    total = sum((10 - i) * int(d) for i, d in enumerate(body))
+    check = (11 - total % 11) % 11
+    return "X" if check == 10 else str(check)
+
+
+def isbn13_check_digit(body: str) -> str:
+    """Check digit for the first 12 digits of an ISBN-13."""
+    total = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(body))
+    return str((10 - total % 10) % 10)
+
+
+def is_valid_isbn10(isbn: str) -> bool:
+    return (
+        len(isbn) == 10
+        and isbn[:9].isdigit()
+        and (isbn[9].isdigit() or isbn[9] == "X")
+        and isbn10_check_digit(isbn[:9]) == isbn[9]
+    )
+
+
+def is_valid_isbn13(isbn: str) -> bool:
+    return (
+        len(isbn) == 13
+        and isbn.isdigit()
+        and isbn[:3] in ("978", "979")
+        and isbn13_check_digit(isbn[:12]) == isbn[12]
+    )
+
+
+def normalize_isbn(raw: str) -> str:
+    """
+    Strip separators and validate an ISBN-10 or ISBN-13.
+
+    Args:
+        raw: ISBN as typed or scanned (e.g. "978-2-07-036822-8", "207036822x")
+
+    Returns:
+        Compact ISBN (10 or 13 characters)
+
+    Raises:
+        InvalidISBNError: If the value has the wrong shape or checksum
+    """
+    isbn = _SEPARATORS.sub("", str(raw or "")).upper()
+    if is_valid_isbn13(isbn) or is_valid_isbn10(isbn):
+        return isbn
+    raise InvalidISBNError(f"Invalid ISBN: {raw!r}")
+
+
+def isbn10_to_isbn13(isbn10: str) -> str:
+    """Convert a valid ISBN-10 to its 978-prefixed ISBN-13."""
+    body = "978" + isbn10[:9]
+    return body + isbn13_check_digit(body)
+
+
+def isbn13_to_isbn10(isbn13: str):
+    """Convert a 978-prefixed ISBN-13 to ISBN-10 (None for 979 prefixes)."""
+    if len(isbn13) != 13 or not isbn13.startswith("978"):
+        return None
+    body = isbn13[3:12]
+    return body + isbn10_check_digit(body)
+
+
+def isbn_pair(raw: str) -> tuple:
+    """
+    Normalize an ISBN and derive both forms.
+
+    Args:
+        raw: ISBN-10 or ISBN-13 in any common notation
+
+    Returns:
+        Tuple (isbn10 or None, isbn13)
+
+    Raises:
+        InvalidISBNError: If the value is not a valid ISBN
+    """
+    isbn = normalize_isbn(raw)
+    if len(isbn) == 10:
+        return isbn, isbn10_to_isbn13(isbn)
+    return isbn13_to_isbn10(isbn), isbn
+
+
+def canonical_isbn(raw: str) -> str:
+    """
+    Key used for books.isbn and the tables referencing it.
+
+    Returns:
+        The ISBN-10 when one exists, otherwise the ISBN-13
+
+    Raises:
+        InvalidISBNError: If the value is not a valid ISBN
+    """
+    isbn10, isbn13 = isbn_pair(raw)
+    return isbn10 or isbn13
+
+
+def book_key(raw: str) -> tuple:
+    """
+    Key to match books.isbn with, tolerating legacy non-canonical rows.
+
+    Args:
+        raw: ISBN as sent by the client
+
+    Returns:
+        Tuple (key, valid): the canonical ISBN and True, or the value as
+        given and False when it is not a valid ISBN. Callers must check that
+        a book exists under an invalid key before using it.
+    """
+    raw = str(raw or "").strip()
+    try:
+        return canonical_isbn(raw), True
+    except InvalidISBNError:
+        return raw, False
@@ -0,0 +1,113 @@
+"""
+In-Memory ISBN Membership Index
+
+Process-resident answers to "is this ISBN already in the dataset / already
+queued?" without a MySQL round trip. Used by the barcode fast path.
+
+- books: answered by the book catalog (utils.catalog), by ISBN-10 or ISBN-13
+- pending: ISBNs currently in the pending_books queue
+
+The pending set is loaded once in a background thread at startup and kept
+fresh by index events (utils.index_events) published by the worker and
+importers. Changes made while a (re)load runs are replayed onto the loaded
+set, so a book queued or dropped after the load's read isn't lost. A lookup miss is never trusted as "new book": callers fall back
+to the database, so a briefly stale index can only cost one query, never a
+wrong answer about a book it does know.
+"""
+
+import threading
+from utils.db_models import SessionLocal, PendingBook
+from utils.catalog import catalog
+from utils.index_events import subscribe, BOOKS_ADDED, PENDING_REMOVED, RESYNC
+
+
+class IsbnMembershipIndex:
+    """Thread-safe pending set on top of the shared book catalog."""
+
+    def __init__(self):
+        self.pending = set()
+        self.pending_loaded = False
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()  # one (re)load at a time
+        self._missed = None  # (added, isbn) changes made while a load runs, to replay
+
+    @property
+    def loaded(self) -> bool:
+        return self.pending_loaded and catalog.loaded
+
+    def load(self) -> None:
+        """(Re)load every pending ISBN from the database."""
+        with self._load_lock:
+            with self._lock:
+                self._missed = []
+            session = SessionLocal()
+            try:
+                pending = {isbn for (isbn,) in session.query(PendingBook.isbn)}
+            finally:
+                session.close()
+
+            with self._lock:
+                for added, isbn in self._missed:
+                    if added:
+                        pending.add(isbn)
+                    else:
+                        pending.discard(isbn)
+                self.pending = pending
+                self._missed = None
+                self.pending_loaded = True
+        print(f"📇 ISBN index loaded: {len(pending)} pending")
+
+    def load_async(self) -> threading.Thread:
+        """Load in a daemon thread so startup isn't blocked."""
+        thread = threading.Thread(target=self.load, name="isbn-index-loader", daemon=True)
+        thread.start()
+        return thread
+
+    def lookup_book(self, isbn: str):
+        """Return (isbn10, title) if the ISBN is a known book, else None."""
+        record = catalog.get(isbn)
+        return (record.isbn, record.title) if record else None
+
+    def is_pending(self, *isbns) -> bool:
+        """True if any of the given forms is queued (older rows are keyed by ISBN-10)."""
+        return any(isbn in self.pending for isbn in isbns if isbn)
+
+    def _change(self, added: bool, isbns) -> None:
+        """Add or discard pending ISBNs (caller holds the lock)."""
+        for isbn in isbns:
+            if added:
+                self.pending.add(isbn)
+            else:
+                self.pending.discard(isbn)
+            if self._missed is not None:
+                self._missed.append((added, isbn))
+
+    def add_book(self, book) -> None:
+        """Record a book found in the database (Book instance)."""
+        catalog.add_rows([book])
+        with self._lock:
+            self._change(False, [isbn for isbn in (book.isbn, book.isbn13) if isbn])
+
+    def add_pending(self, isbn: str) -> None:
+        with self._lock:
+            self._change(True, [isbn])
+
+    def remove_pending(self, isbn: str) -> None:
+        with self._lock:
+            self._change(False, [isbn])
+
+    def on_index_event(self, event: dict) -> None:
+        """Index event subscriber keeping the pending set in sync with other processes."""
+        if event["type"] == BOOKS_ADDED:
+            with self._lock:
+                for book in event.get("books", []):
+                    self._change(False, [isbn for isbn in (book["isbn"], book.get("isbn13")) if isbn])
+        elif event["type"] == PENDING_REMOVED:
+            with self._lock:
+                self._change(False, event.get("isbns", []))
+        elif event["type"] == RESYNC:
+            self.load()
+
+
+isbn_index = IsbnMembershipIndex()
+subscribe(isbn_index.on_index_event)
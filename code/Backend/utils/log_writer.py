@@ -0,0 +1,68 @@
+"""
+Background Log Writer
+
+Queues AppLog/ScanLog rows in memory and inserts them in batches from a
+daemon thread, so hot request paths (e.g. barcode scans) don't pay one
+MySQL commit per log line.
+
+Rows are flushed every FLUSH_INTERVAL seconds or as soon as BATCH_SIZE rows
+are waiting. If the database is unavailable the batch is printed and
+dropped, like the other log_app helpers do.
+"""
+
+import queue
+import threading
+from datetime import datetime
+from utils.db_models import SessionLocal, AppLog, ScanLog
+
+FLUSH_INTERVAL = 0.5  # seconds
+BATCH_SIZE = 200
+
+_queue = queue.Queue()
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def _writer_loop() -> None:
+    while True:
+        rows = [_queue.get()]
+        try:
+            while len(rows) < BATCH_SIZE:
+                rows.append(_queue.get(timeout=FLUSH_INTERVAL))
+        except queue.Empty:
+            pass
+
+        session = SessionLocal()
+        try:
+            session.add_all(model(**fields) for model, fields in rows)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            print(f"[LOGGING ERROR] {e}: dropped {len(rows)} log rows")
+        finally:
+            session.close()
+
+
+def _ensure_thread() -> None:
+    global _thread
+    if _thread is None:
+        with _thread_lock:
+            if _thread is None:
+                _thread = threading.Thread(target=_writer_loop, name="log-writer", daemon=True)
+                _thread.start()
+
+
+def queue_app_log(level: str, message: str, context: dict = None) -> None:
+    """Queue an AppLog row for background insertion."""
+    _ensure_thread()
+    _queue.put((AppLog, {
+        "timestamp": datetime.utcnow(), "level": level, "message": message, "context": context
+    }))
+
+
+def queue_scan_log(isbn: str, status: str, message: str, extra: dict = None) -> None:
+    """Queue a ScanLog row for background insertion."""
+    _ensure_thread()
+    _queue.put((ScanLog, {
+        "timestamp": datetime.utcnow(), "isbn": isbn, "status": status, "message": message, "extra": extra
+    }))
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Schema Migrations
+
+Brings an existing MySQL database up to date with utils/db_models.py.
+`init_db()` only creates missing tables, so columns and indexes added to
+existing tables are applied here. Every step is idempotent: it checks
+INFORMATION_SCHEMA-backed SHOW statements first and is skipped when the
+column or index already exists.
+
+Usage (from code/Backend):
+    python -m utils.migrate_schema
+"""
+
+from sqlalchemy import text
+from utils.db_models import SessionLocal, init_db
+
+# (table, column, column definition)
+COLUMNS = [
+    ("pending_books", "priority", "INT NOT NULL DEFAULT 0"),
+    ("pending_books", "requested_by", "VARCHAR(255) NULL"),
+    ("pending_books", "created_at", "DATETIME NULL"),
+    ("books", "updated_at", "DATETIME NULL"),
+    ("collection_merge_jobs", "heartbeat_at", "DATETIME NULL"),
+]
+
+# (table, index name, indexed columns)
+INDEXES = [
+    ("books", "ix_books_isbn13", "isbn13"),
+    ("pending_books", "ix_pending_books_schedule", "stucked, priority, created_at"),
+    ("pending_books", "ix_pending_books_user_schedule", "stucked, priority, requested_by, created_at"),
+    ("user_scans", "ix_user_scans_user_time", "user_id, timestamp"),
+]
+
+
+def column_exists(session, table: str, column: str) -> bool:
+    result = session.execute(text(f"SHOW COLUMNS FROM {table} LIKE :column"), {"column": column})
+    return result.fetchone() is not None
+
+
+def index_exists(session, table: str, index_name: str) -> bool:
+    result = session.execute(text(f"SHOW INDEX FROM {table} WHERE Key_name = :name"), {"name": index_name})
+    return result.fetchone() is not None
+
+
+def migrate() -> None:
+    """Create missing tables, then add missing columns and indexes."""
+    init_db()
+
+    session = SessionLocal()
+    try:
+        for table, column, definition in COLUMNS:
+            if column_exists(session, table, column):
+                print(f"✔️  {table}.{column} already exists")
+                continue
+            print(f"➕ Adding column {table}.{column}...")
+            session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
+            session.commit()
+
+        for table, index_name, columns in INDEXES:
+            if index_exists(session, table, index_name):
+                print(f"✔️  {table}.{index_name} already exists")
+                continue
+            print(f"➕ Adding index {index_name} on {table}({columns})...")
+            session.execute(text(f"CREATE INDEX {index_name} ON {table} ({columns})"))
+            session.commit()
+    except Exception as e:
+        session.rollback()
+        print(f"❌ Migration failed: {e}")
+        raise
+    finally:
+        session.close()
+
+    print("✅ Schema is up to date.")
+
+
+if __name__ == "__main__":
+    migrate()
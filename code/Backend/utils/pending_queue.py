@@ -0,0 +1,152 @@
+"""
+Pending Queue Scheduling
+
+Decides which pending books the worker processes next.
+
+Rules:
+1. Priority lanes: interactive scans before bulk imports before repair
+   backfills (PRIORITY_* constants in utils.db_models).
+2. Fairness: inside a lane, users are served round-robin, so one user's
+   500-ISBN import doesn't delay another user's books by 500 positions.
+3. Starvation protection: an entry moves up one lane for every
+   PRIORITY_AGING_SECONDS it has waited, so bulk and repair work always
+   progresses even under constant interactive traffic.
+"""
+
+import os
+from datetime import datetime
+from collections import OrderedDict
+from sqlalchemy import func, select, union_all
+from utils.db_models import PendingBook, PRIORITY_INTERACTIVE
+
+PRIORITY_AGING_SECONDS = float(os.getenv("PRIORITY_AGING_SECONDS", "300"))
+
+
+def effective_priority(priority: int, created_at: datetime, now: datetime) -> int:
+    """
+    Priority lane after aging.
+
+    Args:
+        priority: Lane the entry was queued in
+        created_at: When the entry was queued (None for legacy rows)
+        now: Reference time (UTC)
+
+    Returns:
+        Lane to schedule the entry in (never above interactive)
+    """
+    if priority is None:
+        priority = PRIORITY_INTERACTIVE
+    if created_at is None or PRIORITY_AGING_SECONDS <= 0:
+        return priority
+    waited = (now - created_at).total_seconds()
+    return max(PRIORITY_INTERACTIVE, priority - int(waited // PRIORITY_AGING_SECONDS))
+
+
+def schedule(rows: list, limit: int, now: datetime = None) -> list:
+    """
+    Order candidate rows by lane, then round-robin across users.
+
+    Args:
+        rows: (id, priority, requested_by, created_at) tuples
+        limit: Maximum number of ids to return
+        now: Reference time, defaults to utcnow
+
+    Returns:
+        List of pending ids in processing order
+    """
+    now = now or datetime.utcnow()
+
+    # lane -> user -> ids in arrival order
+    lanes = {}
+    for pending_id, priority, requested_by, created_at in sorted(
+        rows, key=lambda r: (r[3] or datetime.min, r[0])
+    ):
+        lane = effective_priority(priority, created_at, now)
+        lanes.setdefault(lane, OrderedDict()).setdefault(requested_by, []).append(pending_id)
+
+    ordered = []
+    for lane in sorted(lanes):
+        queues = [list(reversed(ids)) for ids in lanes[lane].values()]
+        while queues and len(ordered) < limit:
+            for queue in queues:
+                ordered.append(queue.pop())
+                if len(ordered) >= limit:
+                    break
+            queues = [q for q in queues if q]
+        if len(ordered) >= limit:
+            break
+    return ordered
+
+
+def _candidates(session, limit: int, exclude_ids) -> list:
+    """
+    Scheduling columns of the rows that can make the next `limit` picks.
+
+    Per stored lane, reads the k users whose oldest entry is the oldest and
+    the k oldest entries of each (k = limit + excluded ids), all through
+    ix_pending_books_user_schedule. Any other entry has at least k entries
+    ahead of it (older in the same user queue, or a user served earlier in
+    the round-robin of the same or a better lane), so it can't be picked.
+
+    Returns:
+        (id, priority, requested_by, created_at) tuples, excluded ids removed
+    """
+    k = limit + len(exclude_ids)
+    waiting = PendingBook.stucked == False
+    columns = (PendingBook.id, PendingBook.priority, PendingBook.requested_by, PendingBook.created_at)
+
+    rows = []
+    for (priority,) in session.query(PendingBook.priority).filter(waiting).distinct().all():
+        in_lane = (waiting, PendingBook.priority == priority)
+        users = [
+            user for (user,) in session.query(PendingBook.requested_by).filter(*in_lane)
+            .group_by(PendingBook.requested_by).order_by(func.min(PendingBook.created_at)).limit(k)
+        ]
+        # One statement per lane: the k oldest entries of each user
+        heads = [
+            select(*columns).where(
+                *in_lane,
+                PendingBook.requested_by.is_(None) if user is None else PendingBook.requested_by == user,
+            ).order_by(PendingBook.created_at, PendingBook.id).limit(k).subquery()
+            for user in users
+        ]
+        if heads:
+            rows.extend(session.execute(union_all(*[select(*head.c) for head in heads])).all())
+    return [tuple(row) for row in rows if row[0] not in exclude_ids]
+
+
+def select_next_batch(session, limit: int, exclude_ids=()) -> list:
+    """
+    Load the next pending books to process, in scheduling order.
+
+    Only a bounded set of candidates is read (see _candidates), so a pass
+    costs the same whatever the queue length; full rows are loaded for the
+    selected ids only.
+
+    Args:
+        session: Active SQLAlchemy session
+        limit: Maximum number of entries to return
+        exclude_ids: Pending ids already being processed
+
+    Returns:
+        List of PendingBook objects
+    """
+    ids = schedule(_candidates(session, limit, set(exclude_ids)), limit)
+    if not ids:
+        return []
+
+    by_id = {p.id: p for p in session.query(PendingBook).filter(PendingBook.id.in_(ids))}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def queue_depth_by_lane(session) -> dict:
+    """
+    Count non-stuck pending entries per priority lane (before aging).
+
+    Returns:
+        Dictionary mapping lane value to count
+    """
+    rows = session.query(PendingBook.priority, func.count(PendingBook.id)).filter(
+        PendingBook.stucked == False
+    ).group_by(PendingBook.priority).all()
+    return {priority if priority is not None else PRIORITY_INTERACTIVE: count for priority, count in rows}
@@ -0,0 +1,284 @@
+"""
+Response Cache
+
+Bounded LRU + TTL cache of serialized API responses, with optional sharing
+between server processes. Cached values are JSON-compatible (typically the
+serialized body, or a [body, headers] pair).
+
+Two layers:
+- in-process: OrderedDict LRU (MAX_ENTRIES per cache, TTL seconds)
+- shared (RESPONSE_CACHE_BACKEND=sqlite): a local SQLite file in data/
+  so every API process (gunicorn workers, restarts) reuses each other's
+  results. Misses in the in-process layer consult it before recomputing.
+
+Entries carry "match words" (the normalized query words). When the worker
+saves books, only entries whose every word matches one of the new books'
+tokens are dropped - the exact set of queries whose results could change.
+Hit/miss/eviction/invalidation counters are exposed through stats().
+
+Shared entries are stamped with a generation: the sequence number of the
+last index event whose invalidation the writing process had applied. A
+process remembers the invalidations it applied (for about a TTL) and drops
+shared entries written at an older generation that they cover. Otherwise a
+process that already handled an event could read back, and re-seed its
+LRU with, a result another process computed before handling it.
+
+Usage:
+    cache = ResponseCache("search")
+    body = cache.get(key)
+    if body is None:
+        body = json.dumps(compute())
+        cache.set(key, body, words=query_words)
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.abspath(os.path.join(BASE_DIR, "..", "data"))
+SHARED_CACHE_PATH = os.path.join(DATA_DIR, "response_cache.sqlite")
+
+BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")  # "memory" or "sqlite"
+MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+TTL = int(os.getenv("RESPONSE_CACHE_TTL", "300"))  # seconds
+WRITER_LAG = 60  # seconds a lagging process may still write pre-invalidation entries
+
+_caches = {}  # name -> ResponseCache, for stats()
+
+
+def words_match(words, tokens: set) -> bool:
+    """True if every query word is a substring of one of the tokens."""
+    return all(any(word in token for token in tokens) for word in words)
+
+
+class SharedStore:
+    """SQLite-backed layer shared by every process on the machine."""
+
+    def __init__(self, path: str = SHARED_CACHE_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " cache TEXT NOT NULL, key TEXT NOT NULL, body TEXT NOT NULL,"
+                " words TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL,"
+                " generation INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (cache, key))"
+            )
+            columns = {row[1] for row in db.execute("PRAGMA table_info(responses)")}
+            if "generation" not in columns:  # File created before generations
+                db.execute("ALTER TABLE responses ADD COLUMN generation INTEGER NOT NULL DEFAULT 0")
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=2, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, cache: str, key: str):
+        db = self._connect()
+        row = db.execute(
+            "SELECT body, words, expires_at, generation FROM responses WHERE cache = ? AND key = ?", (cache, key)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[2] < time.time():
+            db.execute("DELETE FROM responses WHERE cache = ? AND key = ?", (cache, key))
+            return None
+        db.execute("UPDATE responses SET last_used = ? WHERE cache = ? AND key = ?", (time.time(), cache, key))
+        return json.loads(row[0]), json.loads(row[1]), row[3]
+
+    def set(self, cache: str, key: str, value, words: list, ttl: int, max_entries: int, generation: int = 0) -> None:
+        db = self._connect()
+        now = time.time()
+        db.execute(
+            "INSERT OR REPLACE INTO responses (cache, key, body, words, expires_at, last_used, generation)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (cache, key, json.dumps(value), json.dumps(words), now + ttl, now, generation),
+        )
+        # Trim least recently used entries beyond the bound
+        db.execute(
+            "DELETE FROM responses WHERE cache = ? AND key IN ("
+            " SELECT key FROM responses WHERE cache = ? ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (cache, cache, max_entries),
+        )
+
+    def invalidate(self, cache: str, tokens: set) -> int:
+        db = self._connect()
+        stale = [
+            key for key, words in db.execute("SELECT key, words FROM responses WHERE cache = ?", (cache,))
+            if words_match(json.loads(words), tokens)
+        ]
+        db.executemany("DELETE FROM responses WHERE cache = ? AND key = ?", [(cache, key) for key in stale])
+        return len(stale)
+
+    def delete(self, cache: str, keys: list) -> None:
+        self._connect().executemany(
+            "DELETE FROM responses WHERE cache = ? AND key = ?", [(cache, key) for key in keys]
+        )
+
+    def clear(self, cache: str) -> None:
+        self._connect().execute("DELETE FROM responses WHERE cache = ?", (cache,))
+
+
+class ResponseCache:
+    """LRU/TTL cache of serialized responses with selective invalidation."""
+
+    def __init__(self, name: str, max_entries: int = MAX_ENTRIES, ttl: int = TTL, backend: str = BACKEND):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, words, expires_at)
+        self._lock = threading.Lock()
+        self.generation = 0  # sequence number of the last invalidating event applied
+        self._applied = []  # (generation, applied_at, keys or None, tokens or None); (None, None) = clear
+        self.shared = None
+        if backend == "sqlite":
+            try:
+                self.shared = SharedStore()
+            except sqlite3.Error as e:
+                print(f"[RESPONSE CACHE] shared backend unavailable, using memory only: {e}")
+        self.counters = {"hits": 0, "shared_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+        _caches[name] = self
+
+    def get(self, key: str):
+        """Return the cached value for key, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[2] > now:
+                self._entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return entry[0]
+            if entry:
+                del self._entries[key]
+
+        if self.shared:
+            try:
+                found = self.shared.get(self.name, key)
+            except sqlite3.Error:
+                found = None
+            if found and self._superseded(key, *found[1:]):
+                found = None  # Computed before an invalidation this process applied
+                self._shared_call("delete", self.name, [key])
+            if found:
+                value, words, _ = found
+                self._store(key, value, words)
+                with self._lock:
+                    self.counters["shared_hits"] += 1
+                return value
+
+        with self._lock:
+            self.counters["misses"] += 1
+        return None
+
+    def set(self, key: str, value, words=()) -> None:
+        """Cache a JSON-compatible value; `words` drive selective invalidation."""
+        words = list(words)
+        self._store(key, value, words)
+        if self.shared:
+            self._shared_call("set", self.name, key, value, words, self.ttl, self.max_entries, self.generation)
+
+    def _store(self, key: str, value, words: list) -> None:
+        with self._lock:
+            self._entries[key] = (value, words, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def _record(self, generation, keys=None, tokens=None) -> None:
+        """Remember an invalidation caused by the index event `generation` (caller holds the lock)."""
+        if generation is None:
+            return
+        now = time.time()
+        self.generation = max(self.generation, generation)
+        horizon = now - self.ttl - WRITER_LAG  # Older shared entries have expired
+        self._applied = [entry for entry in self._applied if entry[1] > horizon]
+        self._applied.append((generation, now, keys, tokens))
+
+    def _superseded(self, key: str, words: list, generation: int) -> bool:
+        """True if an invalidation applied here is newer than a shared entry and covers it."""
+        with self._lock:
+            for applied_generation, _, keys, tokens in self._applied:
+                if applied_generation <= generation:
+                    continue
+                if keys is None and tokens is None:
+                    return True  # clear()
+                if keys is not None and key in keys:
+                    return True
+                if tokens is not None and words_match(words, tokens):
+                    return True
+        return False
+
+    def _shared_call(self, method: str, *args) -> None:
+        try:
+            getattr(self.shared, method)(*args)
+        except sqlite3.Error as e:
+            print(f"[RESPONSE CACHE] shared {method} failed: {e}")
+
+    def invalidate_matching(self, tokens: set, generation: int = None) -> int:
+        """
+        Drop entries whose every match word appears in `tokens`.
+
+        Args:
+            tokens: Normalized tokens of the books that changed
+            generation: Sequence number of the index event causing it
+
+        Returns:
+            Number of in-process entries dropped
+        """
+        with self._lock:
+            self._record(generation, tokens=set(tokens))
+            stale = [key for key, (_, words, _) in self._entries.items() if words_match(words, tokens)]
+            for key in stale:
+                del self._entries[key]
+            self.counters["invalidations"] += len(stale)
+        if self.shared:
+            self._shared_call("invalidate", self.name, tokens)
+        return len(stale)
+
+    def delete(self, *keys: str, generation: int = None) -> None:
+        """Drop specific entries (e.g. one book's payload after it changed)."""
+        with self._lock:
+            self._record(generation, keys=set(keys))
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self.counters["invalidations"] += 1
+        if self.shared:
+            self._shared_call("delete", self.name, list(keys))
+
+    def clear(self, generation: int = None) -> None:
+        with self._lock:
+            self._record(generation)
+            self.counters["invalidations"] += len(self._entries)
+            self._entries.clear()
+        if self.shared:
+            self._shared_call("clear", self.name)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            size = len(self._entries)
+        lookups = counters["hits"] + counters["shared_hits"] + counters["misses"]
+        hit_rate = (counters["hits"] + counters["shared_hits"]) / lookups if lookups else None
+        return {
+            **counters,
+            "size": size,
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "backend": "sqlite" if self.shared else "memory",
+            "hit_rate": round(hit_rate, 4) if hit_rate is not None else None,
+        }
+
+
+def stats() -> dict:
+    """Stats of every cache created in this process, by name."""
+    return {name: cache.stats() for name, cache in _caches.items()}
@@ -0,0 +1,101 @@
+"""
+Scan History Queries
+
+Recently-scanned listing shared by /api/recently_scanned and its admin
+counterpart. One page is one query on user_scans for the user's id
+(utils.user_cache), ordered by (timestamp, isbn) descending and cut with a
+keyset cursor, so the cost depends on the page size and not on how many
+scans the user has. Book details come from the in-memory catalog
+(utils.catalog), with one query for books it doesn't know.
+
+With distinct=True only the latest scan of each ISBN is kept: a scan is
+listed only if NOT EXISTS a newer scan of the same ISBN, checked per row
+with a seek on the (user_id, isbn, timestamp) primary key. The keyset
+cursor and the LIMIT still apply to the outer query, so a page stays
+independent of the history's length.
+"""
+
+import json
+import base64
+from datetime import datetime
+from sqlalchemy import and_, or_, exists
+from sqlalchemy.orm import aliased
+from utils.db_models import UserScan
+from utils.catalog import catalog
+from utils.user_cache import user_ids
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def encode_cursor(timestamp: datetime, isbn: str) -> str:
+    """Opaque, URL-safe cursor positioned after the given scan."""
+    position = [timestamp.isoformat(), isbn]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """(timestamp, isbn) from a cursor, or None if it is malformed."""
+    try:
+        timestamp, isbn = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(timestamp), str(isbn)
+    except (ValueError, TypeError):
+        return None
+
+
+def recent_scans(session, username: str, limit: int = DEFAULT_LIMIT, after=None, distinct: bool = False) -> tuple:
+    """
+    One page of a user's scans, most recent first.
+
+    Args:
+        session: Open database session
+        username: Username whose scans are listed
+        limit: Page size
+        after: (timestamp, isbn) of the last scan of the previous page
+        distinct: Keep only the latest scan of each ISBN
+
+    Returns:
+        (items, next_cursor): list of {"isbn", "title", "authors",
+        "cover_url", "timestamp"} and the cursor of the next page (None on
+        the last page). Scans of books missing from the books table are
+        listed with placeholder details.
+    """
+    user_id = user_ids.resolve(session, username)
+    if user_id is None:
+        return [], None
+
+    query = session.query(UserScan.isbn, UserScan.timestamp).filter(UserScan.user_id == user_id)
+    if distinct:
+        newer = aliased(UserScan)
+        query = query.filter(~exists().where(
+            newer.user_id == user_id,
+            newer.isbn == UserScan.isbn,
+            newer.timestamp > UserScan.timestamp,
+        ))
+
+    if after:
+        timestamp, isbn = after
+        query = query.filter(or_(
+            UserScan.timestamp < timestamp,
+            and_(UserScan.timestamp == timestamp, UserScan.isbn < isbn),
+        ))
+    rows = query.order_by(UserScan.timestamp.desc(), UserScan.isbn.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].isbn)
+
+    books = catalog.lookup({row.isbn for row in rows}, session)
+    items = []
+    for row in rows:
+        book = books.get(row.isbn)
+        items.append({
+            "isbn": row.isbn,
+            # Book no longer in the database: still show the scan
+            "title": book.title if book else f"Book {row.isbn}",
+            "authors": book.authors if book else "Unknown",
+            "cover_url": book.cover_url if book else None,
+            "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+        })
+    return items, next_cursor
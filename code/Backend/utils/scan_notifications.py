@@ -0,0 +1,113 @@
+"""
+Scan Completion Notifications
+
+In-process pub/sub telling clients that a scanned book has been processed.
+Fed by the worker's completion events (utils.index_events): BOOKS_ADDED
+when a book is indexed and saved, BOOK_STUCK when the worker gives up.
+
+Each waiting request (SSE stream or long poll, see api/scan_events.py)
+holds a Subscription filtering on ISBNs and/or the requesting username.
+Notifications are pushed to the subscription's queue from the event watcher
+thread.
+
+Notification format:
+    {"type": "book_ready", "isbn": "2070368228", "isbn13": "9782070368228",
+     "title": "...", "cover_url": "/cover/2070368228.jpg", "requested_by": "..."}
+    {"type": "book_stuck", "isbn": "9782070368228", "reason": "fetch_failed",
+     "requested_by": "..."}
+"""
+
+import queue
+import threading
+from utils.index_events import subscribe, BOOKS_ADDED, BOOK_STUCK
+from utils.isbn import isbn_pair, InvalidISBNError
+
+BOOK_READY = "book_ready"
+BOOK_FAILED = "book_stuck"
+
+
+def isbn_keys(isbn: str) -> set:
+    """Every form an ISBN can be matched on (raw, ISBN-10, ISBN-13)."""
+    keys = {isbn}
+    try:
+        keys.update(k for k in isbn_pair(isbn) if k)
+    except InvalidISBNError:
+        pass
+    return keys
+
+
+class Subscription:
+    """Queue of notifications matching a set of ISBNs and/or a username."""
+
+    def __init__(self, isbns=None, username: str = None):
+        self.isbns = set()
+        for isbn in isbns or ():
+            self.isbns |= isbn_keys(isbn)
+        self.username = username
+        self.queue = queue.Queue()
+
+    def matches(self, notification: dict, keys: set) -> bool:
+        if self.username and notification.get("requested_by") == self.username:
+            return True
+        return bool(self.isbns & keys)
+
+    def get(self, timeout: float):
+        """Next notification, or None after `timeout` seconds."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class CompletionBroker:
+    """Fan-out of completion notifications to active subscriptions."""
+
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, isbns=None, username: str = None) -> Subscription:
+        subscription = Subscription(isbns, username)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, notification: dict) -> None:
+        """Deliver a notification to every matching subscription."""
+        keys = isbn_keys(notification["isbn"])
+        if notification.get("isbn13"):
+            keys |= isbn_keys(notification["isbn13"])
+        with self._lock:
+            targets = [s for s in self._subscriptions if s.matches(notification, keys)]
+        for subscription in targets:
+            subscription.queue.put(notification)
+
+    def on_index_event(self, event: dict) -> None:
+        """Index event subscriber translating worker events into notifications."""
+        if not self._subscriptions:
+            return
+        if event["type"] == BOOKS_ADDED:
+            for book in event.get("books", []):
+                self.publish({
+                    "type": BOOK_READY,
+                    "isbn": book["isbn"],
+                    "isbn13": book.get("isbn13"),
+                    "title": book.get("title"),
+                    "cover_url": f"/cover/{book['isbn']}.jpg",
+                    "requested_by": book.get("requested_by"),
+                })
+        elif event["type"] == BOOK_STUCK:
+            self.publish({
+                "type": BOOK_FAILED,
+                "isbn": event["isbn"],
+                "reason": event.get("reason"),
+                "requested_by": event.get("requested_by"),
+            })
+
+
+completion_broker = CompletionBroker()
+subscribe(completion_broker.on_index_event)
@@ -0,0 +1,510 @@
+"""
+In-Memory Full-Text Search Index
+
+Inverted index over the book catalog used by /api/search instead of
+ILIKE '%q%' table scans.
+
+- Documents: one per book, built from title, authors, genres, ISBN-10 and
+  ISBN-13. Field weights favour title and author hits.
+- Tokens: lowercased, accent-folded alphanumeric words.
+- Substring/partial matches: a trigram -> token map over the vocabulary finds
+  every indexed word containing a query word ("tolk" -> "tolkien",
+  "miser" -> "miserables"). Query words shorter than three
+  characters and numbers use prefix matching on the sorted vocabulary
+  instead; ISBNs stay out of the trigram map, which keeps it small.
+- Ranking: BM25 over field-weighted term frequencies; substring expansions
+  score lower than exact word hits.
+- Query semantics: every query word must match (AND), like typing more
+  words narrows the results.
+- Paging: keyset on the (score, doc id) ranking key, see search_page().
+- Facets: per-value posting sets (language, publisher, genre, author, page
+  range, publication year) maintained on insert. Filters intersect them and
+  restrict the scored candidates, so a filtered search costs no more than an
+  unfiltered one; counts only walk the matching documents.
+
+Loaded in a background thread at startup and updated incrementally from
+index events (BOOKS_ADDED / BOOKS_REMOVED) published by the worker and admin
+tools. Events arriving while a (re)load runs are replayed once it has
+swapped in, so a change made after the load's database read isn't lost.
+Until loaded, callers fall back to the database query.
+"""
+
+import re
+import math
+import heapq
+import bisect
+import threading
+import unicodedata
+from collections import defaultdict
+from utils.db_models import SessionLocal, Book
+from utils.index_events import subscribe, BOOKS_ADDED, BOOKS_REMOVED, RESYNC
+
+# Field weights applied to term frequencies
+FIELD_WEIGHTS = {"title": 3.0, "authors": 2.0, "genres": 1.0, "isbn": 1.0, "isbn13": 1.0}
+BM25_K1 = 1.2
+BM25_B = 0.75
+SUBSTRING_PENALTY = 0.5  # score factor for non-exact (substring/prefix) matches
+MAX_EXPANSIONS = 200  # vocabulary words considered per query word
+
+_WORD = re.compile(r"[a-z0-9]+")
+_YEAR = re.compile(r"\b(1[0-9]{3}|20[0-9]{2})\b")
+
+FACETS = ("language", "publisher", "genre", "author", "pages", "year")
+PAGE_RANGES = ((0, 99), (100, 199), (200, 299), (300, 399), (400, 599), (600, None))
+
+
+def normalize_text(value) -> str:
+    """Lowercase and strip accents ("Éluard" -> "eluard")."""
+    text = unicodedata.normalize("NFKD", str(value))
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def tokenize(value) -> list:
+    """Split a string (or list of strings) into normalized words."""
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [token for item in value for token in tokenize(item)]
+    return _WORD.findall(normalize_text(value))
+
+
+def trigrams(token: str) -> set:
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+def _uses_trigrams(token: str) -> bool:
+    # Long digit runs are ISBNs: prefix matching is enough and they would
+    # otherwise dominate the trigram map
+    return len(token) >= 3 and not (token.isdigit() and len(token) >= 10)
+
+
+def book_result(book) -> dict:
+    """Search result payload for a book row (ORM object or row tuple with the same names)."""
+    return {
+        "isbn": book.isbn,
+        "isbn13": book.isbn13,
+        "title": book.title,
+        "authors": book.authors,
+        "cover_url": book.cover_url,
+        "genres": book.genres,
+    }
+
+
+def _index_query(session):
+    """Columns needed to index a book (result payload + facets)."""
+    return session.query(
+        Book.isbn, Book.isbn13, Book.title, Book.authors, Book.cover_url, Book.genres,
+        Book.language_code, Book.publisher, Book.pages, Book.publication_date,
+    )
+
+
+def facet_key(value) -> str:
+    """Case/accent-insensitive key of a facet value."""
+    return " ".join(normalize_text(value).split())
+
+
+def page_range(pages) -> str:
+    """Page range label ("200-299", "600+") for a page count."""
+    for low, high in PAGE_RANGES:
+        if high is None:
+            return f"{low}+"
+        if low <= pages <= high:
+            return f"{low}-{high}"
+
+
+def facet_values(book) -> dict:
+    """Facet -> display values of a book row."""
+    def as_list(value):
+        if not value:
+            return []
+        return [value] if isinstance(value, str) else [v for v in value if v]
+
+    values = {
+        "language": as_list(book.language_code),
+        "publisher": as_list(book.publisher),
+        "genre": as_list(book.genres),
+        "author": as_list(book.authors),
+        "pages": [page_range(book.pages)] if book.pages and book.pages > 0 else [],
+        "year": [],
+    }
+    year = _YEAR.search(str(book.publication_date or ""))
+    if year:
+        values["year"] = [year.group(1)]
+    return values
+
+
+class SearchIndex:
+    """Thread-safe inverted index with trigram expansion and BM25 ranking."""
+
+    def __init__(self):
+        self.loaded = False
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()  # one (re)load at a time
+        self._missed = None  # events received while a load runs, to replay
+        self._reset()
+
+    def _reset(self) -> None:
+        self.docs = []  # doc id -> result payload (None once removed)
+        self.doc_ids = {}  # isbn -> doc id
+        self.doc_lengths = []  # doc id -> weighted length
+        self.total_length = 0.0
+        self.postings = defaultdict(dict)  # token -> {doc id: weighted tf}
+        self.trigram_map = defaultdict(set)  # trigram -> tokens
+        self.vocabulary = []  # sorted tokens, for prefix matching
+        self.isbn_keys = []  # sorted (ISBN-10 / ISBN-13, doc id), for ISBN lookups
+        self.facets = {facet: defaultdict(set) for facet in FACETS}  # facet -> value key -> doc ids
+        self.facet_labels = {facet: {} for facet in FACETS}  # facet -> value key -> display value
+        self.doc_facets = []  # doc id -> {facet: value keys}
+
+    def load(self) -> None:
+        """(Re)build the index from every book in the database."""
+        with self._load_lock:
+            with self._lock:
+                self._missed = []
+            session = SessionLocal()
+            try:
+                rows = _index_query(session).all()
+            finally:
+                session.close()
+
+            with self._lock:
+                self._reset()
+                for row in rows:
+                    self._add_doc(row)
+                self.vocabulary = sorted(self.postings)
+                self.isbn_keys.sort()
+                self.loaded = True
+                missed, self._missed = self._missed, None
+            for event in missed:
+                self._apply_event(event)
+        print(f"🔎 Search index loaded: {len(rows)} books, {len(self.postings)} terms")
+
+    def load_async(self) -> threading.Thread:
+        """Load in a daemon thread so startup isn't blocked."""
+        thread = threading.Thread(target=self.load, name="search-index-loader", daemon=True)
+        thread.start()
+        return thread
+
+    def _add_doc(self, row) -> set:
+        """Index one book row; returns tokens that were not in the vocabulary yet."""
+        result = book_result(row)
+        if result["isbn"] in self.doc_ids:
+            self._remove_doc(result["isbn"])
+
+        weighted = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(result.get(field)):
+                weighted[token] += weight
+
+        doc_id = len(self.docs)
+        self.docs.append(result)
+        self.doc_ids[result["isbn"]] = doc_id
+        for field in ("isbn", "isbn13"):
+            if result.get(field):
+                self.isbn_keys.append((str(result[field]).upper(), doc_id))  # sorted by the caller
+        length = sum(weighted.values())
+        self.doc_lengths.append(length)
+        self.total_length += length
+
+        doc_facets = {}
+        for facet, values in facet_values(row).items():
+            keys = []
+            for value in values:
+                key = facet_key(value)
+                if key:
+                    self.facets[facet][key].add(doc_id)
+                    self.facet_labels[facet].setdefault(key, str(value).strip())
+                    keys.append(key)
+            doc_facets[facet] = keys
+        self.doc_facets.append(doc_facets)
+
+        new_tokens = set()
+        for token, tf in weighted.items():
+            if token not in self.postings:
+                new_tokens.add(token)
+                if _uses_trigrams(token):
+                    for gram in trigrams(token):
+                        self.trigram_map[gram].add(token)
+            self.postings[token][doc_id] = tf
+        return new_tokens
+
+    def _remove_doc(self, isbn: str) -> None:
+        doc_id = self.doc_ids.pop(isbn, None)
+        if doc_id is None:
+            return
+        for token in tokenize([self.docs[doc_id].get(f) for f in FIELD_WEIGHTS]):
+            self.postings.get(token, {}).pop(doc_id, None)
+        self.total_length -= self.doc_lengths[doc_id]
+        self.doc_lengths[doc_id] = 0.0
+        self.docs[doc_id] = None
+        for facet, keys in self.doc_facets[doc_id].items():
+            for key in keys:
+                self.facets[facet][key].discard(doc_id)
+        self.doc_facets[doc_id] = {}
+
+    def add_books(self, rows: list) -> None:
+        """Incrementally index (or re-index) book rows (see _index_query)."""
+        with self._lock:
+            for row in rows:
+                for token in self._add_doc(row):
+                    bisect.insort(self.vocabulary, token)
+            self.isbn_keys.sort()  # nearly sorted: linear time
+
+    def remove_book(self, isbn: str) -> None:
+        with self._lock:
+            self._remove_doc(isbn)
+
+    def lookup_isbn(self, prefix: str, limit: int = 30, after: str = None) -> tuple:
+        """
+        Books whose ISBN-10 or ISBN-13 starts with `prefix`, in ISBN order.
+
+        A bisect on the sorted ISBN keys: constant work per result whatever
+        the catalog size. Full ISBNs go through find_isbns() instead, since
+        an ISBN-10 is also a prefix of unrelated 13-character keys.
+
+        Args:
+            prefix: Compact, uppercase ISBN or ISBN prefix
+            limit: Maximum number of results
+            after: Last ISBN key of the previous page (keyset pagination)
+
+        Returns:
+            Tuple (results, next key or None)
+        """
+        with self._lock:
+            start = bisect.bisect_right(self.isbn_keys, (after, float("inf"))) if after else \
+                bisect.bisect_left(self.isbn_keys, (prefix,))
+            results, seen, last_key = [], set(), None
+            for position in range(start, len(self.isbn_keys)):
+                key, doc_id = self.isbn_keys[position]
+                if not key.startswith(prefix):
+                    return results, None
+                if self.docs[doc_id] is None or doc_id in seen:
+                    continue  # removed / re-indexed book, or matched by both ISBNs
+                if len(results) == limit:
+                    return results, last_key
+                seen.add(doc_id)
+                results.append(self.docs[doc_id])
+                last_key = key
+            return results, None
+
+    def find_isbns(self, keys) -> list:
+        """
+        Books whose ISBN-10 or ISBN-13 equals one of `keys` (full ISBN lookup).
+
+        Args:
+            keys: Compact, uppercase ISBNs (e.g. both forms of one ISBN)
+
+        Returns:
+            List of result payloads, each book once
+        """
+        with self._lock:
+            results, seen = [], set()
+            for key in keys:
+                position = bisect.bisect_left(self.isbn_keys, (key,))
+                while position < len(self.isbn_keys) and self.isbn_keys[position][0] == key:
+                    doc_id = self.isbn_keys[position][1]
+                    position += 1
+                    if self.docs[doc_id] is None or doc_id in seen:
+                        continue  # removed / re-indexed book, or matched by both ISBNs
+                    seen.add(doc_id)
+                    results.append(self.docs[doc_id])
+            return results
+
+    def book_tokens(self, isbns) -> set:
+        """Every token of the given indexed books (for cache invalidation)."""
+        tokens = set()
+        with self._lock:
+            for isbn in isbns:
+                doc_id = self.doc_ids.get(isbn)
+                if doc_id is not None:
+                    tokens.update(tokenize([self.docs[doc_id].get(f) for f in FIELD_WEIGHTS]))
+        return tokens
+
+    def _expand(self, word: str) -> dict:
+        """Vocabulary tokens matching a query word -> score factor."""
+        matches = {}
+        if _uses_trigrams(word) and not word.isdigit():
+            grams = sorted(trigrams(word), key=lambda g: len(self.trigram_map.get(g, ())))
+            candidates = set(self.trigram_map.get(grams[0], ()))
+            for gram in grams[1:]:
+                candidates &= self.trigram_map.get(gram, set())
+                if not candidates:
+                    break
+            for token in candidates:
+                if word in token:
+                    matches[token] = SUBSTRING_PENALTY
+        else:
+            start = bisect.bisect_left(self.vocabulary, word)
+            for token in self.vocabulary[start:start + MAX_EXPANSIONS]:
+                if not token.startswith(word):
+                    break
+                matches[token] = SUBSTRING_PENALTY
+
+        if len(matches) > MAX_EXPANSIONS:
+            # Keep the closest (shortest) words
+            kept = sorted(matches, key=len)[:MAX_EXPANSIONS]
+            matches = {token: matches[token] for token in kept}
+        if word in self.postings:
+            matches[word] = 1.0
+        return matches
+
+    def _score(self, words: list) -> dict:
+        """BM25 score of every document matching all words (caller holds the lock)."""
+        live_docs = len(self.doc_ids) or 1
+        avg_length = (self.total_length / live_docs) or 1.0
+        scores = None
+        for word in words:
+            word_scores = defaultdict(float)
+            for token, factor in self._expand(word).items():
+                postings = self.postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + (live_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / avg_length)
+                    score = factor * idf * tf * (BM25_K1 + 1) / (tf + norm)
+                    if score > word_scores[doc_id]:
+                        word_scores[doc_id] = score  # best expansion per word
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {d: s + word_scores[d] for d, s in scores.items() if d in word_scores}
+            if not scores:
+                return {}
+        return scores
+
+    def _filter_docs(self, filters: dict):
+        """Doc ids passing every facet filter (values of one facet are ORed)."""
+        allowed = None
+        for facet, values in sorted(filters.items(), key=lambda item: len(item[1])):
+            postings = self.facets[facet]
+            docs = set()
+            for value in values:
+                docs |= postings.get(facet_key(value), set())
+            allowed = docs if allowed is None else allowed & docs
+            if not allowed:
+                return set()
+        return allowed
+
+    def _matches(self, words: list, filters: dict) -> dict:
+        """Doc id -> score of documents matching the words and filters (caller holds the lock)."""
+        allowed = self._filter_docs(filters) if filters else None
+        if not words:
+            # Browsing by facets only: every filtered book, in catalog order
+            return dict.fromkeys(allowed, 0.0) if allowed is not None else {}
+        scores = self._score(words)
+        if allowed is not None:
+            scores = {d: s for d, s in scores.items() if d in allowed}
+        return scores
+
+    def search_page(self, query: str, limit: int = 30, after=None, filters: dict = None) -> tuple:
+        """
+        Rank books matching every word of the query, one page at a time.
+
+        Results are ordered by (score desc, doc id asc), a total order, so a
+        page can resume right after the last item of the previous one
+        (keyset pagination) instead of skipping OFFSET results. Only the
+        `limit` best candidates past the cursor are selected (heap), so deep
+        pages cost the same as the first one.
+
+        Args:
+            query: Free text (title words, author, genre, full or partial ISBN)
+            limit: Maximum number of results
+            after: Ranking key (score, doc id) of the last item already seen
+            filters: Optional {facet: [values]}; an empty query with filters
+                     lists every matching book
+
+        Returns:
+            Tuple (results, next ranking key or None, total matches)
+        """
+        words = list(dict.fromkeys(tokenize(query)))
+        if not words and not filters:
+            return [], None, 0
+
+        with self._lock:
+            scores = self._matches(words, filters)
+            candidates = scores.items()
+            if after is not None:
+                after_score, after_id = after
+                candidates = (
+                    (d, s) for d, s in candidates
+                    if s < after_score or (s == after_score and d > after_id)
+                )
+            page = heapq.nsmallest(limit + 1, candidates, key=lambda item: (-item[1], item[0]))
+            next_key = None
+            if len(page) > limit:
+                page = page[:limit]
+                next_key = (page[-1][1], page[-1][0])
+            return [self.docs[doc_id] for doc_id, _ in page], next_key, len(scores)
+
+    def search(self, query: str, limit: int = 30) -> list:
+        """First page of search_page(): results only, best match first."""
+        return self.search_page(query, limit)[0]
+
+    def facet_counts(self, query: str = "", filters: dict = None, top: int = 20) -> dict:
+        """
+        Count facet values over the books matching a query and filters.
+
+        Without query and filters the counts are the sizes of the facet
+        posting sets (no document is visited).
+
+        Args:
+            query: Free text, as for search_page()
+            filters: Optional {facet: [values]}
+            top: Values returned per facet (most frequent first)
+
+        Returns:
+            {facet: [{"value": display value, "count": n}, ...]}
+        """
+        words = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            counts = {facet: defaultdict(int) for facet in FACETS}
+            if not words and not filters:
+                for facet, postings in self.facets.items():
+                    for key, docs in postings.items():
+                        if docs:
+                            counts[facet][key] = len(docs)
+            else:
+                for doc_id in self._matches(words, filters):
+                    for facet, keys in self.doc_facets[doc_id].items():
+                        for key in keys:
+                            counts[facet][key] += 1
+
+            return {
+                facet: [
+                    {"value": self.facet_labels[facet][key], "count": count}
+                    for key, count in sorted(values.items(), key=lambda item: (-item[1], item[0]))[:top]
+                ]
+                for facet, values in counts.items()
+            }
+
+    def on_index_event(self, event: dict) -> None:
+        """Index event subscriber adding books saved by other processes."""
+        if event["type"] == RESYNC:
+            self.load()
+            return
+        with self._lock:
+            if self._missed is not None:
+                self._missed.append(event)  # The running load may have read the old rows
+            if not self.loaded:
+                return
+        self._apply_event(event)
+
+    def _apply_event(self, event: dict) -> None:
+        if event["type"] == BOOKS_ADDED:
+            isbns = [book["isbn"] for book in event.get("books", [])]
+            if not isbns:
+                return
+            session = SessionLocal()
+            try:
+                rows = _index_query(session).filter(Book.isbn.in_(isbns)).all()
+            finally:
+                session.close()
+            self.add_books(rows)
+        elif event["type"] == BOOKS_REMOVED:
+            for isbn in event.get("isbns", []):
+                self.remove_book(isbn)
+
+
+search_index = SearchIndex()
+subscribe(search_index.on_index_event)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Autocomplete Latency Check
+
+Builds the suggestion trie (utils/suggest_index.py) from data/books.csv, no
+database needed, and times typical and typo'd queries, including while a
+rebuild runs in the background. Exits with status 1 if any query's median
+exceeds --max-ms, so it can gate changes to the typo-tolerant walk.
+
+Usage (from code/Backend):
+    python -m utils.suggest_benchmark --max-ms 10
+"""
+
+import os
+import csv
+import sys
+import time
+import argparse
+import threading
+import statistics
+from utils.suggest_index import SuggestIndex
+
+CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "books.csv")
+
+# Exact prefixes, 1-edit and 2-edit typos, and queries matching nothing
+QUERIES = [
+    "harr", "dune", "tolkein", "harry pottr", "hary poter", "the hobbit", "the hobiit",
+    "pride and prejudise", "lord of the rigns", "agatha christy", "stephen kng",
+    "a tale of two citys", "to kill a mockinbird", "wuthering hieghts",
+    "the quick brown", "sssssssssss", "aaaa bbbb cccc dddd eeee",
+]
+
+
+def read_books(path: str) -> list:
+    """(isbn, title, authors) rows of the books CSV."""
+    with open(path, newline="", encoding="utf-8") as f:
+        return [(row["isbn"], row["title"], row["authors"].split("/")) for row in csv.DictReader(f)]
+
+
+def time_queries(index: SuggestIndex, queries: list, repeat: int) -> dict:
+    """Median latency in milliseconds of each query."""
+    timings = {}
+    for query in queries:
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            index.suggest(query)
+            samples.append((time.perf_counter() - start) * 1000)
+        timings[query] = statistics.median(samples)
+    return timings
+
+
+def during_rebuild(index: SuggestIndex, books: list) -> float:
+    """
+    Median lookup latency (ms) while the trie is rebuilt in another thread.
+
+    Lookups must not wait for the rebuild; the odd slow one is a garbage
+    collection pass over the new trie's objects, hence the median.
+    """
+    rebuild = threading.Thread(target=index.build, args=(books, {}))
+    rebuild.start()
+    samples = []
+    while rebuild.is_alive():
+        start = time.perf_counter()
+        index.suggest("harry pottr")
+        samples.append((time.perf_counter() - start) * 1000)
+    rebuild.join()
+    return statistics.median(samples)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check autocomplete latency against a budget")
+    parser.add_argument("--csv", default=CSV_PATH, help="books CSV to index")
+    parser.add_argument("--repeat", type=int, default=9, help="runs per query")
+    parser.add_argument("--max-ms", type=float, default=10.0, help="fail if a query's median exceeds this")
+    args = parser.parse_args()
+
+    books = read_books(args.csv)
+    index = SuggestIndex()
+    start = time.perf_counter()
+    index.build(books, {})
+    print(f"💡 Built {len(index.entries)} entries in {time.perf_counter() - start:.2f}s")
+
+    timings = time_queries(index, QUERIES, args.repeat)
+    timings["(lookups during rebuild)"] = during_rebuild(index, books)
+
+    failed = False
+    for query, elapsed in timings.items():
+        ok = elapsed <= args.max_ms
+        failed = failed or not ok
+        print(f"   {'✅' if ok else '❌'} {query!r:28} {elapsed:6.2f} ms")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,347 @@
+"""
+Autocomplete Suggestion Index
+
+Prefix trie over normalized book titles and author names backing
+/api/search/suggest.
+
+- Keys: the full normalized title / author name plus the suffixes starting
+  at each later word ("hobbit" completes "The Hobbit"), truncated to
+  MAX_KEY_LENGTH characters to bound the trie size.
+- Each trie node caches its TOP_K most popular entries, so an exact prefix
+  lookup is a walk down the trie and nothing more.
+- Typo tolerance: an edit-distance walk (one banded DP row per node,
+  Damerau transpositions included) accepts prefixes within max_edits() of
+  each query word (1 edit from 4 characters, 2 from 8), at most 2 in total.
+  Short words and the first character must match, which keeps the walk off
+  the wide fan-out after word starts; it runs best-first and stops once the
+  requested number of closer entries is found.
+- Popularity: number of user scans of the book (UserScan rows); an author's
+  popularity is the sum over their books.
+
+Built in a background thread at startup, extended on BOOKS_ADDED events and
+rebuilt every REFRESH_INTERVAL seconds to pick up new scan counts; rebuilds
+happen off to the side and are swapped in, so lookups never wait for them.
+Books added from the start of a (re)load's database read are replayed into
+the new trie.
+"""
+
+import os
+import time
+import threading
+from sqlalchemy import func
+from utils.db_models import SessionLocal, Book, UserScan
+from utils.index_events import subscribe, BOOKS_ADDED, RESYNC
+from utils.search_index import tokenize
+
+TOP_K = 10  # entries cached per trie node
+MAX_KEY_LENGTH = 24
+MAX_SUFFIX_WORDS = 4  # word-start suffixes indexed per title
+MAX_WALK_NODES = 600  # trie nodes expanded per typo-tolerant lookup
+REFRESH_INTERVAL = int(os.getenv("SUGGEST_REFRESH_INTERVAL", "600"))  # seconds
+
+
+def max_edits(query: str) -> int:
+    """Edit distance tolerated for a query of this length."""
+    if len(query) >= 8:
+        return 2
+    if len(query) >= 4:
+        return 1
+    return 0
+
+
+class _Node:
+    __slots__ = ("children", "top")
+
+    def __init__(self):
+        self.children = {}
+        self.top = []  # entry ids, most popular first
+
+
+class SuggestIndex:
+    """Popularity-ranked, typo-tolerant prefix completion over titles and authors."""
+
+    def __init__(self):
+        self.loaded = False
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()  # one rebuild at a time
+        self._added_during_build = None  # books to replay into the trie being built
+        self._reset()
+
+    def _reset(self) -> None:
+        self.root = _Node()
+        self.entries = []  # entry id -> {"text", "type", "isbn"}
+        self.popularity = []  # entry id -> scan count
+        self.author_ids = {}  # normalized author name -> entry id
+        self.title_ids = {}  # isbn -> title entry id (re-added books keep one entry)
+
+    def load(self) -> None:
+        """(Re)build the trie from the database."""
+        with self._build_lock:
+            with self._lock:
+                self._added_during_build = []  # From before the read below on
+            session = SessionLocal()
+            try:
+                books = session.query(Book.isbn, Book.title, Book.authors).all()
+                scans = dict(session.query(UserScan.isbn, func.count()).group_by(UserScan.isbn).all())
+            finally:
+                session.close()
+            self._build(books, scans)
+        print(f"💡 Suggest index loaded: {len(self.entries)} entries")
+
+    def build(self, books, scans: dict) -> None:
+        """
+        Build a fresh trie and swap it in.
+
+        The build runs outside the lock, so suggest() keeps answering from the
+        current trie meanwhile; books added during the build are replayed
+        into the new one.
+
+        Args:
+            books: (isbn, title, authors) rows
+            scans: isbn -> number of user scans
+        """
+        with self._build_lock:
+            with self._lock:
+                self._added_during_build = []
+            self._build(books, scans)
+
+    def _build(self, books, scans: dict) -> None:
+        """build() body; the caller holds _build_lock and started recording additions."""
+        fresh = SuggestIndex()
+        for isbn, title, authors in books:
+            fresh._add_book(isbn, title, authors, scans.get(isbn, 0))
+
+        with self._lock:
+            self.root, self.entries = fresh.root, fresh.entries
+            self.popularity, self.author_ids = fresh.popularity, fresh.author_ids
+            self.title_ids = fresh.title_ids
+            for isbn, title, authors in self._added_during_build:
+                self._add_book(isbn, title, authors, 0)
+            self._added_during_build = None
+            self.loaded = True
+
+    def start(self) -> threading.Thread:
+        """Load now and refresh popularity periodically, in a daemon thread."""
+        def run():
+            while True:
+                try:
+                    self.load()
+                except Exception as e:
+                    print(f"[SUGGEST] load failed: {e}")
+                time.sleep(REFRESH_INTERVAL)
+
+        thread = threading.Thread(target=run, name="suggest-index-loader", daemon=True)
+        thread.start()
+        return thread
+
+    def _add_entry(self, text: str, kind: str, isbn, popularity: int, keys: list) -> int:
+        entry_id = len(self.entries)
+        self.entries.append({"text": text, "type": kind, "isbn": isbn})
+        self.popularity.append(popularity)
+        for key in keys:
+            self._insert(key, entry_id)
+        return entry_id
+
+    def _add_book(self, isbn: str, title: str, authors, scans: int) -> None:
+        if title and isbn not in self.title_ids:
+            words = tokenize(title)
+            keys = {" ".join(words[i:])[:MAX_KEY_LENGTH] for i in range(min(len(words), MAX_SUFFIX_WORDS))}
+            self.title_ids[isbn] = self._add_entry(title, "title", isbn, scans, sorted(k for k in keys if k))
+
+        if isinstance(authors, str):
+            authors = [authors]
+        for author in authors or []:
+            words = tokenize(author)
+            if not words:
+                continue
+            name = " ".join(words)
+            entry_id = self.author_ids.get(name)
+            if entry_id is None:
+                keys = {name[:MAX_KEY_LENGTH], words[-1][:MAX_KEY_LENGTH]}  # "tolkien" finds "J.R.R. Tolkien"
+                self.author_ids[name] = self._add_entry(author, "author", None, scans, sorted(keys))
+            elif scans:
+                self.popularity[entry_id] += scans
+                keys = {name[:MAX_KEY_LENGTH], words[-1][:MAX_KEY_LENGTH]}
+                for key in keys:
+                    self._insert(key, entry_id)  # re-rank along the paths
+
+    def _insert(self, key: str, entry_id: int) -> None:
+        node = self.root
+        self._offer(node, entry_id)
+        for char in key:
+            node = node.children.setdefault(char, _Node())
+            self._offer(node, entry_id)
+
+    def _offer(self, node: _Node, entry_id: int) -> None:
+        """Keep node.top as the TOP_K most popular entries passing through the node."""
+        top = node.top
+        if entry_id in top:
+            top.remove(entry_id)
+        popularity = self.popularity[entry_id]
+        position = len(top)
+        while position > 0 and self.popularity[top[position - 1]] < popularity:
+            position -= 1
+        if position < TOP_K:
+            top.insert(position, entry_id)
+            del top[TOP_K:]
+
+    def add_books(self, books: list) -> None:
+        """Add freshly saved books (isbn, title, authors tuples)."""
+        with self._lock:
+            for isbn, title, authors in books:
+                self._add_book(isbn, title, authors, 0)
+            if self._added_during_build is not None:
+                self._added_during_build.extend(books)
+
+    def suggest(self, query: str, limit: int = 8) -> list:
+        """
+        Complete a partial query.
+
+        Args:
+            query: What the user typed so far
+            limit: Maximum number of suggestions
+
+        Returns:
+            List of {"text", "type", "isbn", "distance"}; exact prefix matches
+            first, then by popularity
+        """
+        key = " ".join(tokenize(query))[:MAX_KEY_LENGTH]
+        if not key:
+            return []
+
+        with self._lock:
+            best = self._collect(key, max_edits(key), limit)
+            ranked = sorted(best.items(), key=lambda item: (item[1], -self.popularity[item[0]], item[0]))
+            return [
+                {**self.entries[entry_id], "distance": distance}
+                for entry_id, distance in ranked[:limit]
+            ]
+
+    def _collect(self, key: str, edits: int, limit: int) -> dict:
+        """
+        Entries of the trie prefixes within `edits` of key.
+
+        Args:
+            key: Normalized query
+            edits: Edit distance tolerated for the whole query
+            limit: Number of suggestions wanted
+
+        Returns:
+            Dictionary of entry id -> edit distance
+        """
+        best = {}  # entry id -> edit distance
+
+        # allowed[i]: edits tolerated in key[:i], the budgets of the words it
+        # reaches (short words like "the" must match exactly)
+        allowed, budget = [0], 0
+        for position, char in enumerate(key):
+            if position == 0 or key[position - 1] == " ":
+                budget += max_edits(key[position:].split(" ", 1)[0])
+            allowed.append(min(budget, edits))
+        edits = allowed[-1]
+
+        def take(node, distance):
+            for entry_id in node.top:
+                if distance < best.get(entry_id, distance + 1):
+                    best[entry_id] = distance
+
+        node = self.root
+        if edits == 0:
+            for char in key:
+                node = node.children.get(char)
+                if node is None:
+                    return best
+            take(node, 0)
+            return best
+
+        # The first character must match (typos there are rare), which keeps
+        # the walk inside one top-level branch
+        node = node.children.get(key[0])
+        key, allowed = key[1:], allowed[1:]
+        if node is None:
+            return best
+        if not key:
+            take(node, 0)
+            return best
+
+        # Edit-distance walk: row[i] = distance between key[:i] and the current
+        # prefix; the previous row and character allow transpositions. Only the
+        # band |i - depth| <= edits can stay within range, so cells outside it
+        # are left at `out` (edits + 1) instead of being computed. Characters
+        # absent from the band's part of the key all give the same row, which
+        # is computed once per node.
+        #
+        # Nodes are expanded best-first by the lowest value of their row, which
+        # never decreases further down the trie: once `limit` entries are closer
+        # than the current level, the rest of the walk can only add worse ones.
+        # MAX_WALK_NODES bounds the walk for queries matching nothing.
+        size = len(key)
+        out = edits + 1
+
+        def step(row, prev_row, prev_char, char, start, stop):
+            new_row = [out] * (size + 1)  # new_row[0] (depth insertions) is never allowed
+            lowest = out
+            for i in range(start, stop + 1):
+                expected = key[i - 1]
+                if expected == char:
+                    distance = row[i - 1]
+                else:
+                    distance = min(new_row[i - 1], row[i], row[i - 1]) + 1
+                    if i > 1 and expected == prev_char and key[i - 2] == char and prev_row[i - 2] + 1 < distance:
+                        distance = prev_row[i - 2] + 1
+                if distance > allowed[i]:
+                    distance = out
+                elif distance < lowest:
+                    lowest = distance
+                new_row[i] = distance
+            return new_row, lowest
+
+        levels = [[] for _ in range(out)]  # lowest row value -> pending (node, row, prev_row, prev_char, depth)
+        levels[0].append((node, [i if i <= allowed[i] else out for i in range(size + 1)], None, None, 0))
+        expanded = 0
+        for level, pending in enumerate(levels):
+            if sum(1 for distance in best.values() if distance < level) >= limit:
+                break
+            while pending and expanded < MAX_WALK_NODES:
+                node, row, prev_row, prev_char, depth = pending.pop()
+                expanded += 1
+                if row[-1] <= edits:
+                    take(node, row[-1])
+                depth += 1
+                start, stop = max(1, depth - edits), min(size, depth + edits)
+                relevant = set(key[max(0, start - 2):stop])  # chars that can match or transpose
+                other_row, other_lowest = step(row, prev_row, prev_char, None, start, stop)
+                if other_lowest <= edits:
+                    children = node.children.items()
+                else:
+                    children = [(char, node.children[char]) for char in relevant if char in node.children]
+                for char, child in children:
+                    if char in relevant:
+                        new_row, lowest = step(row, prev_row, prev_char, char, start, stop)
+                    else:
+                        new_row, lowest = other_row, other_lowest
+                    if lowest <= edits:  # otherwise no extension can get back within range
+                        levels[lowest].append((child, new_row, row, char, depth))
+        return best
+
+    def on_index_event(self, event: dict) -> None:
+        """Index event subscriber adding books saved by other processes."""
+        if event["type"] == BOOKS_ADDED:
+            with self._lock:
+                if not self.loaded and self._added_during_build is None:
+                    return  # The first load hasn't started: it will read the book
+            isbns = [book["isbn"] for book in event.get("books", [])]
+            if not isbns:
+                return
+            session = SessionLocal()
+            try:
+                books = session.query(Book.isbn, Book.title, Book.authors).filter(Book.isbn.in_(isbns)).all()
+            finally:
+                session.close()
+            self.add_books(books)
+        elif event["type"] == RESYNC:
+            self.load()
+
+
+suggest_index = SuggestIndex()
+subscribe(suggest_index.on_index_event)
@@ -0,0 +1,136 @@
+"""
+Username -> User ID Cache
+
+Process-level cache for the username lookup that starts nearly every user
+and collection handler, plus an atomic get-or-create.
+
+- Positive entries: username -> id, kept until USER_CACHE_TTL expires or
+  the user is deleted.
+- Negative entries: "no such user", kept NEGATIVE_TTL seconds, so read
+  endpoints polled by brand-new users don't query MySQL every time.
+- get_or_create_user_id() never trusts a negative entry: it selects, then
+  INSERT IGNOREs on a miss (the unique username index makes concurrent
+  creations converge on one row), then selects again if it lost the race.
+
+Users created or deleted in one process are announced to the others with a
+USERS_CHANGED index event (utils.index_events), which drops their entries.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from utils.db_models import User
+from utils.index_events import subscribe, publish_event, USERS_CHANGED, RESYNC
+
+MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "50000"))
+TTL = int(os.getenv("USER_CACHE_TTL", "3600"))  # seconds, positive entries
+NEGATIVE_TTL = int(os.getenv("USER_CACHE_NEGATIVE_TTL", "30"))  # seconds, "no such user"
+
+_MISSING = object()
+
+
+class UserIdCache:
+    """Thread-safe LRU of username -> user id (or None for unknown users)."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # username -> (user id or None, expires_at)
+        self._lock = threading.Lock()
+
+    def _get(self, username: str):
+        """Cached id, None for a cached "no such user", or _MISSING."""
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                return _MISSING
+            if entry[1] < time.time():
+                del self._entries[username]
+                return _MISSING
+            self._entries.move_to_end(username)
+            return entry[0]
+
+    def _set(self, username: str, user_id) -> None:
+        ttl = TTL if user_id is not None else NEGATIVE_TTL
+        with self._lock:
+            self._entries[username] = (user_id, time.time() + ttl)
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def resolve(self, session, username: str):
+        """
+        User id for a username, without creating it.
+
+        Args:
+            session: Open database session (used on cache misses)
+            username: Username to resolve
+
+        Returns:
+            The user id, or None if the user doesn't exist
+        """
+        user_id = self._get(username)
+        if user_id is _MISSING:
+            user_id = session.query(User.id).filter(User.username == username).scalar()
+            self._set(username, user_id)
+        return user_id
+
+    def get_or_create(self, session, username: str) -> int:
+        """
+        User id for a username, creating the user if needed.
+
+        A creation is committed right away (as the handlers always did), so
+        call this before making other changes in the session.
+
+        Args:
+            session: Open database session
+            username: Username to resolve or create
+
+        Returns:
+            The user id
+        """
+        user_id = self._get(username)
+        if user_id is not _MISSING and user_id is not None:
+            return user_id
+
+        user_id = session.query(User.id).filter(User.username == username).scalar()
+        if user_id is None:
+            result = session.execute(User.__table__.insert().prefix_with("IGNORE"), {"username": username})
+            session.commit()
+            if result.rowcount:
+                user_id = result.inserted_primary_key[0]
+                publish_event(USERS_CHANGED, usernames=[username])
+            else:
+                # Created concurrently by another request
+                user_id = session.query(User.id).filter(User.username == username).scalar()
+        self._set(username, user_id)
+        return user_id
+
+    def invalidate(self, *usernames: str, announce: bool = True) -> None:
+        """
+        Forget usernames (after deleting users).
+
+        Args:
+            usernames: Usernames to drop
+            announce: Also tell the other API processes
+        """
+        with self._lock:
+            for username in usernames:
+                self._entries.pop(username, None)
+        if announce and usernames:
+            publish_event(USERS_CHANGED, usernames=list(usernames))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def on_index_event(self, event: dict) -> None:
+        """Index event subscriber dropping users created or deleted elsewhere."""
+        if event["type"] == USERS_CHANGED:
+            self.invalidate(*event.get("usernames", []), announce=False)
+        elif event["type"] == RESYNC:
+            self.clear()
+
+
+user_ids = UserIdCache()
+subscribe(user_ids.on_index_event)
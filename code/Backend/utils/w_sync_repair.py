@@ -4,6 +4,7 @@ import json
 import faiss
 from utils.db_models import SessionLocal, Book, AppLog
 from setup.build_index import add_to_index
+from utils.index_events import publish_event, RESYNC
 
 # Paths configuration
 BASE_DIR    = os.path.dirname(__file__)
@@ -122,5 +123,8 @@ def main():
     session.close()
     log_app("REPAIR", f"Rebuilt FAISS index with {rebuilt} vectors")
 
+    # Running API processes must reload the index and drop book caches
+    publish_event(RESYNC, reason="w_sync_repair")
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,210 @@
+"""
+Worker Metrics
+
+Structured throughput and latency metrics for background workers.
+
+Each worker process keeps a WorkerMetrics instance in memory and periodically
+writes a JSON snapshot to data/worker_metrics/<worker_id>-<pid>.json. The
+admin API reads those snapshots (read_worker_metrics) so the workers status
+endpoint can report queue depth, items/min, per-stage latency, outcome
+counters and external API error rates for every running process.
+
+A process removes its snapshot when it exits normally; snapshots of
+processes that are gone (terminated workers) are pruned when read.
+"""
+
+import os
+import json
+import time
+import atexit
+from collections import deque
+from contextlib import contextmanager
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+METRICS_DIR = os.path.abspath(os.path.join(BASE_DIR, "..", "data", "worker_metrics"))
+
+FLUSH_INTERVAL = 5  # seconds between snapshot writes
+RATE_WINDOW = 300  # seconds of completions used for items/min
+LATENCY_SAMPLES = 200  # recent samples kept per stage for percentiles
+STALE_AFTER = 60  # snapshots older than this are reported as stale
+PRUNE_AFTER = 86400  # snapshots older than this are deleted even if their pid is in use
+
+
+def _percentile(values: list, pct: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+class WorkerMetrics:
+    """
+    In-process metrics collector for one worker process.
+
+    Usage:
+        metrics = WorkerMetrics("book_worker")
+        with metrics.stage("fetch"):
+            ...
+        metrics.record_api_call("google_books", ok=True)
+        metrics.item_done("books_added")
+        metrics.flush()
+    """
+
+    def __init__(self, worker_id: str):
+        self.worker_id = worker_id
+        self.pid = os.getpid()
+        self.started_at = time.time()
+        self.queue_depth = {}
+        self.counters = {}
+        self.stages = {}  # name -> {"count", "total", "max", "recent"}
+        self.api_calls = {}  # source -> {"ok", "error"}
+        self.completions = deque()  # timestamps of finished items
+        self._last_flush = 0.0
+        self.path = os.path.join(METRICS_DIR, f"{worker_id}-{self.pid}.json")
+        atexit.register(self.remove)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block as one sample of the given stage."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record_latency(name, time.monotonic() - start)
+
+    def record_latency(self, name: str, seconds: float) -> None:
+        stats = self.stages.setdefault(
+            name, {"count": 0, "total": 0.0, "max": 0.0, "recent": deque(maxlen=LATENCY_SAMPLES)}
+        )
+        stats["count"] += 1
+        stats["total"] += seconds
+        stats["max"] = max(stats["max"], seconds)
+        stats["recent"].append(seconds)
+
+    def incr(self, counter: str, amount: int = 1) -> None:
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def record_api_call(self, source: str, ok: bool) -> None:
+        """Count one call to an external API (Google Books, OpenLibrary, CDN...)."""
+        calls = self.api_calls.setdefault(source, {"ok": 0, "error": 0})
+        calls["ok" if ok else "error"] += 1
+
+    def item_done(self, outcome: str) -> None:
+        """Record a finished queue item (e.g. "books_added", "books_stuck")."""
+        self.incr(outcome)
+        self.completions.append(time.time())
+
+    def set_queue_depth(self, **depths) -> None:
+        """Record current queue sizes, e.g. set_queue_depth(pending=12, stuck=3)."""
+        self.queue_depth = depths
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        while self.completions and self.completions[0] < now - RATE_WINDOW:
+            self.completions.popleft()
+        window = min(RATE_WINDOW, max(now - self.started_at, 1))
+
+        stages = {}
+        for name, stats in self.stages.items():
+            recent = list(stats["recent"])
+            stages[name] = {
+                "count": stats["count"],
+                "avg_ms": round(stats["total"] / stats["count"] * 1000, 1),
+                "p50_ms": round(_percentile(recent, 50) * 1000, 1),
+                "p95_ms": round(_percentile(recent, 95) * 1000, 1),
+                "max_ms": round(stats["max"] * 1000, 1),
+            }
+
+        api = {}
+        for source, calls in self.api_calls.items():
+            total = calls["ok"] + calls["error"]
+            api[source] = dict(calls, error_rate=round(calls["error"] / total, 3) if total else 0.0)
+
+        return {
+            "worker_id": self.worker_id,
+            "pid": self.pid,
+            "started_at": self.started_at,
+            "updated_at": now,
+            "queue_depth": self.queue_depth,
+            "items_per_min": round(len(self.completions) * 60 / window, 2),
+            "counters": self.counters,
+            "stages": stages,
+            "external_apis": api,
+        }
+
+    def flush(self, force: bool = False) -> None:
+        """Write the snapshot file at most every FLUSH_INTERVAL seconds."""
+        now = time.monotonic()
+        if not force and now - self._last_flush < FLUSH_INTERVAL:
+            return
+        self._last_flush = now
+        try:
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"[METRICS ERROR] {e}")
+
+    def remove(self) -> None:
+        """Delete this process's snapshot (registered to run at exit)."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"[METRICS ERROR] {e}")
+
+
+def _pid_alive(pid) -> bool:
+    """Whether a process with this pid exists (assumed so where it can't be checked)."""
+    if os.name != "posix" or not isinstance(pid, int):
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Exists, owned by another user
+    return True
+
+
+def read_worker_metrics() -> dict:
+    """
+    Load the latest snapshots written by worker processes.
+
+    Snapshots of processes that no longer exist, or not refreshed for
+    PRUNE_AFTER seconds, are deleted instead of being returned.
+
+    Returns:
+        Dictionary mapping worker_id to a list of per-process snapshots,
+        each flagged with "stale" when it has not been refreshed recently
+    """
+    result = {}
+    if not os.path.isdir(METRICS_DIR):
+        return result
+
+    now = time.time()
+    for fname in sorted(os.listdir(METRICS_DIR)):
+        if not fname.endswith(".json"):
+            continue
+        path = os.path.join(METRICS_DIR, fname)
+        try:
+            with open(path, "r") as f:
+                snap = json.load(f)
+        except (OSError, ValueError):
+            continue
+        age = now - snap.get("updated_at", 0)
+        # Only stale snapshots are checked against the pid table: a live worker
+        # refreshes its file, even if it runs where its pid isn't visible
+        if age > PRUNE_AFTER or (age > STALE_AFTER and not _pid_alive(snap.get("pid"))):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        snap["stale"] = age > STALE_AFTER
+        result.setdefault(snap.get("worker_id", fname), []).append(snap)
+    return result
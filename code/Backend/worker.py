@@ -5,8 +5,10 @@ Book Processing Worker
 This worker continuously monitors the pending_books queue and processes new book requests.
 For each pending book, it:
 1. Fetches metadata from Google Books API or OpenLibrary
-2. Downloads book cover images from multiple sources
-3. Adds the book cover to the FAISS search index
+2. Downloads book cover images from multiple sources and normalizes them
+   (validated, upright, downsized, recompressed JPEG)
+3. Hands the book to the indexing stage, which encodes covers in batches and
+   adds them to the FAISS search index with one index rewrite per batch
 4. Stores the book data in the database
 
 The worker handles failures gracefully by marking books as "stuck" for manual review.
@@ -16,8 +18,13 @@ import os
 import time
 import json
 import requests
-from utils.db_models import SessionLocal, PendingBook, Book, AppLog, ScanLog
-from setup.build_index import add_to_index
+from utils.db_models import SessionLocal, PendingBook, Book, AppLog, ScanLog, PRIORITY_INTERACTIVE
+from utils.pending_queue import select_next_batch, queue_depth_by_lane
+from setup.build_index import add_many_to_index
+from utils.index_events import publish_event, INDEX_UPDATED, BOOKS_ADDED, BOOK_STUCK
+from utils.worker_metrics import WorkerMetrics
+from utils.cover_processing import save_cover, InvalidCoverError
+from utils.isbn import isbn_pair, InvalidISBNError
 
 # Configuration constants
 BASE_DIR = os.path.dirname(__file__)
@@ -26,32 +33,52 @@ DATA_DIR = os.path.abspath(os.path.join(BASE_DIR, "data"))
 INDEX_PATH = os.path.join(DATA_DIR, "index.faiss")
 NAMES_PATH = os.path.join(DATA_DIR, "image_names.json")
 CHECK_INTERVAL = 2  # seconds between queue polls
+SCHEDULE_CHUNK = int(os.getenv("SCHEDULE_CHUNK", "4"))  # entries picked per scheduling pass
+
+# Indexing stage: covers are encoded and committed to the index in batches
+INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", "32"))  # books per index update
+INDEX_MAX_LATENCY = float(os.getenv("INDEX_MAX_LATENCY", "10"))  # max seconds a book waits in the batch
+
+# External API base URLs. Override them (e.g. with utils/fake_book_apis.py)
+# to run the pipeline offline or benchmark it against a local stand-in.
+GOOGLE_BOOKS_API_BASE_URL = os.getenv("GOOGLE_BOOKS_API_BASE_URL", "https://www.googleapis.com")
+GOOGLE_BOOKS_BASE_URL = os.getenv("GOOGLE_BOOKS_BASE_URL", "https://books.google.com")
+OPENLIBRARY_BASE_URL = os.getenv("OPENLIBRARY_BASE_URL", "https://openlibrary.org")
+OPENLIBRARY_COVERS_BASE_URL = os.getenv("OPENLIBRARY_COVERS_BASE_URL", "https://covers.openlibrary.org")
+AMAZON_COVERS_BASE_URL = os.getenv("AMAZON_COVERS_BASE_URL", "https://images-na.ssl-images-amazon.com")
 
 # Cover image source URLs (in priority order)
 AMAZON_COVER_PATTERNS = [
-    "https://images-na.ssl-images-amazon.com/images/P/{isbn10}.01._SCLZZZZZZZ_.jpg",
-    "https://images-na.ssl-images-amazon.com/images/P/{isbn10}.01._SX200_.jpg",
-    "https://images-na.ssl-images-amazon.com/images/P/{isbn10}.01._SX300_.jpg",
+    AMAZON_COVERS_BASE_URL + "/images/P/{isbn10}.01._SCLZZZZZZZ_.jpg",
+    AMAZON_COVERS_BASE_URL + "/images/P/{isbn10}.01._SX200_.jpg",
+    AMAZON_COVERS_BASE_URL + "/images/P/{isbn10}.01._SX300_.jpg",
 ]
-OL_COVER_TEMPLATE = "https://covers.openlibrary.org/b/isbn/{isbn13}-L.jpg?default=false"
+OL_COVER_TEMPLATE = OPENLIBRARY_COVERS_BASE_URL + "/b/isbn/{isbn13}-L.jpg?default=false"
 GB_CONTENT_TEMPLATE = (
-    "https://books.google.com/books/content"
+    GOOGLE_BOOKS_BASE_URL + "/books/content"
     "?id={google_id}&printsec=frontcover&img=1&zoom=1&source=gbs_api"
 )
 
 # Ensure cover directory exists
 os.makedirs(COVERS_DIR, exist_ok=True)
 
+# Throughput/latency metrics, exposed through /admin/api/workers/status
+metrics = WorkerMetrics("book_worker")
+
 
 def log_app(level: str, message: str, context: dict = None) -> None:
     """
     Log application events to database and console.
+
+    Every entry is tagged with {"source": "worker"} so worker events can be
+    filtered without matching on the message text.
     
     Args:
         level: Log level (INFO, WARNING, ERROR, SUCCESS)
         message: Human-readable log message
         context: Optional additional context data
     """
+    context = dict(context or {}, source="worker")
     session = SessionLocal()
     session.add(AppLog(level=level, message=message, context=context))
     session.commit()
@@ -59,7 +86,7 @@ def log_app(level: str, message: str, context: dict = None) -> None:
     print(f"[{level}] {message}")
 
 
-def http_get_json(url: str, params: dict = None, timeout: int = 10) -> dict:
+def http_get_json(url: str, params: dict = None, timeout: int = 10, source: str = None) -> dict:
     """
     Make HTTP GET request and parse JSON response.
     
@@ -67,6 +94,7 @@ def http_get_json(url: str, params: dict = None, timeout: int = 10) -> dict:
         url: Target URL
         params: Optional query parameters
         timeout: Request timeout in seconds
+        source: Optional API name used to record call/error metrics
         
     Returns:
         Parsed JSON response as dictionary
@@ -74,9 +102,17 @@ def http_get_json(url: str, params: dict = None, timeout: int = 10) -> dict:
     Raises:
         requests.RequestException: On HTTP errors
     """
-    resp = requests.get(url, params=params, timeout=timeout)
-    resp.raise_for_status()
-    return resp.json()
+    try:
+        resp = requests.get(url, params=params, timeout=timeout)
+        resp.raise_for_status()
+        data = resp.json()
+    except (requests.RequestException, ValueError):
+        if source:
+            metrics.record_api_call(source, ok=False)
+        raise
+    if source:
+        metrics.record_api_call(source, ok=True)
+    return data
 
 
 def fetch_google_books_data(isbn13: str) -> dict:
@@ -93,8 +129,9 @@ def fetch_google_books_data(isbn13: str) -> dict:
         Exception: If book not found or API error
     """
     data = http_get_json(
-        "https://www.googleapis.com/books/v1/volumes",
-        params={"q": f"isbn:{isbn13}"}
+        f"{GOOGLE_BOOKS_API_BASE_URL}/books/v1/volumes",
+        params={"q": f"isbn:{isbn13}"},
+        source="google_books"
     )
     
     items = data.get("items") or []
@@ -144,8 +181,9 @@ def fetch_openlibrary_data(isbn13: str) -> dict:
         Exception: If book not found or API error
     """
     data = http_get_json(
-        "https://openlibrary.org/api/books",
-        params={"bibkeys": f"ISBN:{isbn13}", "format": "json", "jscmd": "data"}
+        f"{OPENLIBRARY_BASE_URL}/api/books",
+        params={"bibkeys": f"ISBN:{isbn13}", "format": "json", "jscmd": "data"},
+        source="openlibrary"
     )
     
     record = data.get(f"ISBN:{isbn13}")
@@ -204,23 +242,27 @@ def download_cover(isbn10: str, isbn13: str, cover_url: str = None, google_id: s
         
     Returns:
         Path to downloaded cover file, or None if all sources fail
+
+    Downloaded bytes go through utils.cover_processing: sources returning
+    placeholders or unreadable images are skipped, valid covers are stored
+    as normalized JPEGs.
     """
     if not isbn10:
         print("[WARNING] No ISBN-10, skipping cover download.")
         return None
     
-    # Build candidate URLs in priority order
-    candidates = [p.format(isbn10=isbn10) for p in AMAZON_COVER_PATTERNS]
+    # Build candidate (source, URL) pairs in priority order
+    candidates = [("amazon_cdn", p.format(isbn10=isbn10)) for p in AMAZON_COVER_PATTERNS]
     
     if google_id:
-        candidates.append(GB_CONTENT_TEMPLATE.format(google_id=google_id))
+        candidates.append(("google_books_content", GB_CONTENT_TEMPLATE.format(google_id=google_id)))
     
-    candidates.append(OL_COVER_TEMPLATE.format(isbn13=isbn13))
+    candidates.append(("openlibrary_covers", OL_COVER_TEMPLATE.format(isbn13=isbn13)))
     
     dest = os.path.join(COVERS_DIR, f"{isbn10}.jpg")
     
     # Try each URL until one works
-    for url in candidates:
+    for source, url in candidates:
         try:
             # Check if URL returns valid image before downloading
             head = requests.head(url, timeout=5)
@@ -231,14 +273,23 @@ def download_cover(isbn10: str, isbn13: str, cover_url: str = None, google_id: s
                 resp = requests.get(url, timeout=10)
                 resp.raise_for_status()
                 
-                with open(dest, "wb") as f:
-                    f.write(resp.content)
+                metrics.record_api_call(source, ok=True)
+                try:
+                    size = save_cover(resp.content, dest)
+                except InvalidCoverError as e:
+                    # Placeholder or broken image: try the next source
+                    print(f"[WARNING] Rejected cover from {source}: {e}")
+                    continue
                 
-                print(f"[SUCCESS] Cover downloaded: {dest}")
+                print(f"[SUCCESS] Cover downloaded: {dest} ({len(resp.content)} -> {size} bytes)")
                 return dest
+
+            # Reachable but no image for this book: not an API error
+            metrics.record_api_call(source, ok=True)
                 
         except requests.RequestException:
             # Try next URL on any HTTP error
+            metrics.record_api_call(source, ok=False)
             continue
     
     print("[WARNING] Failed to download cover from all sources.")
@@ -282,102 +333,242 @@ def log_scan(isbn: str, status: str, message: str, extra: dict = None) -> None:
     session.close()
 
 
+def mark_stuck(session, entry, reason: str) -> None:
+    """
+    Flag a pending entry as failed and notify API processes.
+
+    Clients waiting on the book (scan notifications) learn about it right
+    away instead of polling /worker-errors.
+    """
+    entry.stucked = True
+    session.commit()
+    try:
+        publish_event(BOOK_STUCK, isbn=entry.isbn, requested_by=entry.requested_by, reason=reason)
+    except Exception as e:
+        log_app("WARNING", f"Failed to publish stuck notification for {entry.isbn}: {e}")
+
+
+class IndexingStage:
+    """
+    Accumulates fetched books and indexes their covers in batches.
+
+    Instead of encoding one cover and rewriting the whole FAISS index per book,
+    books are buffered until INDEX_BATCH_SIZE is reached or the oldest one has
+    waited INDEX_MAX_LATENCY seconds. A flush encodes every buffered cover in
+    one CLIP pass, writes the index once, then saves the books to the database
+    and removes them from the pending queue. Running API processes are notified
+    through the index event channel after each committed update.
+
+    Buffered books are kept as plain data (pending id + metadata) so the stage
+    can span several scheduling passes.
+    """
+
+    def __init__(self, batch_size: int = INDEX_BATCH_SIZE, max_latency: float = INDEX_MAX_LATENCY):
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.items = []  # (pending id, priority, metadata) tuples
+        self.oldest = None  # monotonic time of the first buffered item
+
+    def add(self, entry, meta: dict) -> None:
+        """Buffer a book and flush if the batch is full or too old."""
+        if not self.items:
+            self.oldest = time.monotonic()
+        self.items.append((entry.id, entry.priority, meta))
+        if self.should_flush():
+            self.flush()
+
+    def pending_ids(self) -> set:
+        """Pending ids currently buffered (must not be scheduled again)."""
+        return {pending_id for pending_id, _, _ in self.items}
+
+    def has_interactive(self) -> bool:
+        return any(priority == PRIORITY_INTERACTIVE for _, priority, _ in self.items)
+
+    def should_flush(self) -> bool:
+        if not self.items:
+            return False
+        if len(self.items) >= self.batch_size:
+            return True
+        return time.monotonic() - self.oldest >= self.max_latency
+
+    def flush(self) -> None:
+        """Index all buffered covers at once, then persist the books."""
+        if not self.items:
+            return
+        items, self.items, self.oldest = self.items, [], None
+
+        # Step 3: Add the whole batch to the search index
+        isbn10s = [meta["isbn"] for _, _, meta in items]
+        try:
+            timings = {}
+            indexed = set(add_many_to_index(isbn10s, timings=timings))
+            for stage_name, seconds in timings.items():
+                metrics.record_latency(stage_name, seconds)
+            metrics.incr("batches_indexed")
+            log_app("SUCCESS", f"Indexed {len(indexed)}/{len(items)} covers in one batch")
+        except Exception as e:
+            indexed = set()
+            log_app("ERROR", f"Batch indexing failed for {len(items)} books: {e}", {"stage": "index"})
+
+        # Step 4: Save books to database
+        book_columns = {c.name for c in Book.__table__.columns}
+        saved = []
+        with SessionLocal() as session:
+            entries = {
+                p.id: p for p in
+                session.query(PendingBook).filter(PendingBook.id.in_([i for i, _, _ in items]))
+            }
+            for pending_id, _, meta in items:
+                entry = entries.get(pending_id)
+                if entry is None:
+                    continue  # Removed from the queue meanwhile (e.g. by an admin)
+                requested_by = entry.requested_by  # entry is deleted on success
+                with metrics.stage("db"):
+                    ok = self._save_book(session, entry, meta, book_columns)
+                if ok:
+                    saved.append({
+                        "isbn": meta["isbn"], "isbn13": meta.get("isbn13"),
+                        "title": meta.get("title"), "requested_by": requested_by,
+                    })
+                    metrics.item_done("books_added")
+                else:
+                    metrics.item_done("books_stuck")
+        metrics.flush()
+
+        # Tell running API processes to swap the index and refresh book caches
+        try:
+            if indexed:
+                publish_event(INDEX_UPDATED, isbns=sorted(indexed))
+            if saved:
+                publish_event(BOOKS_ADDED, books=saved)
+        except Exception as e:
+            log_app("WARNING", f"Failed to publish index update notification: {e}")
+
+    def _save_book(self, session, entry, meta: dict, book_columns: set) -> bool:
+        isbn13 = entry.isbn
+        try:
+            # Create book object with only valid database fields
+            book_fields = {k: meta[k] for k in meta if k in book_columns}
+            book = Book(**book_fields)
+
+            session.add(book)
+            session.commit()
+
+            # Log successful addition
+            log_scan(
+                isbn=book.isbn,
+                status="success",
+                message=f"Book added to database: {book.title}",
+                extra={"source": "worker", "action": "book_added"}
+            )
+
+            print(f"✅ Book added: {book.title}")
+
+            # Remove from pending queue
+            session.delete(entry)
+            session.commit()
+            return True
+
+        except Exception as e:
+            session.rollback()
+            log_app("ERROR", f"DB save failed for {isbn13}: {e}", {"stage": "db", "isbn": isbn13})
+            mark_stuck(session, entry, "db_error")
+            return False
+
+
 def process_pending_books() -> None:
     """
     Main worker loop that continuously processes pending books.
     
-    This function runs indefinitely, checking for new pending books every
-    CHECK_INTERVAL seconds. For each book found:
+    Each pass picks the next SCHEDULE_CHUNK entries chosen by
+    utils.pending_queue (priority lanes, round-robin across users, aging),
+    so a book scanned at the counter overtakes a running bulk import.
+    For each book:
     1. Fetches metadata from external APIs
     2. Downloads cover image
-    3. Adds cover to search index
-    4. Saves book to database
+    3. Queues the book in the indexing stage (batched cover encoding)
+    4. Saves book to database once its batch is indexed
     5. Removes from pending queue
     
+    Interactive books are flushed as soon as no other interactive book is
+    waiting, instead of waiting for a full batch. The worker only sleeps
+    CHECK_INTERVAL seconds when the queue is empty.
     Books that fail processing are marked as "stuck" for manual review.
     """
+    stage = IndexingStage()
+
     while True:
         with SessionLocal() as session:
-            # Get all non-stuck pending books
-            pendings = session.query(PendingBook).filter_by(stucked=False).all()
+            entries = select_next_batch(session, SCHEDULE_CHUNK, exclude_ids=stage.pending_ids())
+            stuck_count = session.query(PendingBook).filter_by(stucked=True).count()
+            metrics.set_queue_depth(
+                by_lane=queue_depth_by_lane(session), stuck=stuck_count, indexing=len(stage.items)
+            )
+            metrics.flush()
+
+            # Don't hold interactive books back once no more interactive work is waiting
+            if stage.has_interactive() and not any(e.priority == PRIORITY_INTERACTIVE for e in entries):
+                stage.flush()
             
-            if not pendings:
+            if not entries:
+                # Queue drained: don't keep books waiting in the batch
+                stage.flush()
                 time.sleep(CHECK_INTERVAL)
                 continue
             
-            for entry in pendings:
-                isbn13 = entry.isbn
+            for entry in entries:
+                # Queue entries are ISBN-13s; older rows may hold an ISBN-10
+                try:
+                    isbn10, isbn13 = isbn_pair(entry.isbn)
+                except InvalidISBNError:
+                    log_app("WARNING", f"Invalid ISBN {entry.isbn}, marking as stuck", {"isbn": entry.isbn})
+                    mark_stuck(session, entry, "invalid_isbn")
+                    metrics.item_done("books_stuck")
+                    continue
+
+                # books.isbn (covers, index) needs an ISBN-10, which 979- ISBNs
+                # don't have: skip them before spending an API call
+                if not isbn10:
+                    log_app("WARNING", f"No ISBN-10 exists for {isbn13}, marking as stuck", {"isbn": isbn13})
+                    mark_stuck(session, entry, "no_isbn10")
+                    metrics.item_done("books_stuck")
+                    continue
+
                 log_app("INFO", f"Processing ISBN13: {isbn13}")
                 
                 # Step 1: Fetch book metadata
                 try:
-                    meta = fetch_book_data(isbn13)
+                    with metrics.stage("fetch"):
+                        meta = fetch_book_data(isbn13)
                     log_app("SUCCESS", f"Fetched metadata for {isbn13}")
                 except Exception as e:
-                    log_app("ERROR", f"Metadata fetch failed for {isbn13}: {e}")
-                    entry.stucked = True
-                    session.commit()
+                    log_app("ERROR", f"Metadata fetch failed for {isbn13}: {e}", {"stage": "fetch", "isbn": isbn13})
+                    mark_stuck(session, entry, "fetch_failed")
+                    metrics.item_done("books_stuck")
                     continue
 
-                isbn10 = meta.get("isbn")
-                
-                # Skip if no ISBN-10 (needed for covers and indexing)
-                if not isbn10:
-                    log_app("WARNING", f"No ISBN-10 found for {isbn13}, marking as stuck")
-                    entry.stucked = True
-                    session.commit()
-                    continue
+                # Derived locally: APIs often omit the ISBN-10 identifier
+                meta["isbn"] = isbn10
+                meta["isbn13"] = isbn13
                 
                 # Step 2: Download cover image
                 try:
-                    cover_path = download_cover(
-                        isbn10, isbn13, 
-                        cover_url=meta.get("cover_url"), 
-                        google_id=meta.get("google_id")
-                    )
+                    with metrics.stage("download"):
+                        cover_path = download_cover(
+                            isbn10, isbn13, 
+                            cover_url=meta.get("cover_url"), 
+                            google_id=meta.get("google_id")
+                        )
                     if cover_path:
                         log_app("SUCCESS", f"Cover saved at {cover_path}")
                 except Exception as e:
                     log_app("WARNING", f"Cover download error for {isbn10}: {e}")
 
-                # Step 3: Add to search index
-                try:
-                    add_to_index(isbn10)
-                    log_app("SUCCESS", f"Indexed {isbn10}")
-                except Exception as e:
-                    log_app("ERROR", f"Indexing failed for {isbn10}: {e}")
+                # Steps 3-5 happen when the indexing stage flushes
+                stage.add(entry, meta)
 
-                # Step 4: Save book to database
-                try:
-                    # Create book object with only valid database fields
-                    book_fields = {k: meta[k] for k in meta 
-                                 if k in {c.name for c in Book.__table__.columns}}
-                    book = Book(**book_fields)
-                    
-                    session.add(book)
-                    session.commit()
-                    
-                    # Log successful addition
-                    log_scan(
-                        isbn=book.isbn,
-                        status="success", 
-                        message=f"Book added to database: {book.title}",
-                        extra={"source": "worker", "action": "book_added"}
-                    )
-                    
-                    print(f"✅ Book added: {book.title}")
-                    
-                    # Remove from pending queue
-                    session.delete(entry)
-                    session.commit()
-                    
-                except Exception as e:
-                    session.rollback()
-                    log_app("ERROR", f"DB save failed for {isbn13}: {e}")
-                    entry.stucked = True
-                    session.commit()
-        
-        time.sleep(CHECK_INTERVAL)
+            if stage.should_flush():
+                stage.flush()
 
 
 if __name__ == "__main__":
@@ -32,6 +32,7 @@ import { View, Text, TouchableOpacity, StyleSheet, SafeAreaView, Platform } from
 import { CameraView } from 'expo-camera';
 import { StatusBar } from 'expo-status-bar';
 import { Book } from 'lucide-react-native';
+import AsyncStorage from '@react-native-async-storage/async-storage';
 import { API_BASE_URL } from '../../config/api';
 
 import ScannerOverlay from './ScannerOverlay';
@@ -117,11 +118,13 @@ export default function ISBNScanner() {
     setRecentlyScanned(data);
 
     try {
-      // Submit ISBN to backend processing queue
+      // Submit ISBN to backend processing queue; the username lets the
+      // worker share its time fairly between users
+      const username = await AsyncStorage.getItem('ridizi_username');
       const response = await fetch(`http://${API_BASE_URL}:5001/barcode`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ isbn: data }),
+        body: JSON.stringify({ isbn: data, username: username || undefined }),
       });
 
       if (response.ok) {
@@ -26,8 +26,14 @@ from api.book import bp as book_api
 from api.collections import collections_api
 from api.workers import register_worker, workers_api
 from api.search import search_api
+from api.scan_events import scan_events_api
 import json
 from utils.db_models import SessionLocal, AppLog, calculate_daily_stats
+from utils.index_events import start_watcher
+from utils.catalog import catalog
+from utils.isbn_index import isbn_index
+from utils.search_index import search_index
+from utils.suggest_index import suggest_index
 import threading
 import time
 from datetime import datetime, time as dt_time
@@ -97,6 +103,14 @@ app.register_blueprint(book_api)         # Individual book details
 app.register_blueprint(collections_api)  # User book collections
 app.register_blueprint(workers_api)      # Worker process management
 app.register_blueprint(search_api)       # Book search functionality
+app.register_blueprint(scan_events_api)  # Push notifications for processed scans
+
+# Listen for index/book updates published by the worker
+start_watcher()
+catalog.load_async()  # Book records for hot read paths; DB fallback until loaded
+isbn_index.load_async()  # Barcode fast path; scans fall back to MySQL until loaded
+search_index.load_async()  # /api/search falls back to SQL until loaded
+suggest_index.start()  # Autocomplete trie, rebuilt periodically for scan counts
 
 # Register background workers
 register_worker(